@@ -1,9 +1,134 @@
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+from app.utils.quantize import STORAGE_KINDS
 
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 client = OpenAI(api_key=OPENAI_API_KEY)
+async_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+# In-process cache of per-user contact embedding matrices (LRU by bytes)
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Approximate nearest-neighbour (IVF) search; exact search below ANN_MIN_ROWS.
+# nlist grows as 4*sqrt(rows), so a search probes ANN_NPROBE_FRACTION of the
+# lists (never fewer than ANN_NPROBE); see benchmarks/bench_ann_recall.py.
+ANN_ENABLED = os.getenv("ANN_ENABLED", "true").lower() == "true"
+ANN_MIN_ROWS = int(os.getenv("ANN_MIN_ROWS", "5000"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+ANN_NPROBE_FRACTION = float(os.getenv("ANN_NPROBE_FRACTION", "0.1"))
+ANN_MAX_USER_INDEXES = int(os.getenv("ANN_MAX_USER_INDEXES", "64"))
+ANN_PROFILE_REFRESH_SECONDS = float(os.getenv("ANN_PROFILE_REFRESH_SECONDS", "60"))
+
+# Query embedding cache: in-process LRU + optional sqlite file (empty path = off)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+QUERY_EMBEDDING_CACHE_PATH = os.getenv("QUERY_EMBEDDING_CACHE_PATH", "")
+
+# Per-user memory-mapped embedding shards (empty dir = disabled)
+EMBEDDING_SHARD_DIR = os.getenv("EMBEDDING_SHARD_DIR", "")
+
+# In-memory storage of cached contact matrices: float32 | float16 | int8.
+# Quantized kinds scan the compact copy first, then rescore the best
+# EMBEDDING_RESCORE_K rows at full precision.
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "float32").lower()
+if EMBEDDING_STORAGE not in STORAGE_KINDS:
+    raise ValueError(
+        f"EMBEDDING_STORAGE={EMBEDDING_STORAGE!r}; expected one of {', '.join(STORAGE_KINDS)}"
+    )
+EMBEDDING_RESCORE_K = int(os.getenv("EMBEDDING_RESCORE_K", "300"))
+
+# Rows per fetchmany() when streaming embeddings out of MySQL
+RETRIEVAL_FETCH_CHUNK = int(os.getenv("RETRIEVAL_FETCH_CHUNK", "1000"))
+# Used to estimate a user's matrix size before loading it
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+
+# Local query-intent classifier (nearest centroid over query embeddings).
+# Below QUERY_CLASSIFIER_MIN_CONFIDENCE the LLM decides and its label is
+# appended to QUERY_CLASSIFIER_LABEL_LOG for train_query_classifier.py.
+QUERY_CLASSIFIER_MODEL_PATH = os.getenv("QUERY_CLASSIFIER_MODEL_PATH", "data/query_classifier.npz")
+QUERY_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("QUERY_CLASSIFIER_MIN_CONFIDENCE", "0.6"))
+QUERY_CLASSIFIER_LABEL_LOG = os.getenv("QUERY_CLASSIFIER_LABEL_LOG", "data/query_labels.jsonl")
+
+# Per-candidate LLM verdicts keyed by (canonical prompt, query_type, context_hash)
+JUDGMENT_CACHE_SIZE = int(os.getenv("JUDGMENT_CACHE_SIZE", "50000"))
+JUDGMENT_CACHE_TTL_SECONDS = float(os.getenv("JUDGMENT_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+# referral_search fan-out: referrers judged at once, and the request deadline
+REFERRAL_CONCURRENCY = int(os.getenv("REFERRAL_CONCURRENCY", "8"))
+REFERRAL_DEADLINE_SECONDS = float(os.getenv("REFERRAL_DEADLINE_SECONDS", "8"))
+# Best-scoring contacts kept per referrer before deduplication
+REFERRAL_TOP_K = int(os.getenv("REFERRAL_TOP_K", "40"))
+# Unique referral candidates per combined llm_filter call
+REFERRAL_LLM_BATCH = int(os.getenv("REFERRAL_LLM_BATCH", "40"))
+# MySQL work for referrals runs in threads that outlive a missed deadline;
+# at most this many at once, each query capped by the time left.
+REFERRAL_DB_SLOTS = int(os.getenv("REFERRAL_DB_SLOTS", "4"))
+
+# llm_filter prompt packing: total profile tokens per call, chunk size for
+# splitting long sections, and cached chunk embeddings (by chunk text)
+PACK_TOKEN_BUDGET = int(os.getenv("PACK_TOKEN_BUDGET", "8000"))
+PACK_CHUNK_TOKENS = int(os.getenv("PACK_CHUNK_TOKENS", "200"))
+PACK_SECTION_CACHE_SIZE = int(os.getenv("PACK_SECTION_CACHE_SIZE", "20000"))
+
+# /search mode when the request does not pick one: fast | full | auto.
+# auto answers from embedding scores and only calls llm_filter when the
+# ranking is ambiguous: best score below SEARCH_AUTO_MIN_SCORE, or best
+# minus runner-up below SEARCH_AUTO_MIN_GAP.
+SEARCH_MODES = ("fast", "full", "auto")
+SEARCH_DEFAULT_MODE = os.getenv("SEARCH_DEFAULT_MODE", "full").lower()
+if SEARCH_DEFAULT_MODE not in SEARCH_MODES:
+    raise ValueError(
+        f"SEARCH_DEFAULT_MODE={SEARCH_DEFAULT_MODE!r}; expected one of {', '.join(SEARCH_MODES)}"
+    )
+SEARCH_AUTO_MIN_SCORE = float(os.getenv("SEARCH_AUTO_MIN_SCORE", "0.5"))
+SEARCH_AUTO_MIN_GAP = float(os.getenv("SEARCH_AUTO_MIN_GAP", "0.03"))
+
+# POST /search/batch: prompts accepted per call, and LLM filters in flight
+SEARCH_BATCH_MAX_PROMPTS = int(os.getenv("SEARCH_BATCH_MAX_PROMPTS", "100"))
+SEARCH_BATCH_CONCURRENCY = int(os.getenv("SEARCH_BATCH_CONCURRENCY", "8"))
+
+# Hybrid retrieval: per-user BM25 over profile_text fused with the vector
+# ranking by reciprocal rank fusion. HYBRID_DEPTH hits are taken from each
+# ranking before fusing; SEARCH_TOP_K candidates then go to the LLM.
+HYBRID_ENABLED = os.getenv("HYBRID_ENABLED", "true").lower() == "true"
+HYBRID_DEPTH = int(os.getenv("HYBRID_DEPTH", "100"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+LEXICAL_MAX_USER_INDEXES = int(os.getenv("LEXICAL_MAX_USER_INDEXES", "64"))
+# BM25 indexes are built/refreshed on this many background threads; until a
+# user's first build lands, their searches are vector-only.
+LEXICAL_BUILD_WORKERS = int(os.getenv("LEXICAL_BUILD_WORKERS", "2"))
+SEARCH_TOP_K = int(os.getenv("SEARCH_TOP_K", "40"))
+
+# Search pipeline stages (embed, retrieve, classify, pack, judge, merge).
+# SEARCH_SKIP_STAGES: comma list of optional stages to turn off, e.g.
+#   "classify" (query_type = ambiguous), "pack" (full profiles to the LLM),
+#   "judge" (embedding ranking only; classify and pack are skipped with it).
+# SEARCH_STAGE_VARIANTS: stage=variant pairs, e.g. "retrieve=vector,pack=truncate".
+SEARCH_SKIP_STAGES = os.getenv("SEARCH_SKIP_STAGES", "")
+SEARCH_STAGE_VARIANTS = os.getenv("SEARCH_STAGE_VARIANTS", "")
+
+# build_embeddings.py: inputs per embeddings.create call are capped by
+# estimated tokens and count; EMBED_CONCURRENCY calls run at once under
+# the account's per-minute quotas (0 = unlimited); rows are written back
+# EMBED_WRITE_CHUNK per transaction. Profiles are assembled
+# EMBED_PROFILE_PAGE_ROWS rows at a time with one query per source table.
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))
+EMBED_BATCH_MAX_INPUTS = int(os.getenv("EMBED_BATCH_MAX_INPUTS", "512"))
+EMBED_MAX_INPUT_TOKENS = int(os.getenv("EMBED_MAX_INPUT_TOKENS", "8000"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_RATE_LIMIT_RPM = int(os.getenv("EMBED_RATE_LIMIT_RPM", "3000"))
+EMBED_RATE_LIMIT_TPM = int(os.getenv("EMBED_RATE_LIMIT_TPM", "1000000"))
+EMBED_WRITE_CHUNK = int(os.getenv("EMBED_WRITE_CHUNK", "500"))
+EMBED_PROFILE_PAGE_ROWS = int(os.getenv("EMBED_PROFILE_PAGE_ROWS", "500"))
+
+# rebuild_worker.py: each worker claims up to REBUILD_WORKER_BATCH
+# needs_rebuild rows under a REBUILD_LEASE_SECONDS lease (expired leases
+# are reclaimable by any worker) and polls every REBUILD_IDLE_SECONDS
+# when the queue is empty.
+REBUILD_WORKER_BATCH = int(os.getenv("REBUILD_WORKER_BATCH", "200"))
+REBUILD_LEASE_SECONDS = int(os.getenv("REBUILD_LEASE_SECONDS", "600"))
+REBUILD_IDLE_SECONDS = float(os.getenv("REBUILD_IDLE_SECONDS", "10"))
@@ -1,15 +1,114 @@
 import os
-import mysql.connector
+import threading
+import time
+from contextlib import contextmanager
+from mysql.connector import errors, pooling
 from dotenv import load_dotenv
 
 load_dotenv()
 
-db = mysql.connector.connect(
-    host=os.getenv("DB_HOST"),
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASSWORD"),
-    database=os.getenv("DB_NAME"),
-)
+# mysql.connector caps a pool at 32 connections
+DB_POOL_SIZE = min(int(os.getenv("DB_POOL_SIZE", "10")), pooling.CNX_POOL_MAXSIZE)
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
 
+_pool = None
+_pool_lock = threading.Lock()
+
+# MySQLConnectionPool raises as soon as it is empty; the semaphore turns
+# that into a bounded wait we can time.
+_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "checkouts": 0,
+    "in_use": 0,
+    "timeouts": 0,
+    "reconnects": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+}
+
+
+def _get_pool():
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name="app",
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=True,
+                    host=os.getenv("DB_HOST", "127.0.0.1"),
+                    user=os.getenv("DB_USER", "root"),
+                    password=os.getenv("DB_PASSWORD", ""),
+                    database=os.getenv("DB_NAME", ""),
+                    port=int(os.getenv("DB_PORT", "3306")),
+                    # Every statement sees fresh data; writers open
+                    # explicit transactions
+                    autocommit=True,
+                )
+    return _pool
+
+
+def _record_wait(waited: float):
+    with _stats_lock:
+        _stats["checkouts"] += 1
+        _stats["in_use"] += 1
+        _stats["wait_seconds_total"] += waited
+        _stats["wait_seconds_max"] = max(_stats["wait_seconds_max"], waited)
+
+
+@contextmanager
+def get_connection():
+    """Checks a pooled connection out for the duration of the block."""
+
+    started = time.perf_counter()
+
+    if not _slots.acquire(timeout=DB_POOL_TIMEOUT_SECONDS):
+        with _stats_lock:
+            _stats["timeouts"] += 1
+        raise errors.PoolError(
+            f"no MySQL connection available after {DB_POOL_TIMEOUT_SECONDS}s"
+        )
+
+    conn = None
+    try:
+        conn = _get_pool().get_connection()
+        _record_wait(time.perf_counter() - started)
+
+        # Health check: pings the server, reconnects a dropped session
+        if not conn.is_connected():
+            conn.reconnect(attempts=2, delay=0)
+            with _stats_lock:
+                _stats["reconnects"] += 1
+
+        yield conn
+
+    finally:
+        if conn is not None:
+            with _stats_lock:
+                _stats["in_use"] -= 1
+            # Returns it to the pool
+            conn.close()
+        _slots.release()
+
+
+@contextmanager
 def get_cursor():
-    return db.cursor(dictionary=True)
+    with get_connection() as conn:
+        cur = conn.cursor(dictionary=True)
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+
+def get_pool_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+
+    checkouts = stats["checkouts"]
+    stats["wait_seconds_avg"] = stats["wait_seconds_total"] / checkouts if checkouts else 0.0
+    stats["pool_size"] = DB_POOL_SIZE
+    return stats
@@ -0,0 +1,88 @@
+import os
+import threading
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Fail fast when Mongo is unreachable instead of pymongo's 30s default
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "5000"))
+
+_client = None
+_client_lock = threading.Lock()
+
+# Review lookups filter on default_description_id (a single $in per rebuild
+# batch); without an index on it every batch is a collection scan.
+# check_review_index() creates it when missing (MONGO_CREATE_REVIEW_INDEX)
+# and, with MONGO_REQUIRE_REVIEW_INDEX, refuses to start without it.
+REVIEW_INDEX_FIELD = "default_description_id"
+MONGO_CREATE_REVIEW_INDEX = os.getenv("MONGO_CREATE_REVIEW_INDEX", "true").lower() == "true"
+MONGO_REQUIRE_REVIEW_INDEX = os.getenv("MONGO_REQUIRE_REVIEW_INDEX", "false").lower() == "true"
+
+
+def get_mongo_client() -> MongoClient:
+
+    global _client
+
+    # Connects on first use, not at import
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(
+                    os.getenv("MONGO_URI"),
+                    serverSelectionTimeoutMS=MONGO_TIMEOUT_MS
+                )
+    return _client
+
+
+def get_reviews_collection():
+    return get_mongo_client()[os.getenv("MONGO_DB")]["reviews"]
+
+
+def close_mongo():
+
+    global _client
+
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _has_review_index(collection) -> bool:
+    indexes = collection.index_information()
+    return any(info["key"][0][0] == REVIEW_INDEX_FIELD for info in indexes.values())
+
+
+def check_review_index() -> bool:
+    """
+    Makes sure reviews has an index led by default_description_id, creating
+    it if allowed. Raises RuntimeError when it is required and missing.
+    """
+
+    try:
+        collection = get_reviews_collection()
+
+        if _has_review_index(collection):
+            return True
+
+        if MONGO_CREATE_REVIEW_INDEX:
+            # Idempotent; a concurrent startup creating it too is harmless
+            collection.create_index([(REVIEW_INDEX_FIELD, 1)])
+            print(f"✅ Created reviews index on {REVIEW_INDEX_FIELD}")
+            return True
+
+        problem = f"reviews has no index on {REVIEW_INDEX_FIELD}; review loads will scan the collection"
+
+    except PyMongoError as e:
+        problem = f"could not check the reviews index on {REVIEW_INDEX_FIELD}: {e}"
+
+    if MONGO_REQUIRE_REVIEW_INDEX:
+        raise RuntimeError(f"{problem} (MONGO_REQUIRE_REVIEW_INDEX is set)")
+
+    print(
+        f"⚠️ {problem}. Create it with: "
+        f"db.reviews.createIndex({{ {REVIEW_INDEX_FIELD}: 1 }})"
+    )
+    return False
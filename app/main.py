@@ -1,12 +1,28 @@
 from fastapi import FastAPI
+from app.core.mongo import check_review_index
+from app.services.query_classifier_service import warm_local_model
 from app.routes.search import router as search_router
 from app.routes.referral import router as referral_router
 from app.routes import recommendation_routes
 from app.routes.vector_routes import router as vector_router
+from app.routes.stats_routes import router as stats_router
 
 app = FastAPI(title="AI Contact Search")
 
 app.include_router(search_router)
 app.include_router(referral_router)
 app.include_router(recommendation_routes.router)
-app.include_router(vector_router)
\ No newline at end of file
+app.include_router(vector_router)
+app.include_router(stats_router)
+
+
+@app.on_event("startup")
+def check_indexes():
+    # Profile rebuilds load reviews by default_description_id
+    check_review_index()
+
+
+@app.on_event("startup")
+def load_query_classifier():
+    # Loads or seeds on a background thread; the LLM classifies meanwhile
+    warm_local_model()
@@ -1,9 +1,18 @@
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 
 class SearchRequest(BaseModel):
     user_id: int
     prompt: str
+    mode: Optional[Literal["fast", "full", "auto"]] = None
+    debug: bool = False
 
 class ReferralSearchRequest(BaseModel):
     user_id: int
-    prompt: str
\ No newline at end of file
+    prompt: str
+
+class SearchBatchRequest(BaseModel):
+    user_id: int
+    prompts: List[str]
+    mode: Optional[Literal["fast", "full", "auto"]] = None
+    debug: bool = False
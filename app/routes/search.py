@@ -1,65 +1,104 @@
-from fastapi import APIRouter
-from app.models.schemas import SearchRequest
-from app.services.embedding_service import get_embedding
-from app.services.retrieval_service import retrieve_candidates
-from app.services.llm_filter_service import llm_filter
-from app.services.query_classifier_service import classify_query
+import json
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from app.core.config import SEARCH_BATCH_MAX_PROMPTS, SEARCH_TOP_K
+from app.models.schemas import SearchBatchRequest, SearchRequest
+from app.services.search_pipeline_service import (
+    run_ai_search_batch_async,
+    run_search,
+    stream_ai_search,
+)
 
 router = APIRouter()
 
 
 @router.post("/search")
-def search(req: SearchRequest):
+async def search(req: SearchRequest, response: Response):
 
-    # 1️⃣ Embed query
-    query_embedding = get_embedding(req.prompt)
+    stats = {}
 
-    # 2️⃣ Retrieve wide candidates (NO threshold)
-    candidates = retrieve_candidates(
-        req.user_id,
-        query_embedding,
-        top_k=40
+    # One pipeline: embed -> retrieve -> classify -> pack -> judge -> merge.
+    # full: the LLM judges the top SEARCH_TOP_K (vector + BM25 fused) and
+    # the response is ranked ONLY by LLM confidence. fast: embedding
+    # ranking only. auto: fast unless the top scores are too close to call.
+    ctx = await run_search(
+        user_id=req.user_id,
+        prompt=req.prompt,
+        top_k=SEARCH_TOP_K,
+        top_n=5,
+        stats=stats,
+        mode=req.mode
     )
 
-    if not candidates:
-        return []
+    if "resolved_mode" in stats:
+        response.headers["X-Search-Mode"] = f"{stats['mode']}->{stats['resolved_mode']}"
 
-    # 3️⃣ Classify query intent
-    query_type = classify_query(req.prompt)
+    if "judgment_cache_hits" in stats:
+        response.headers["X-Judgment-Cache"] = (
+            f"hits={stats['judgment_cache_hits']}; misses={stats['judgment_cache_misses']}"
+        )
+        response.headers["X-Prompt-Tokens"] = (
+            f"packed={stats['packed_tokens']}; prompt={stats['prompt_tokens']}"
+        )
 
-    # 4️⃣ LLM filtering with intent awareness
-    judged = llm_filter(
-        prompt=req.prompt,
-        candidates=candidates,
-        query_type=query_type
-    )
+    if req.debug:
+        return {"results": ctx.results, "debug": ctx.debug()}
+
+    return ctx.results
+
+
+@router.post("/search/batch")
+async def search_batch(req: SearchBatchRequest):
 
-    judged_map = {
-        j["idx"]: j
-        for j in judged
-        if isinstance(j.get("idx"), int)
-    }
-
-    final = []
-
-    # 5️⃣ Strict merge
-    for c in candidates:
-        j = judged_map.get(c["idx"])
-        if not j:
-            continue
-
-        final.append({
-            "name": c["name"],
-            "phone": c["phone"],
-            "confidence": j.get("confidence", 0.0),
-            "reason": j.get("reason", ""),
-            "profile_text": c["profile_text"]
-        })
-
-    # 6️⃣ Rank ONLY by LLM confidence
-    final.sort(
-        key=lambda x: x["confidence"],
-        reverse=True
+    if len(req.prompts) > SEARCH_BATCH_MAX_PROMPTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"at most {SEARCH_BATCH_MAX_PROMPTS} prompts per batch"
+        )
+
+    # One embeddings call, one matrix load and one scoring pass for all
+    # prompts; each prompt then runs the remaining stages like /search
+    contexts = await run_ai_search_batch_async(
+        user_id=req.user_id,
+        prompts=req.prompts,
+        top_k=SEARCH_TOP_K,
+        top_n=5,
+        mode=req.mode
     )
 
-    return final[:5]
\ No newline at end of file
+    # A failed prompt comes back with "error" instead of failing the batch
+    return [
+        {
+            "prompt": ctx.prompt,
+            "results": ctx.results if ctx.error is None else [],
+            **({"error": ctx.error} if ctx.error is not None else {}),
+            **({"debug": ctx.debug()} if req.debug else {}),
+        }
+        for ctx in contexts
+    ]
+
+
+@router.post("/search/stream")
+async def search_stream(req: SearchRequest):
+
+    # Server-Sent Events:
+    #   candidates -> embedding-ranked top 5, right after retrieval
+    #   verified   -> each LLM-confirmed contact as its verdict streams in
+    #   final      -> the same ranked list /search returns
+    #   debug      -> per-stage trace, when requested
+    async def events():
+        async for event, data in stream_ai_search(
+            user_id=req.user_id,
+            prompt=req.prompt,
+            top_k=SEARCH_TOP_K,
+            top_n=5,
+            mode=req.mode,
+            debug=req.debug
+        ):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,47 @@
+from fastapi import APIRouter
+from app.core.database import get_pool_stats
+from app.services.context_packing_service import get_prompt_token_stats
+from app.services.embedding_cache_service import get_cache_stats
+from app.services.embedding_service import get_embedding_cache_stats
+from app.services.lexical_index_service import get_lexical_stats
+from app.services.judgment_cache_service import get_judgment_cache_stats
+from app.services.query_classifier_service import get_classifier_stats
+from app.services.rebuild_queue_service import get_rebuild_queue_stats
+from app.services.search_pipeline_service import get_search_mode_stats
+
+router = APIRouter(prefix="/stats", tags=["Stats"])
+
+
+@router.get("/caches")
+def cache_stats():
+    return {
+        "query_embeddings": get_embedding_cache_stats(),
+        "contact_matrices": get_cache_stats(),
+        "llm_judgments": get_judgment_cache_stats(),
+        "lexical_indexes": get_lexical_stats(),
+    }
+
+
+@router.get("/db")
+def db_stats():
+    return get_pool_stats()
+
+
+@router.get("/classifier")
+def classifier_stats():
+    return get_classifier_stats()
+
+
+@router.get("/prompts")
+def prompt_stats():
+    return get_prompt_token_stats()
+
+
+@router.get("/search-modes")
+def search_mode_stats():
+    return get_search_mode_stats()
+
+
+@router.get("/rebuild-queue")
+def rebuild_queue_stats():
+    return get_rebuild_queue_stats()
@@ -0,0 +1,251 @@
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.core.config import (
+    ANN_ENABLED,
+    ANN_MIN_ROWS,
+    ANN_NPROBE,
+    ANN_NPROBE_FRACTION,
+    ANN_MAX_USER_INDEXES,
+    ANN_PROFILE_REFRESH_SECONDS,
+)
+from app.core.database import get_cursor
+from app.utils.ivf import IVFIndex
+from app.utils.math import cosine_topk, l2_normalize
+
+# Retrain the coarse quantizer once the index grew this much since training
+RETRAIN_GROWTH = 4
+
+
+def _nlist_for(n: int) -> int:
+    return max(1, int(4 * math.sqrt(n)))
+
+
+def _nprobe_for(index: IVFIndex) -> int:
+    # A fixed probe count covers a shrinking share of lists as nlist grows
+    return min(index.nlist, max(ANN_NPROBE, math.ceil(ANN_NPROBE_FRACTION * index.nlist)))
+
+
+def _needs_retrain(index: IVFIndex, n: int, dim: int) -> bool:
+    return index.dim != dim or n > RETRAIN_GROWTH * index.trained_size
+
+
+def _build_index(ids, matrix) -> IVFIndex:
+    index = IVFIndex(nlist=_nlist_for(len(ids)))
+    index.train(matrix)
+    index.add(ids, matrix)
+    return index
+
+
+# ==========================================
+# PER-USER CONTACT INDEXES
+# ==========================================
+
+class _UserIndexState:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = None
+        self.fingerprint = None
+        self.hashes = {}
+
+
+_user_lock = threading.Lock()
+_user_states = OrderedDict()
+
+
+def _user_state(user_id: int) -> _UserIndexState:
+    with _user_lock:
+        state = _user_states.get(user_id)
+        if state is None:
+            state = _UserIndexState()
+            _user_states[user_id] = state
+            while len(_user_states) > ANN_MAX_USER_INDEXES:
+                _user_states.popitem(last=False)
+        else:
+            _user_states.move_to_end(user_id)
+        return state
+
+
+def _sync_user_index(state: _UserIndexState, entry):
+    if state.index is not None and state.fingerprint == entry.fingerprint:
+        return
+
+    ids = entry.embedding_ids.tolist()
+    current = dict(zip(ids, entry.context_hashes))
+
+    if state.index is None or _needs_retrain(state.index, entry.size, entry.matrix.shape[1]):
+        state.index = _build_index(entry.embedding_ids, entry.matrix)
+    else:
+        # Incremental: drop rows that are gone or were rebuilt, insert new ones
+        stale = [i for i, h in state.hashes.items() if current.get(i, object()) != h]
+        state.index.remove(stale)
+
+        fresh = [
+            pos for pos, i in enumerate(ids)
+            if state.hashes.get(i, object()) != current[i]
+        ]
+        if fresh:
+            state.index.add(entry.embedding_ids[fresh], entry.matrix[fresh])
+
+    state.hashes = current
+    state.fingerprint = entry.fingerprint
+
+
+def search_user_contacts(entry, query_embedding, k: int):
+    """Returns (embedding_ids, scores) for one user's contacts, best first."""
+
+    if not ANN_ENABLED or entry.size < ANN_MIN_ROWS:
+        top, scores = cosine_topk(query_embedding, entry.matrix, k)
+        return entry.embedding_ids[top], scores
+
+    state = _user_state(entry.user_id)
+
+    with state.lock:
+        _sync_user_index(state, entry)
+        return state.index.search(query_embedding, k, nprobe=_nprobe_for(state.index))
+
+
+def search_user_contacts_batch(entry, queries, k: int):
+    """search_user_contacts for many queries: [(embedding_ids, scores), ...]."""
+
+    if not ANN_ENABLED or entry.size < ANN_MIN_ROWS:
+        # One (q, d) @ (d, n) product for every query
+        top, scores = cosine_topk(queries, entry.matrix, k)
+        return [
+            (entry.embedding_ids[t[t >= 0]], s[t >= 0])
+            for t, s in zip(top, scores)
+        ]
+
+    state = _user_state(entry.user_id)
+
+    with state.lock:
+        _sync_user_index(state, entry)
+        nprobe = _nprobe_for(state.index)
+        return [state.index.search(q, k, nprobe=nprobe) for q in queries]
+
+
+def invalidate_user_index(user_id: int):
+    with _user_lock:
+        _user_states.pop(user_id, None)
+
+
+# ==========================================
+# GLOBAL PROFILE INDEX (user_profile_embeddings)
+# ==========================================
+
+class _ProfileStore:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.vectors = {}
+        self.sigs = {}
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.index = None
+        self.loaded_at = 0.0
+
+
+_profiles = _ProfileStore()
+
+
+def _fetch_profile_vectors(cur, user_ids: list) -> dict:
+    vectors = {}
+
+    for start in range(0, len(user_ids), 1000):
+        chunk = user_ids[start:start + 1000]
+        placeholders = ",".join(["%s"] * len(chunk))
+
+        cur.execute(f"""
+            SELECT user_id, vector_data
+            FROM user_profile_embeddings
+            WHERE user_id IN ({placeholders})
+        """, tuple(chunk))
+
+        for r in cur.fetchall():
+            vectors[r["user_id"]] = np.asarray(json.loads(r["vector_data"]), dtype=np.float32)
+
+    return vectors
+
+
+def _refresh_profiles(store: _ProfileStore):
+
+    with get_cursor() as cur:
+        # Cheap server-side signatures; only changed rows ship their vectors
+        cur.execute("""
+            SELECT e.user_id, CRC32(e.vector_data) AS sig
+            FROM user_profile_embeddings e
+            JOIN users u ON u.id = e.user_id
+            WHERE e.vector_data IS NOT NULL
+              AND u.refer = 'true'
+              AND u.phone IS NOT NULL
+              AND u.phone <> ''
+        """)
+        sigs = {r["user_id"]: r["sig"] for r in cur.fetchall()}
+
+        removed = [uid for uid in store.sigs if uid not in sigs]
+        changed = [uid for uid, sig in sigs.items() if store.sigs.get(uid) != sig]
+
+        fresh = _fetch_profile_vectors(cur, changed) if changed else {}
+
+    for uid in removed:
+        store.vectors.pop(uid, None)
+    store.vectors.update(fresh)
+    store.sigs = sigs
+    store.loaded_at = time.monotonic()
+
+    if not removed and not changed:
+        return
+
+    ids = list(store.vectors)
+    dims = {v.shape[0] for v in store.vectors.values()}
+
+    # A TF-IDF refit changes the vocabulary; mixed sizes mean a refit is mid-flight
+    if len(dims) > 1:
+        dim = max(dims, key=lambda d: sum(v.shape[0] == d for v in store.vectors.values()))
+        ids = [uid for uid in ids if store.vectors[uid].shape[0] == dim]
+
+    store.ids = np.asarray(ids, dtype=np.int64)
+    store.matrix = (
+        l2_normalize(np.vstack([store.vectors[uid] for uid in ids]))
+        if ids else np.zeros((0, 0), dtype=np.float32)
+    )
+
+    if not ANN_ENABLED or len(ids) < ANN_MIN_ROWS:
+        store.index = None
+    elif store.index is None or _needs_retrain(store.index, len(ids), store.matrix.shape[1]):
+        store.index = _build_index(store.ids, store.matrix)
+    else:
+        store.index.remove(removed + changed)
+        positions = np.flatnonzero(np.isin(store.ids, changed))
+        store.index.add(store.ids[positions], store.matrix[positions])
+
+
+def search_profiles(query_vector, k: int, exclude=None):
+    """Returns (user_ids, scores) over referable user profiles, best first."""
+
+    with _profiles.lock:
+        if time.monotonic() - _profiles.loaded_at >= ANN_PROFILE_REFRESH_SECONDS:
+            _refresh_profiles(_profiles)
+
+        store = _profiles
+
+        if len(store.ids) == 0 or store.matrix.shape[1] != np.shape(query_vector)[-1]:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        if store.index is not None:
+            return store.index.search(query_vector, k, nprobe=_nprobe_for(store.index),
+                                      exclude=exclude)
+
+        mask = np.isin(store.ids, list(exclude)) if exclude else None
+        top, scores = cosine_topk(query_vector, store.matrix, k, mask=mask)
+        return store.ids[top], scores
+
+
+def invalidate_profile_index():
+    # Next search re-reads signatures; unchanged vectors are kept
+    with _profiles.lock:
+        _profiles.loaded_at = 0.0
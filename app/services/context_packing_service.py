@@ -0,0 +1,273 @@
+import hashlib
+import threading
+from collections import deque
+import numpy as np
+from openai import OpenAIError
+from app.core.config import (
+    async_client,
+    client,
+    EMBED_BATCH_MAX_INPUTS,
+    EMBED_BATCH_TOKENS,
+    PACK_CHUNK_TOKENS,
+    PACK_SECTION_CACHE_SIZE,
+    PACK_TOKEN_BUDGET,
+)
+from app.services.embedding_service import EMBEDDING_MODEL
+from app.utils.lru import MISSING, TTLCache
+from app.utils.math import l2_normalize
+from app.utils.text import split_profile_sections
+from app.utils.tokens import count_tokens, truncate_to_tokens
+
+# =========================
+# Packs candidate profiles into a token budget for one llm_filter call.
+# Profiles are split into sections (and long sections into chunks), each
+# chunk is scored against the query embedding, and the best chunks are
+# kept: first an equal share per candidate, then whatever budget is left
+# goes to the best remaining chunks overall.
+# =========================
+
+# Smaller leftovers are not worth a truncated chunk
+MIN_CUT_TOKENS = 32
+
+# Chunk embeddings keyed by chunk text; profiles only change on rebuild
+_chunk_vectors = TTLCache(PACK_SECTION_CACHE_SIZE)
+
+_stats_lock = threading.Lock()
+_prompt_tokens = deque(maxlen=1000)
+_stats = {"calls": 0, "packed_tokens": 0, "prompt_tokens": 0, "chunk_embeddings": 0,
+          "fallbacks": 0}
+
+
+def _chunk_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _split_long(body: str, max_tokens: int) -> list:
+
+    # Paragraphs/lines first; a single oversized line is cut by words
+    pieces = []
+    current = []
+    current_tokens = 0
+
+    for line in body.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        tokens = count_tokens(line)
+
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append("\n".join(current))
+            current, current_tokens = [], 0
+
+        if tokens > max_tokens:
+            words = line.split()
+            step = max(1, len(words) * max_tokens // tokens)
+            for i in range(0, len(words), step):
+                pieces.append(" ".join(words[i:i + step]))
+            continue
+
+        current.append(line)
+        current_tokens += tokens
+
+    if current:
+        pieces.append("\n".join(current))
+
+    return pieces
+
+
+def _plan(candidates: list):
+    """Flat list of chunks: (candidate_pos, section_pos, section, text, tokens)."""
+    chunks = []
+
+    for pos, c in enumerate(candidates):
+        sections = [
+            (s, body) for s, body in split_profile_sections(c.get("profile_text"))
+            if s != "CONTACT"  # name is sent separately; phone is not evidence
+        ]
+        for section_pos, (section, body) in enumerate(sections):
+            for text in _split_long(body, PACK_CHUNK_TOKENS):
+                chunks.append((pos, section_pos, section, text, count_tokens(text)))
+
+    return chunks
+
+
+def _missing_texts(chunks: list) -> list:
+    seen = set()
+    missing = []
+    for _, _, _, text, _ in chunks:
+        key = _chunk_key(text)
+        if key not in seen and _chunk_vectors.get(key) is MISSING:
+            seen.add(key)
+            missing.append(text)
+    return missing
+
+
+def _store_vectors(texts: list, data) -> None:
+    for text, d in zip(texts, sorted(data, key=lambda d: d.index)):
+        _chunk_vectors.put(_chunk_key(text), l2_normalize(np.asarray(d.embedding, dtype=np.float32)))
+
+    with _stats_lock:
+        _stats["chunk_embeddings"] += len(texts)
+
+
+def _embedding_batches(texts: list):
+    # Same per-request caps as the contact embedding rebuild
+    batch, tokens = [], 0
+    for text in texts:
+        t = count_tokens(text)
+        if batch and (tokens + t > EMBED_BATCH_TOKENS or len(batch) >= EMBED_BATCH_MAX_INPUTS):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(text)
+        tokens += t
+    if batch:
+        yield batch
+
+
+def _pack_truncated(candidates: list, budget: int):
+    # Fallback when chunk embeddings are unavailable: each profile cut to
+    # an equal share of the budget
+    share = budget // len(candidates) if candidates else 0
+    packed = [
+        {
+            "idx": c["idx"],
+            "name": c["name"],
+            "profile_text": truncate_to_tokens((c["profile_text"] or "").strip(), share)
+        }
+        for c in candidates
+    ]
+
+    with _stats_lock:
+        _stats["fallbacks"] += 1
+
+    return packed, sum(count_tokens(p["profile_text"]) for p in packed)
+
+
+def _similarities(chunks: list, query_embedding) -> np.ndarray:
+    if query_embedding is None or not chunks:
+        return np.zeros(len(chunks), dtype=np.float32)
+
+    q = l2_normalize(query_embedding)
+    sims = np.zeros(len(chunks), dtype=np.float32)
+    for i, (_, _, _, text, _) in enumerate(chunks):
+        v = _chunk_vectors.get(_chunk_key(text))
+        if v is not MISSING:
+            sims[i] = float(v @ q)
+    return sims
+
+
+def _select(candidates: list, chunks: list, sims: np.ndarray, budget: int):
+
+    n = len(candidates)
+    share = budget // n if n else 0
+
+    chosen = [[] for _ in range(n)]
+    used = [0] * n
+    taken = np.zeros(len(chunks), dtype=bool)
+
+    by_score = sorted(range(len(chunks)), key=lambda i: -sims[i])
+
+    # 1️⃣ Every candidate gets its own share, best chunks first
+    for i in by_score:
+        pos, _, _, _, tokens = chunks[i]
+        if used[pos] + tokens <= share:
+            chosen[pos].append((i, chunks[i][3]))
+            used[pos] += tokens
+            taken[i] = True
+
+    # Unused share is filled with a cut of the candidate's best remaining chunk
+    filled = [False] * n
+    for i in by_score:
+        pos = chunks[i][0]
+        room = share - used[pos]
+        if taken[i] or filled[pos] or room < MIN_CUT_TOKENS:
+            continue
+        text = truncate_to_tokens(chunks[i][3], room)
+        chosen[pos].append((i, text))
+        used[pos] += count_tokens(text)
+        taken[i] = True
+        filled[pos] = True
+
+    # 2️⃣ Leftover budget goes to the best remaining chunks overall
+    left = budget - sum(used)
+    for i in by_score:
+        if left <= 0:
+            break
+        if taken[i]:
+            continue
+        pos, _, _, _, tokens = chunks[i]
+        if tokens <= left:
+            chosen[pos].append((i, chunks[i][3]))
+            used[pos] += tokens
+            left -= tokens
+
+    # 3️⃣ Rebuild each profile with its sections in their original order
+    packed = []
+    for pos, c in enumerate(candidates):
+        parts = []
+        last_section = None
+        for i, text in sorted(chosen[pos], key=lambda x: (chunks[x[0]][1], x[0])):
+            section = chunks[i][2]
+            if section != last_section:
+                parts.append(f"{section}:")
+                last_section = section
+            parts.append(text)
+
+        packed.append({
+            "idx": c["idx"],
+            "name": c["name"],
+            "profile_text": "\n".join(parts)
+        })
+
+    return packed, sum(used)
+
+
+def pack_candidates(candidates: list, query_embedding, budget: int = PACK_TOKEN_BUDGET):
+    """Returns (packed candidates for the LLM prompt, profile tokens used)."""
+    chunks = _plan(candidates)
+
+    missing = _missing_texts(chunks) if query_embedding is not None else []
+    try:
+        for batch in _embedding_batches(missing):
+            res = client.embeddings.create(model=EMBEDDING_MODEL, input=batch)
+            _store_vectors(batch, res.data)
+    except OpenAIError:
+        return _pack_truncated(candidates, budget)
+
+    return _select(candidates, chunks, _similarities(chunks, query_embedding), budget)
+
+
+async def pack_candidates_async(candidates: list, query_embedding, budget: int = PACK_TOKEN_BUDGET):
+    chunks = _plan(candidates)
+
+    missing = _missing_texts(chunks) if query_embedding is not None else []
+    try:
+        for batch in _embedding_batches(missing):
+            res = await async_client.embeddings.create(model=EMBEDDING_MODEL, input=batch)
+            _store_vectors(batch, res.data)
+    except OpenAIError:
+        return _pack_truncated(candidates, budget)
+
+    return _select(candidates, chunks, _similarities(chunks, query_embedding), budget)
+
+
+def record_prompt_tokens(packed_tokens: int, prompt_tokens: int) -> None:
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["packed_tokens"] += packed_tokens
+        _stats["prompt_tokens"] += prompt_tokens
+        _prompt_tokens.append(prompt_tokens)
+
+
+def get_prompt_token_stats() -> dict:
+    with _stats_lock:
+        window = np.array(_prompt_tokens) if _prompt_tokens else None
+        return {
+            **_stats,
+            "budget": PACK_TOKEN_BUDGET,
+            "chunk_cache_entries": len(_chunk_vectors),
+            "window": len(_prompt_tokens),
+            "p50_prompt_tokens": float(np.percentile(window, 50)) if window is not None else 0.0,
+            "p95_prompt_tokens": float(np.percentile(window, 95)) if window is not None else 0.0,
+        }
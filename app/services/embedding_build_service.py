@@ -0,0 +1,545 @@
+import hashlib
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from app.core.config import (
+    client,
+    EMBED_BATCH_MAX_INPUTS,
+    EMBED_BATCH_TOKENS,
+    EMBED_CONCURRENCY,
+    EMBED_MAX_INPUT_TOKENS,
+    EMBED_PROFILE_PAGE_ROWS,
+    EMBED_RATE_LIMIT_RPM,
+    EMBED_RATE_LIMIT_TPM,
+    EMBED_WRITE_CHUNK,
+)
+from app.core.database import get_connection
+from app.services.embedding_service import EMBEDDING_MODEL
+from app.services.review_service import load_reviews_by_description
+from app.utils.math import l2_normalize
+from app.utils.rate_limit import RateLimiter
+from app.utils.tokens import count_tokens, truncate_to_tokens
+from app.utils.vectors import encode_embedding
+
+# =========================
+# Rebuilds user_contact_embeddings rows flagged needs_rebuild:
+# pages of rows -> one query per source table per page -> profile
+# text -> token-sized embedding batches (several in flight under
+# a rate limit) -> executemany UPDATEs in chunked transactions.
+# =========================
+
+RETRYABLE = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+MAX_ATTEMPTS = 6
+
+# Both writes only apply if the row was not flagged again after it was
+# read (see rebuild_queue_service.REBUILD_QUEUE_SQL); otherwise it stays
+# flagged and the next run picks up the newer profile.
+UPDATE_SQL = """
+    UPDATE user_contact_embeddings
+    SET profile_text = %s,
+        embedding = %s,
+        context_hash = %s,
+        needs_rebuild = 0
+    WHERE id = %s
+      AND rebuild_version = %s
+"""
+
+# Profile text is byte-identical to what was embedded: just clear the flag
+CLEAR_FLAG_SQL = """
+    UPDATE user_contact_embeddings
+    SET needs_rebuild = 0
+    WHERE id = %s
+      AND rebuild_version = %s
+"""
+
+# Before rebuild_worker.py --migrate there is no rebuild_version to check;
+# writes land unconditionally, as they always did
+LEGACY_SQL = {
+    UPDATE_SQL: """
+        UPDATE user_contact_embeddings
+        SET profile_text = %s,
+            embedding = %s,
+            context_hash = %s,
+            needs_rebuild = 0
+        WHERE id = %s
+    """,
+    CLEAR_FLAG_SQL: """
+        UPDATE user_contact_embeddings
+        SET needs_rebuild = 0
+        WHERE id = %s
+    """,
+}
+
+QUEUE_COLUMNS = ("rebuild_version", "claimed_by", "claimed_until")
+
+
+def sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ==========================================
+# ROWS TO REBUILD
+# ==========================================
+
+def has_queue_columns(cursor) -> bool:
+    """True once the rebuild queue migration has added its columns."""
+
+    cursor.execute(
+        f"""
+        SELECT COUNT(*) AS n
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND TABLE_NAME = 'user_contact_embeddings'
+          AND COLUMN_NAME IN ({_placeholders(QUEUE_COLUMNS)})
+        """,
+        QUEUE_COLUMNS
+    )
+    return cursor.fetchone()["n"] == len(QUEUE_COLUMNS)
+
+
+def clear_orphans(conn, embedding_ids=None, versioned: bool = True) -> int:
+    """
+    Clears needs_rebuild on rows whose contact no longer exists. select_rows
+    can never build them, so they would otherwise stay queued forever.
+    """
+    where = "uce.needs_rebuild = 1 AND c.id IS NULL"
+    params = ()
+
+    if embedding_ids:
+        where += f" AND uce.id IN ({','.join(['%s'] * len(embedding_ids))})"
+        params = tuple(embedding_ids)
+
+    claim = ", uce.claimed_by = NULL, uce.claimed_until = NULL" if versioned else ""
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"""
+            UPDATE user_contact_embeddings uce
+            LEFT JOIN contacts c ON c.id = uce.contact_id
+            SET uce.needs_rebuild = 0{claim}
+            WHERE {where}
+            """,
+            params
+        )
+        return max(cursor.rowcount, 0)
+    finally:
+        cursor.close()
+
+
+def select_rows(cursor, embedding_ids=None, limit: int = None, versioned: bool = True):
+
+    where = "uce.needs_rebuild = 1"
+    params = ()
+
+    if embedding_ids:
+        where += f" AND uce.id IN ({','.join(['%s'] * len(embedding_ids))})"
+        params = tuple(embedding_ids)
+
+    sql = f"""
+        SELECT
+            uce.id AS embedding_id,
+            uce.user_id,
+            uce.contact_id,
+            uce.context_hash AS stored_hash,
+            uce.embedding IS NOT NULL AS has_embedding,
+            {"uce.rebuild_version" if versioned else "0 AS rebuild_version"},
+            c.phone,
+            uc.id AS user_contact_id,
+            uc.display_name,
+            cu.id AS contact_user_id,
+            cu.fname,
+            cu.lname
+        FROM user_contact_embeddings uce
+        JOIN contacts c ON c.id = uce.contact_id
+        LEFT JOIN user_contacts uc
+               ON uc.user_id = uce.user_id
+              AND uc.contact_id = uce.contact_id
+        LEFT JOIN users cu
+               ON cu.phone = c.phone
+        WHERE {where}
+        ORDER BY uce.id
+    """
+    if limit:
+        sql += " LIMIT %s"
+        params += (limit,)
+
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+# ==========================================
+# PROFILE SOURCES (one set-based query per table per page)
+# ==========================================
+
+def _placeholders(values) -> str:
+    return ",".join(["%s"] * len(values))
+
+
+def load_profile_sources(cursor, rows, reviews_collection=None) -> dict:
+
+    contact_user_ids = sorted({r["contact_user_id"] for r in rows if r["contact_user_id"]})
+    user_contact_ids = sorted({r["user_contact_id"] for r in rows if r["user_contact_id"]})
+
+    sources = {
+        "descriptions": {},   # contact_user_id -> [{id, label, description}]
+        "personal": {},       # user_contact_id -> [{label, description}]
+        "cvs": {},            # contact_user_id -> cv
+        "reviews": {},        # default_description id -> [review]
+        "sql_queries": 0,
+        "mongo_queries": 0,
+    }
+
+    if contact_user_ids:
+        # 1️⃣ Default descriptions: identity AND review context
+        cursor.execute(
+            f"""
+            SELECT id, users_id, label, description
+            FROM default_description
+            WHERE users_id IN ({_placeholders(contact_user_ids)})
+            ORDER BY id
+            """,
+            tuple(contact_user_ids)
+        )
+        for d in cursor.fetchall():
+            sources["descriptions"].setdefault(d["users_id"], []).append(d)
+
+        # 2️⃣ CVs: the first row per user, as the per-row fetch_one read it
+        cursor.execute(
+            f"""
+            SELECT user_id, cv
+            FROM users_cv
+            WHERE user_id IN ({_placeholders(contact_user_ids)})
+            """,
+            tuple(contact_user_ids)
+        )
+        for c in cursor.fetchall():
+            sources["cvs"].setdefault(c["user_id"], c["cv"])
+
+        sources["sql_queries"] += 2
+
+    if user_contact_ids:
+        # 3️⃣ Personal labels
+        cursor.execute(
+            f"""
+            SELECT user_contact_id, label, description
+            FROM user_contact_descriptions
+            WHERE user_contact_id IN ({_placeholders(user_contact_ids)})
+            """,
+            tuple(user_contact_ids)
+        )
+        for p in cursor.fetchall():
+            sources["personal"].setdefault(p["user_contact_id"], []).append(p)
+
+        sources["sql_queries"] += 1
+
+    # 4️⃣ Reviews (MongoDB): one $in over every description on the page
+    description_ids = [d["id"] for ds in sources["descriptions"].values() for d in ds]
+    if description_ids:
+        sources["reviews"] = load_reviews_by_description(description_ids, reviews_collection)
+        sources["mongo_queries"] += 1
+
+    return sources
+
+
+# ==========================================
+# PROFILE TEXT
+# ==========================================
+
+def build_profile_text(r, sources: dict) -> str:
+
+    # -------- NAME RESOLUTION --------
+    if r["display_name"]:
+        name = r["display_name"]
+    elif r["fname"] or r["lname"]:
+        name = f"{r['fname'] or ''} {r['lname'] or ''}".strip()
+    else:
+        name = "Unknown"
+
+    desc_rows = sources["descriptions"].get(r["contact_user_id"], []) if r["contact_user_id"] else []
+
+    # -------- DEFAULT IDENTITY --------
+    default_identity = "None"
+    if desc_rows:
+        default_identity = "\n".join(
+            f"- {d['label']}: {d['description']}"
+            for d in desc_rows
+        )
+
+    # -------- PERSONAL LABELS --------
+    personal_labels = "None yet"
+    rows_pl = sources["personal"].get(r["user_contact_id"], []) if r["user_contact_id"] else []
+    if rows_pl:
+        personal_labels = "\n".join(
+            f"- {p['label']}: {p['description']}"
+            for p in rows_pl
+        )
+
+    # -------- CV --------
+    cv_text = "None"
+    if r["contact_user_id"] and sources["cvs"].get(r["contact_user_id"]):
+        cv_text = sources["cvs"][r["contact_user_id"]]
+
+    # -------- REVIEWS --------
+    reviews_text = "None"
+    formatted_reviews = []
+
+    for desc in desc_rows:
+        for review in sources["reviews"].get(desc["id"], []):
+            formatted_reviews.append(
+                f"""[REVIEW CONTEXT]
+Role: {desc['label'] or 'Unknown'}
+Description: {desc['description'] or 'None'}
+Review: {review}
+"""
+            )
+
+    if formatted_reviews:
+        reviews_text = "\n".join(formatted_reviews)
+
+    # -------- PROFILE TEXT --------
+    return f"""CONTACT
+Name: {name}
+Phone: {r['phone']}
+
+DEFAULT IDENTITY
+{default_identity}
+
+MY PERSONAL LABELS
+{personal_labels}
+
+CV
+{cv_text}
+
+REVIEWS
+{reviews_text}
+"""
+
+
+# ==========================================
+# EMBEDDING BATCHES
+# ==========================================
+
+class _Batch:
+
+    def __init__(self):
+        self.items = []   # (embedding_id, rebuild_version, profile_text, context_hash)
+        self.inputs = []
+        self.tokens = 0
+
+
+def _embed_batch(batch: _Batch, limiter: RateLimiter):
+
+    for attempt in range(MAX_ATTEMPTS):
+        limiter.acquire(batch.tokens)
+        try:
+            res = client.embeddings.create(model=EMBEDDING_MODEL, input=batch.inputs)
+            break
+        except RETRYABLE:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(min(60, 2 ** attempt))
+
+    vectors = l2_normalize(np.array(
+        [d.embedding for d in sorted(res.data, key=lambda d: d.index)],
+        dtype=np.float32
+    ))
+
+    return [
+        (profile_text, encode_embedding(vector), context_hash, embedding_id, version)
+        for (embedding_id, version, profile_text, context_hash), vector in zip(batch.items, vectors)
+    ]
+
+
+def _write(conn, updates: list, sql: str = UPDATE_SQL) -> int:
+    """Returns how many rows were written; the rest were flagged again meanwhile."""
+
+    # Pool connections autocommit; one transaction per chunk
+    cursor = conn.cursor()
+    written = 0
+    try:
+        for start in range(0, len(updates), EMBED_WRITE_CHUNK):
+            conn.start_transaction()
+            cursor.executemany(sql, updates[start:start + EMBED_WRITE_CHUNK])
+            written += max(cursor.rowcount, 0)
+            conn.commit()
+        return written
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+class Progress:
+
+    def __init__(self, total: int, every_seconds: float = 5.0):
+        self.total = total
+        self.done = 0
+        self.every = every_seconds
+        self.started = time.perf_counter()
+        self._last = 0.0
+
+    def advance(self, rows: int, force: bool = False):
+        self.done += rows
+        now = time.perf_counter()
+
+        if not force and now - self._last < self.every:
+            return
+        self._last = now
+
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else float("inf")
+
+        print(
+            f"⏳ {self.done}/{self.total} rows | {rate:.1f} rows/s | "
+            f"ETA {_format_seconds(eta)}"
+        )
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds == float("inf"):
+        return "--"
+    minutes, s = divmod(int(seconds), 60)
+    h, m = divmod(minutes, 60)
+    return f"{h}h{m:02d}m{s:02d}s" if h else f"{m}m{s:02d}s"
+
+
+# ==========================================
+# MAIN BUILD
+# ==========================================
+
+def rebuild_embeddings(reviews_collection=None, embedding_ids=None, limit: int = None,
+                       concurrency: int = EMBED_CONCURRENCY, heartbeat=None) -> dict:
+    """heartbeat: optional callable, invoked after every page and write chunk."""
+
+    limiter = RateLimiter(EMBED_RATE_LIMIT_RPM, EMBED_RATE_LIMIT_TPM)
+    beat = heartbeat or (lambda: None)
+
+    with get_connection() as read_conn, get_connection() as write_conn:
+        cursor = read_conn.cursor(dictionary=True)
+
+        versioned = has_queue_columns(cursor)
+        if not versioned:
+            print(
+                "⚠️ user_contact_embeddings has no rebuild_version yet; rows flagged "
+                "again mid-run may be overwritten (run: python rebuild_worker.py --migrate)"
+            )
+
+        orphans = clear_orphans(write_conn, embedding_ids, versioned)
+        if orphans:
+            print(f"⚠️ Cleared needs_rebuild on {orphans} rows without a contact")
+
+        rows = select_rows(cursor, embedding_ids, limit, versioned)
+        print(f"🔄 {len(rows)} embeddings to rebuild")
+
+        progress = Progress(len(rows))
+        pending_writes = []
+        unchanged = []
+        in_flight = set()
+        stats = {
+            "rows": len(rows), "updated": 0, "unchanged": 0,
+            "superseded": 0, "orphans": orphans, "api_calls": 0, "tokens": 0, "tokens_avoided": 0,
+            "sql_queries": 1, "mongo_queries": 0,
+        }
+
+        def flush(updates: list, sql: str, key: str):
+            if versioned:
+                written = _write(write_conn, updates, sql)
+            else:
+                # Drop the trailing rebuild_version parameter
+                written = _write(write_conn, [u[:-1] for u in updates], LEGACY_SQL[sql])
+            stats[key] += written
+            stats["superseded"] += len(updates) - written
+            progress.advance(len(updates))
+            updates.clear()
+            beat()
+
+        def drain(block_until_one: bool):
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED) if block_until_one else (
+                {f for f in in_flight if f.done()}, None
+            )
+            for f in done:
+                in_flight.discard(f)
+                pending_writes.extend(f.result())
+
+            if done:
+                beat()
+
+            if len(pending_writes) >= EMBED_WRITE_CHUNK:
+                flush(pending_writes, UPDATE_SQL, "updated")
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+
+            def submit(batch: _Batch):
+                stats["api_calls"] += 1
+                stats["tokens"] += batch.tokens
+                in_flight.add(pool.submit(_embed_batch, batch, limiter))
+
+                # Keep profile building at most a couple of batches ahead
+                while len(in_flight) >= 2 * max(1, concurrency):
+                    drain(block_until_one=True)
+                drain(block_until_one=False)
+
+            batch = _Batch()
+
+            for page_no, start in enumerate(range(0, len(rows), EMBED_PROFILE_PAGE_ROWS), 1):
+                page = rows[start:start + EMBED_PROFILE_PAGE_ROWS]
+
+                t0 = time.perf_counter()
+                sources = load_profile_sources(cursor, page, reviews_collection)
+                texts = [build_profile_text(r, sources) for r in page]
+                print(
+                    f"📄 page {page_no}: {len(page)} profiles | "
+                    f"{sources['sql_queries']} SQL + {sources['mongo_queries']} Mongo queries | "
+                    f"{(time.perf_counter() - t0) * 1000:.0f} ms"
+                )
+                stats["sql_queries"] += sources["sql_queries"]
+                stats["mongo_queries"] += sources["mongo_queries"]
+                beat()
+
+                for r, profile_text in zip(page, texts):
+                    context_hash = sha256(profile_text)
+
+                    # Same text as the stored embedding: no API call needed
+                    if r["has_embedding"] and context_hash == r["stored_hash"]:
+                        unchanged.append((r["embedding_id"], r["rebuild_version"]))
+                        stats["tokens_avoided"] += count_tokens(profile_text)
+                        if len(unchanged) >= EMBED_WRITE_CHUNK:
+                            flush(unchanged, CLEAR_FLAG_SQL, "unchanged")
+                        continue
+
+                    embed_input = truncate_to_tokens(profile_text, EMBED_MAX_INPUT_TOKENS)
+                    tokens = count_tokens(embed_input)
+
+                    if batch.items and (
+                        batch.tokens + tokens > EMBED_BATCH_TOKENS
+                        or len(batch.items) >= EMBED_BATCH_MAX_INPUTS
+                    ):
+                        submit(batch)
+                        batch = _Batch()
+
+                    batch.items.append((r["embedding_id"], r["rebuild_version"], profile_text, context_hash))
+                    batch.inputs.append(embed_input)
+                    batch.tokens += tokens
+
+            if batch.items:
+                submit(batch)
+
+            while in_flight:
+                drain(block_until_one=True)
+
+        if pending_writes:
+            flush(pending_writes, UPDATE_SQL, "updated")
+
+        if unchanged:
+            flush(unchanged, CLEAR_FLAG_SQL, "unchanged")
+
+        progress.advance(0, force=True)
+
+        cursor.close()
+
+    stats["seconds"] = round(time.perf_counter() - progress.started, 1)
+    return stats
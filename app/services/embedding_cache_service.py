@@ -0,0 +1,292 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from app.core.config import (
+    EMBEDDING_CACHE_MAX_BYTES,
+    EMBEDDING_DIM,
+    EMBEDDING_STORAGE,
+    RETRIEVAL_FETCH_CHUNK,
+)
+from app.core.database import get_cursor
+from app.services.embedding_shard_service import open_user_shard, shards_enabled, write_user_shard
+from app.utils.math import l2_normalize
+from app.utils.quantize import BYTES_PER_VALUE, QuantizedMatrix
+from app.utils.vectors import decode_embedding
+
+
+# ==========================================
+# CACHE ENTRY
+# ==========================================
+
+class UserEmbeddingMatrix:
+    """
+    All contact embeddings of one user as a contiguous, L2-normalized
+    (n, d) float32 matrix. Row i belongs to embedding_ids[i] / contact_ids[i].
+
+    With quantized storage, `quantized` holds the compact copy used for the
+    first pass and `matrix` is either a memory-mapped shard or None (full
+    precision is then re-read from MySQL for rescoring).
+    """
+
+    def __init__(self, user_id, fingerprint, embedding_ids, contact_ids,
+                 context_hashes, matrix):
+        self.user_id = user_id
+        self.fingerprint = fingerprint
+        self.embedding_ids = embedding_ids
+        self.contact_ids = contact_ids
+        self.context_hashes = context_hashes
+        self.matrix = matrix
+        self.quantized = None
+
+    @property
+    def size(self) -> int:
+        return len(self.embedding_ids)
+
+    @property
+    def nbytes(self) -> int:
+        # Memory-mapped shards live in the shared page cache, not in our heap
+        matrix_bytes = 0
+        if self.matrix is not None and not isinstance(self.matrix, np.memmap):
+            matrix_bytes = self.matrix.nbytes
+        return (
+            matrix_bytes
+            + (self.quantized.nbytes if self.quantized is not None else 0)
+            + self.embedding_ids.nbytes
+            + self.contact_ids.nbytes
+            + sum(len(h or "") for h in self.context_hashes)
+        )
+
+    def compact(self, kind: str):
+        if kind == "float32" or self.size == 0:
+            return
+
+        self.quantized = QuantizedMatrix.from_float32(self.matrix, kind)
+
+        # A mapped shard costs no heap, so it stays as the rescoring source
+        if not isinstance(self.matrix, np.memmap):
+            self.matrix = None
+
+
+# ==========================================
+# PROCESS-LEVEL LRU
+# ==========================================
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_total_bytes = 0
+_stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "shard_loads": 0, "too_large": 0,
+          "raced": 0}
+
+
+def _fetch_fingerprint(cur, user_id: int):
+    # Any change of membership, context_hash or needs_rebuild changes this
+    cur.execute("""
+        SELECT COUNT(*) AS n,
+               COALESCE(SUM(uce.needs_rebuild), 0) AS pending,
+               COALESCE(BIT_XOR(CRC32(CONCAT_WS(':',
+                   uce.id, uce.contact_id,
+                   COALESCE(uce.context_hash, ''), uce.needs_rebuild
+               ))), 0) AS sig
+        FROM user_contact_embeddings uce
+        WHERE uce.user_id = %s
+    """, (user_id,))
+
+    row = cur.fetchone()
+    return (int(row["n"]), int(row["pending"]), int(row["sig"]))
+
+
+def iter_embedding_chunks(cur, user_id: int, chunk_size: int):
+    """
+    Streams a user's (ids, contact_ids, context_hashes, vectors) in bounded
+    fetchmany chunks. Only ids and vectors travel; profile_text stays in MySQL.
+    Vectors come back L2-normalized.
+    """
+    cur.execute("""
+        SELECT uce.id, uce.contact_id, uce.context_hash, uce.embedding
+        FROM user_contact_embeddings uce
+        JOIN contacts c ON c.id = uce.contact_id
+        WHERE uce.user_id = %s
+          AND uce.embedding IS NOT NULL
+        ORDER BY uce.id
+    """, (user_id,))
+
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+
+        ids = []
+        contact_ids = []
+        context_hashes = []
+        vectors = []
+
+        for r in rows:
+            try:
+                vectors.append(decode_embedding(r["embedding"]))
+            except (ValueError, TypeError):
+                continue
+
+            ids.append(r["id"])
+            contact_ids.append(r["contact_id"])
+            context_hashes.append(r["context_hash"])
+
+        if vectors:
+            yield ids, contact_ids, context_hashes, l2_normalize(np.vstack(vectors))
+
+
+def _load_matrix(cur, user_id: int, fingerprint) -> UserEmbeddingMatrix:
+
+    embedding_ids = []
+    contact_ids = []
+    context_hashes = []
+    matrix = None
+    filled = 0
+
+    for ids, cids, hashes, block in iter_embedding_chunks(cur, user_id, RETRIEVAL_FETCH_CHUNK):
+        # Sized from the fingerprint row count; the COUNT ran in its own
+        # autocommit snapshot, so rows inserted since then grow the buffer
+        if matrix is None:
+            matrix = np.empty((max(fingerprint[0], len(ids)), block.shape[1]), dtype=np.float32)
+        elif filled + len(ids) > len(matrix):
+            grown = np.empty((max(2 * len(matrix), filled + len(ids)), matrix.shape[1]), dtype=np.float32)
+            grown[:filled] = matrix[:filled]
+            matrix = grown
+
+        matrix[filled:filled + len(ids)] = block
+        filled += len(ids)
+
+        embedding_ids.extend(ids)
+        contact_ids.extend(cids)
+        context_hashes.extend(hashes)
+
+    if matrix is None:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+    elif filled < len(matrix):
+        matrix = matrix[:filled].copy()
+
+    return UserEmbeddingMatrix(
+        user_id=user_id,
+        fingerprint=fingerprint,
+        embedding_ids=np.asarray(embedding_ids, dtype=np.int64),
+        contact_ids=np.asarray(contact_ids, dtype=np.int64),
+        context_hashes=context_hashes,
+        matrix=matrix,
+    )
+
+
+def _store(entry: UserEmbeddingMatrix):
+    global _total_bytes
+
+    with _lock:
+        old = _entries.pop(entry.user_id, None)
+        if old is not None:
+            _total_bytes -= old.nbytes
+
+        # Too big to ever fit: serve it uncached
+        if entry.nbytes > EMBEDDING_CACHE_MAX_BYTES:
+            return
+
+        _entries[entry.user_id] = entry
+        _total_bytes += entry.nbytes
+
+        while _total_bytes > EMBEDDING_CACHE_MAX_BYTES and _entries:
+            _, evicted = _entries.popitem(last=False)
+            _total_bytes -= evicted.nbytes
+            _stats["evictions"] += 1
+
+
+def get_user_matrix(user_id: int):
+    """
+    Cached matrix for the user, or None when the user's matrix could never
+    fit the cache budget (the caller streams those rows instead).
+    """
+
+    with get_cursor() as cur:
+        fingerprint = _fetch_fingerprint(cur, user_id)
+
+        with _lock:
+            entry = _entries.get(user_id)
+            if entry is not None and entry.fingerprint == fingerprint:
+                _entries.move_to_end(user_id)
+                _stats["hits"] += 1
+                return entry
+
+            _stats["stale" if entry is not None else "misses"] += 1
+
+        entry = None
+        if shards_enabled():
+            shard = open_user_shard(user_id, fingerprint)
+            if shard is not None:
+                entry = UserEmbeddingMatrix(**shard)
+                _stats["shard_loads"] += 1
+
+        if entry is None:
+            estimate = fingerprint[0] * EMBEDDING_DIM * BYTES_PER_VALUE[EMBEDDING_STORAGE]
+            if not shards_enabled() and estimate > EMBEDDING_CACHE_MAX_BYTES:
+                _stats["too_large"] += 1
+                return None
+
+            entry = _load_matrix(cur, user_id, fingerprint)
+
+            # Rows changed while loading: serve this load, but don't cache
+            # or shard a matrix that may mix two states
+            if _fetch_fingerprint(cur, user_id) != fingerprint:
+                with _lock:
+                    _stats["raced"] += 1
+                entry.compact(EMBEDDING_STORAGE)
+                return entry
+
+            if shards_enabled():
+                write_user_shard(entry)
+                # Swap the heap copy for the mapping we just wrote
+                shard = open_user_shard(user_id, fingerprint)
+                if shard is not None:
+                    entry = UserEmbeddingMatrix(**shard)
+
+    entry.compact(EMBEDDING_STORAGE)
+    _store(entry)
+    return entry
+
+
+def load_user_matrix(user_id: int, attempts: int = 3) -> UserEmbeddingMatrix:
+    # Straight from MySQL, bypassing the cache (used by the shard exporter).
+    # Retried until the fingerprint is unchanged across the load.
+    with get_cursor() as cur:
+        fingerprint = _fetch_fingerprint(cur, user_id)
+
+        for _ in range(max(1, attempts)):
+            entry = _load_matrix(cur, user_id, fingerprint)
+            current = _fetch_fingerprint(cur, user_id)
+            if current == fingerprint:
+                break
+            fingerprint = current
+
+        return entry
+
+
+def invalidate_user(user_id: int):
+    global _total_bytes
+
+    with _lock:
+        entry = _entries.pop(user_id, None)
+        if entry is not None:
+            _total_bytes -= entry.nbytes
+
+
+def clear_cache():
+    global _total_bytes
+
+    with _lock:
+        _entries.clear()
+        _total_bytes = 0
+
+
+def get_cache_stats() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "users": len(_entries),
+            "bytes": _total_bytes,
+            "max_bytes": EMBEDDING_CACHE_MAX_BYTES,
+            "storage": EMBEDDING_STORAGE,
+        }
@@ -1,9 +1,100 @@
 import numpy as np
-from app.core.config import client
+from app.core.config import async_client, client
+from app.services.query_cache_service import query_embedding_cache
+from app.utils.text import canonicalize_query, collapse_whitespace
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def _cache_key(text: str) -> str:
+    # "developer", "Developer?" and "find me the best developer" share one
+    # key. The key is also the string sent to the API, so every cached
+    # vector is the embedding of its key.
+    key = canonicalize_query(text or "") or collapse_whitespace(text or "").lower()
+    if not key:
+        # Rejected here, before it can fail a whole embeddings batch
+        raise ValueError("cannot embed an empty prompt")
+    return key
+
 
 def get_embedding(text: str) -> np.ndarray:
+
+    key = _cache_key(text)
+
+    cached = query_embedding_cache.get(EMBEDDING_MODEL, key)
+    if cached is not None:
+        return cached
+
     res = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
+        model=EMBEDDING_MODEL,
+        input=key
+    )
+    embedding = np.array(res.data[0].embedding, dtype=np.float32)
+
+    return query_embedding_cache.put(EMBEDDING_MODEL, key, embedding)
+
+
+async def get_embedding_async(text: str) -> np.ndarray:
+
+    key = _cache_key(text)
+
+    cached = query_embedding_cache.get(EMBEDDING_MODEL, key)
+    if cached is not None:
+        return cached
+
+    res = await async_client.embeddings.create(
+        model=EMBEDDING_MODEL,
+        input=key
     )
-    return np.array(res.data[0].embedding, dtype=np.float32)
+    embedding = np.array(res.data[0].embedding, dtype=np.float32)
+
+    return query_embedding_cache.put(EMBEDDING_MODEL, key, embedding)
+
+
+def _split_cached(texts: list):
+
+    keys = [_cache_key(t) for t in texts]
+    vectors = [query_embedding_cache.get(EMBEDDING_MODEL, k) for k in keys]
+
+    # One API input per distinct uncached key
+    missing = list(dict.fromkeys(k for k, v in zip(keys, vectors) if v is None))
+
+    return keys, vectors, missing
+
+
+def _fill(keys: list, vectors: list, missing: list, data) -> list:
+
+    fresh = {
+        key: query_embedding_cache.put(EMBEDDING_MODEL, key, np.array(d.embedding, dtype=np.float32))
+        for key, d in zip(missing, data)
+    }
+    return [v if v is not None else fresh[k] for k, v in zip(keys, vectors)]
+
+
+def get_embeddings(texts: list) -> list:
+    """get_embedding for many texts with a single embeddings.create call for the misses."""
+
+    keys, vectors, missing = _split_cached(texts)
+
+    data = []
+    if missing:
+        res = client.embeddings.create(model=EMBEDDING_MODEL, input=missing)
+        data = sorted(res.data, key=lambda d: d.index)
+
+    return _fill(keys, vectors, missing, data)
+
+
+async def get_embeddings_async(texts: list) -> list:
+
+    keys, vectors, missing = _split_cached(texts)
+
+    data = []
+    if missing:
+        res = await async_client.embeddings.create(model=EMBEDDING_MODEL, input=missing)
+        data = sorted(res.data, key=lambda d: d.index)
+
+    return _fill(keys, vectors, missing, data)
+
+
+def get_embedding_cache_stats() -> dict:
+    return query_embedding_cache.stats()
@@ -0,0 +1,123 @@
+import json
+import os
+import uuid
+import numpy as np
+from app.core.config import EMBEDDING_SHARD_DIR
+
+# On-disk layout, one directory per user:
+#   <EMBEDDING_SHARD_DIR>/<user_id>/manifest.json
+#   <EMBEDDING_SHARD_DIR>/<user_id>/matrix-<gen>.f32   raw (n, d) little-endian float32, L2-normalized
+#   <EMBEDDING_SHARD_DIR>/<user_id>/ids-<gen>.npy      (n, 2) int64: embedding_id, contact_id
+# Data files are never modified in place. A rewrite writes a new generation
+# and then swaps manifest.json with os.replace, so readers always see a
+# complete shard.
+
+SHARD_FORMAT_VERSION = 1
+SHARD_DTYPE = np.dtype("<f4")
+
+
+def shards_enabled() -> bool:
+    return bool(EMBEDDING_SHARD_DIR)
+
+
+def _user_dir(user_id: int) -> str:
+    return os.path.join(EMBEDDING_SHARD_DIR, str(user_id))
+
+
+def _read_manifest(user_dir: str):
+    try:
+        with open(os.path.join(user_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_atomic(path: str, write):
+    tmp = f"{path}.tmp-{uuid.uuid4().hex}"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def write_user_shard(entry):
+    user_dir = _user_dir(entry.user_id)
+    os.makedirs(user_dir, exist_ok=True)
+
+    previous = _read_manifest(user_dir)
+    generation = uuid.uuid4().hex[:12]
+
+    matrix_file = f"matrix-{generation}.f32"
+    ids_file = f"ids-{generation}.npy"
+
+    matrix = np.ascontiguousarray(entry.matrix, dtype=SHARD_DTYPE)
+    ids = np.stack([entry.embedding_ids, entry.contact_ids], axis=1).astype(np.int64)
+
+    _write_atomic(os.path.join(user_dir, matrix_file), lambda f: f.write(matrix.tobytes()))
+    _write_atomic(os.path.join(user_dir, ids_file), lambda f: np.save(f, ids))
+
+    manifest = {
+        "format_version": SHARD_FORMAT_VERSION,
+        "user_id": entry.user_id,
+        "rows": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "dtype": SHARD_DTYPE.str,
+        "fingerprint": list(entry.fingerprint),
+        "matrix_file": matrix_file,
+        "ids_file": ids_file,
+        "context_hashes": list(entry.context_hashes),
+    }
+
+    _write_atomic(
+        os.path.join(user_dir, "manifest.json"),
+        lambda f: f.write(json.dumps(manifest).encode("utf-8"))
+    )
+
+    # Only the generation we replaced; readers that already mapped it keep
+    # their pages until they drop the mapping
+    if previous:
+        for name in (previous.get("matrix_file"), previous.get("ids_file")):
+            if name and name not in (matrix_file, ids_file):
+                try:
+                    os.remove(os.path.join(user_dir, name))
+                except FileNotFoundError:
+                    pass
+
+
+def open_user_shard(user_id: int, fingerprint=None):
+    """
+    Maps a user's shard without copying it and returns the keyword arguments
+    for UserEmbeddingMatrix. Returns None when there is no shard, it is from
+    another format version, or its fingerprint differs.
+    """
+    user_dir = _user_dir(user_id)
+    manifest = _read_manifest(user_dir)
+
+    if not manifest or manifest.get("format_version") != SHARD_FORMAT_VERSION:
+        return None
+
+    if fingerprint is not None and tuple(manifest["fingerprint"]) != tuple(fingerprint):
+        return None
+
+    rows, dim = manifest["rows"], manifest["dim"]
+
+    try:
+        ids = np.load(os.path.join(user_dir, manifest["ids_file"]), mmap_mode="r")
+        matrix = (
+            np.memmap(os.path.join(user_dir, manifest["matrix_file"]),
+                      dtype=SHARD_DTYPE, mode="r", shape=(rows, dim))
+            if rows else np.zeros((0, 0), dtype=np.float32)
+        )
+    except (FileNotFoundError, ValueError):
+        # Lost a race with a rewrite; the caller falls back to MySQL
+        return None
+
+    return {
+        "user_id": user_id,
+        "fingerprint": tuple(manifest["fingerprint"]),
+        "embedding_ids": ids[:, 0] if rows else np.zeros(0, dtype=np.int64),
+        "contact_ids": ids[:, 1] if rows else np.zeros(0, dtype=np.int64),
+        "context_hashes": manifest["context_hashes"],
+        "matrix": matrix,
+    }
@@ -0,0 +1,68 @@
+import threading
+from app.core.config import JUDGMENT_CACHE_SIZE, JUDGMENT_CACHE_TTL_SECONDS
+from app.utils.lru import MISSING, TTLCache
+from app.utils.text import canonicalize_query
+
+# Bump when the llm_filter prompt or model changes so old verdicts die
+JUDGMENT_VERSION = 3
+
+_cache = TTLCache(JUDGMENT_CACHE_SIZE, JUDGMENT_CACHE_TTL_SECONDS)
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _key(prompt: str, query_type: str, context_hash: str):
+    return (JUDGMENT_VERSION, canonicalize_query(prompt) or prompt.strip(), query_type, context_hash)
+
+
+def split_cached(prompt: str, query_type: str, candidates: list):
+    """
+    Returns (verdicts, pending): cached verdicts by candidate idx and the
+    candidates still to be judged.
+    Candidates without a context_hash are always judged.
+    """
+    verdicts = {}
+    pending = []
+
+    for c in candidates:
+        h = c.get("context_hash")
+        verdict = _cache.get(_key(prompt, query_type, h)) if h else MISSING
+
+        if verdict is MISSING:
+            pending.append(c)
+        else:
+            verdicts[c["idx"]] = verdict
+
+    with _stats_lock:
+        _stats["hits"] += len(verdicts)
+        _stats["misses"] += len(pending)
+
+    return verdicts, pending
+
+
+def store_verdicts(prompt: str, query_type: str, judged_candidates: list, results: list):
+    by_idx = {r["idx"]: r for r in results if isinstance(r.get("idx"), int)}
+
+    for c in judged_candidates:
+        h = c.get("context_hash")
+        r = by_idx.get(c["idx"])
+
+        # Only verdicts the LLM actually returned; an omitted candidate
+        # says nothing about the contact and is judged again next time
+        if not h or r is None:
+            continue
+
+        _cache.put(
+            _key(prompt, query_type, h),
+            {"confidence": r.get("confidence", 0.0), "reason": r.get("reason", "")}
+        )
+
+
+def get_judgment_cache_stats() -> dict:
+    with _stats_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "hit_rate": _stats["hits"] / lookups if lookups else 0.0,
+            "entries": len(_cache),
+        }
@@ -0,0 +1,156 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.core.config import LEXICAL_BUILD_WORKERS, LEXICAL_MAX_USER_INDEXES
+from app.core.database import get_cursor
+from app.utils.bm25 import BM25Index
+
+# ==========================================
+# PER-USER BM25 INDEXES
+# Kept in step with the cached contact matrix: rows whose context_hash
+# changed (build_embeddings.py rewrote the profile) are re-indexed, rows
+# that disappeared are dropped, everything else is left alone.
+#
+# The builder and rebuild worker run in their own processes and never
+# touch this state. They don't need to: every profile rewrite changes
+# context_hash, so the next search sees a new matrix fingerprint and
+# queues a refresh here. That lazy reconciliation is the whole update
+# path; invalidate_user_lexical is only for callers in this process.
+#
+# Syncing reads profile_text, so it runs on a background pool; searches
+# never wait for it. A cold index serves nothing (vector-only results), a
+# stale one serves its last state until the refresh lands.
+# ==========================================
+
+
+class _LexicalState:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = BM25Index()
+        self.fingerprint = None
+        self.hashes = {}
+        self.refreshing = False
+
+
+_builder = ThreadPoolExecutor(max_workers=max(1, LEXICAL_BUILD_WORKERS),
+                              thread_name_prefix="lexical")
+_build_stats = {"refreshes": 0, "cold_misses": 0, "failures": 0}
+
+
+_lock = threading.Lock()
+_states = OrderedDict()
+
+
+def _user_state(user_id: int) -> _LexicalState:
+    with _lock:
+        state = _states.get(user_id)
+        if state is None:
+            state = _LexicalState()
+            _states[user_id] = state
+            while len(_states) > LEXICAL_MAX_USER_INDEXES:
+                _states.popitem(last=False)
+        else:
+            _states.move_to_end(user_id)
+        return state
+
+
+def _fetch_profile_texts(embedding_ids: list) -> dict:
+    texts = {}
+
+    with get_cursor() as cur:
+        for start in range(0, len(embedding_ids), 1000):
+            batch = embedding_ids[start:start + 1000]
+            placeholders = ",".join(["%s"] * len(batch))
+            cur.execute(f"""
+                SELECT id, profile_text
+                FROM user_contact_embeddings
+                WHERE id IN ({placeholders})
+            """, tuple(batch))
+            texts.update((r["id"], r["profile_text"] or "") for r in cur.fetchall())
+
+    return texts
+
+
+def _sync(state: _LexicalState, entry):
+
+    current = dict(zip(entry.embedding_ids.tolist(), entry.context_hashes))
+
+    with state.lock:
+        known = dict(state.hashes)
+        cold = state.fingerprint is None
+
+    stale = [i for i, h in known.items() if current.get(i, object()) != h]
+    fresh = [i for i, h in current.items() if known.get(i, object()) != h]
+    texts = _fetch_profile_texts(fresh) if fresh else {}
+
+    if cold:
+        # First build: index everything off to the side, then swap it in
+        index = BM25Index()
+        for i, text in texts.items():
+            index.add(i, text)
+        with state.lock:
+            state.index = index
+            state.hashes = current
+            state.fingerprint = entry.fingerprint
+        return
+
+    with state.lock:
+        state.index.remove(stale)
+        for i, text in texts.items():
+            state.index.add(i, text)
+        state.hashes = current
+        state.fingerprint = entry.fingerprint
+
+
+def _refresh(state: _LexicalState, entry):
+    try:
+        _sync(state, entry)
+        with _lock:
+            _build_stats["refreshes"] += 1
+    except Exception as e:
+        print(f"⚠️ BM25 refresh for user {entry.user_id} failed: {e}")
+        with _lock:
+            _build_stats["failures"] += 1
+    finally:
+        with state.lock:
+            state.refreshing = False
+
+
+def search_user_lexical(entry, query: str, k: int):
+    """
+    BM25 over one user's contact profiles: (embedding_ids, scores), best
+    first. Empty while the user's index is still being built.
+    """
+    state = _user_state(entry.user_id)
+
+    with state.lock:
+        # At most one refresh per user in flight
+        if state.fingerprint != entry.fingerprint and not state.refreshing:
+            state.refreshing = True
+            _builder.submit(_refresh, state, entry)
+
+        if state.fingerprint is None:
+            with _lock:
+                _build_stats["cold_misses"] += 1
+            return [], np.zeros(0, dtype=np.float32)
+
+        return state.index.search(query, k)
+
+
+def invalidate_user_lexical(user_id: int):
+    with _lock:
+        _states.pop(user_id, None)
+
+
+def get_lexical_stats() -> dict:
+    with _lock:
+        states = list(_states.values())
+        build_stats = dict(_build_stats)
+    return {
+        "users": len(states),
+        "documents": sum(len(s.index) for s in states),
+        "terms": sum(len(s.index.postings) for s in states),
+        **build_stats,
+    }
@@ -1,17 +1,16 @@
 import json
-from app.core.config import client
+from app.core.config import async_client, client
+from app.services.context_packing_service import (
+    pack_candidates,
+    pack_candidates_async,
+    record_prompt_tokens,
+)
+from app.services.embedding_service import get_embedding, get_embedding_async
+from app.services.judgment_cache_service import split_cached, store_verdicts
+from app.utils.json_stream import ArrayItemStream
 
 
-def llm_filter(prompt: str, candidates: list, query_type: str, top_n: int = 5):
-
-    packed = [
-        {
-            "idx": c["idx"],
-            "name": c["name"],
-            "profile_text": (c["profile_text"] or "")[:1500]
-        }
-        for c in candidates
-    ]
+def _request(prompt: str, packed: list, query_type: str) -> dict:
 
     system = f"""
 You are an intelligent contact matching AI.
@@ -42,6 +41,9 @@ Scoring:
 0.6-0.75 → Possible match
 Below 0.6 → EXCLUDE
 
+Judge every candidate on its own evidence and return one result per
+candidate idx, including the excluded ones.
+
 Return STRICT JSON:
 {{
   "results": [
@@ -52,11 +54,10 @@ Return STRICT JSON:
 
     user = {
         "query": prompt,
-        "candidates": packed,
-        "max_selected": top_n
+        "candidates": packed
     }
 
-    resp = client.chat.completions.create(
+    return dict(
         model="gpt-4.1-mini",
         messages=[
             {"role": "system", "content": system},
@@ -66,8 +67,148 @@ Return STRICT JSON:
         temperature=0
     )
 
-    data = json.loads(resp.choices[0].message.content)
-    results = data.get("results", [])
+
+def _parse_results(content: str, judged_candidates: list) -> list:
+
+    data = json.loads(content)
+    asked = {c["idx"] for c in judged_candidates}
+
+    return [
+        r for r in data.get("results", [])
+        if isinstance(r, dict) and r.get("idx") in asked
+    ]
+
+
+def _record_tokens(resp, packed_tokens: int, stats) -> None:
+
+    usage = getattr(resp, "usage", None)
+    prompt_tokens = usage.prompt_tokens if usage else packed_tokens
+    record_prompt_tokens(packed_tokens, prompt_tokens)
+
+    if stats is not None:
+        stats["packed_tokens"] = stats.get("packed_tokens", 0) + packed_tokens
+        stats["prompt_tokens"] = stats.get("prompt_tokens", 0) + prompt_tokens
+
+
+def finalize_verdicts(verdicts: dict, fresh: list, pending: list, stats=None, top_n: int = None):
+    """Cached + fresh verdicts for one candidate set, minus the rejected ones."""
+
+    if stats is not None:
+        stats["judgment_cache_hits"] = len(verdicts)
+        stats["judgment_cache_misses"] = len(pending)
+        stats.setdefault("packed_tokens", 0)
+        stats.setdefault("prompt_tokens", 0)
+
+    results = [
+        {"idx": idx, **verdict}
+        for idx, verdict in verdicts.items()
+        if verdict
+    ] + fresh
 
     # Hard exclude below 0.6
-    return [r for r in results if r.get("confidence", 0) >= 0.6]
\ No newline at end of file
+    results = [r for r in results if r.get("confidence", 0) >= 0.6]
+
+    if top_n is not None:
+        results = sorted(results, key=lambda r: r.get("confidence", 0), reverse=True)[:top_n]
+
+    return results
+
+
+# ==========================================
+# JUDGE ALREADY PACKED CANDIDATES
+# pending: the candidates without a cached verdict; packed: their
+# prompt-ready form from context_packing_service
+# ==========================================
+
+def judge_packed(prompt: str, pending: list, packed: list, packed_tokens: int,
+                 query_type: str, stats=None) -> list:
+
+    resp = client.chat.completions.create(
+        **_request(prompt, packed, query_type)
+    )
+    _record_tokens(resp, packed_tokens, stats)
+
+    fresh = _parse_results(resp.choices[0].message.content, pending)
+    store_verdicts(prompt, query_type, pending, fresh)
+    return fresh
+
+
+async def judge_packed_async(prompt: str, pending: list, packed: list, packed_tokens: int,
+                             query_type: str, stats=None) -> list:
+
+    resp = await async_client.chat.completions.create(
+        **_request(prompt, packed, query_type)
+    )
+    _record_tokens(resp, packed_tokens, stats)
+
+    fresh = _parse_results(resp.choices[0].message.content, pending)
+    store_verdicts(prompt, query_type, pending, fresh)
+    return fresh
+
+
+async def judge_packed_stream(prompt: str, pending: list, packed: list, packed_tokens: int,
+                              query_type: str, stats=None):
+    """Yields each accepted verdict as soon as it is complete in the streamed response."""
+
+    stream = await async_client.chat.completions.create(
+        **_request(prompt, packed, query_type),
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+
+    asked = {c["idx"] for c in pending}
+    parser = ArrayItemStream()
+    usage_chunk = None
+
+    try:
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage_chunk = chunk
+            if not chunk.choices:
+                continue
+
+            for r in parser.feed(chunk.choices[0].delta.content or ""):
+                # Hard exclude below 0.6
+                if isinstance(r, dict) and r.get("idx") in asked and r.get("confidence", 0) >= 0.6:
+                    yield r
+    finally:
+        await stream.close()
+
+    _record_tokens(usage_chunk, packed_tokens, stats)
+    store_verdicts(prompt, query_type, pending, _parse_results(parser.text, pending))
+
+
+# ==========================================
+# ONE-CALL FILTERS (cache split + pack + judge)
+# ==========================================
+
+def llm_filter(prompt: str, candidates: list, query_type: str, top_n: int = 5, stats=None,
+               query_embedding=None):
+
+    # Only contacts without a cached verdict for this query go to the LLM
+    verdicts, pending = split_cached(prompt, query_type, candidates)
+    fresh = []
+
+    if pending:
+        # Send the profile sections closest to the query, within the token budget
+        if query_embedding is None:
+            query_embedding = get_embedding(prompt)
+        packed, packed_tokens = pack_candidates(pending, query_embedding)
+        fresh = judge_packed(prompt, pending, packed, packed_tokens, query_type, stats)
+
+    return finalize_verdicts(verdicts, fresh, pending, stats, top_n)
+
+
+async def llm_filter_async(prompt: str, candidates: list, query_type: str, top_n: int = 5, stats=None,
+                           query_embedding=None):
+
+    verdicts, pending = split_cached(prompt, query_type, candidates)
+    fresh = []
+
+    if pending:
+        if query_embedding is None:
+            query_embedding = await get_embedding_async(prompt)
+        packed, packed_tokens = await pack_candidates_async(pending, query_embedding)
+        fresh = await judge_packed_async(prompt, pending, packed, packed_tokens, query_type, stats)
+
+    return finalize_verdicts(verdicts, fresh, pending, stats, top_n)
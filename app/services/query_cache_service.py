@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from app.core.config import (
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+    QUERY_EMBEDDING_CACHE_PATH,
+)
+from app.utils.vectors import decode_embedding, encode_embedding
+
+
+class QueryEmbeddingCache:
+    """
+    Two-tier cache for query embeddings keyed by (model, canonical prompt):
+    an in-process LRU in front of an optional sqlite file shared by workers.
+    A TTL of 0 disables expiry.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, path: str = ""):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._disk = None
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0}
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute("""
+                CREATE TABLE IF NOT EXISTS query_embeddings (
+                    model      TEXT NOT NULL,
+                    prompt     TEXT NOT NULL,
+                    embedding  BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (model, prompt)
+                )
+            """)
+            self._disk.commit()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key, vector, created_at):
+        self._memory[key] = (vector, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, model: str, prompt: str):
+        key = (model, prompt)
+
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                vector, created_at = hit
+                if not self._expired(created_at):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return vector
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT embedding, created_at FROM query_embeddings WHERE model = ? AND prompt = ?",
+                    key
+                ).fetchone()
+
+                if row is not None and not self._expired(row[1]):
+                    vector = decode_embedding(row[0])
+                    self._remember(key, vector, row[1])
+                    self._stats["disk_hits"] += 1
+                    return vector
+
+                if row is not None:
+                    self._stats["expired"] += 1
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, model: str, prompt: str, vector):
+        key = (model, prompt)
+        created_at = time.time()
+        vector = decode_embedding(encode_embedding(vector))
+
+        with self._lock:
+            self._remember(key, vector, created_at)
+
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?, ?)",
+                    (model, prompt, encode_embedding(vector), created_at)
+                )
+                self._disk.commit()
+
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM query_embeddings")
+                self._disk.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            lookups = hits + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._memory),
+                "persistent": self._disk is not None,
+            }
+
+
+query_embedding_cache = QueryEmbeddingCache(
+    max_entries=QUERY_EMBEDDING_CACHE_SIZE,
+    ttl_seconds=QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+    path=QUERY_EMBEDDING_CACHE_PATH,
+)
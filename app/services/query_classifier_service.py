@@ -1,10 +1,43 @@
 import json
-from app.core.config import client
+import os
+import threading
+import time
+import numpy as np
+from openai import OpenAIError
+from app.core.config import (
+    async_client,
+    client,
+    QUERY_CLASSIFIER_MODEL_PATH,
+    QUERY_CLASSIFIER_MIN_CONFIDENCE,
+    QUERY_CLASSIFIER_LABEL_LOG,
+)
+from app.services.embedding_service import EMBEDDING_MODEL
+from app.utils.centroid_classifier import CentroidClassifier
 
+QUERY_TYPES = ("broad_skill", "specific_domain", "personal_trait", "ambiguous")
 
-def classify_query(prompt: str):
+# Seed examples used until train_query_classifier.py has produced a model
+PROTOTYPE_QUERIES = {
+    "broad_skill": [
+        "developer", "programmer", "someone who can make applications",
+        "build websites", "software engineer", "designer", "good at coding",
+    ],
+    "specific_domain": [
+        "Big Data engineer", "DevOps", "Kubernetes expert", "cybersecurity specialist",
+        "blockchain developer", "Solidity", "machine learning researcher", "AI engineer",
+    ],
+    "personal_trait": [
+        "funny", "trustworthy", "friendly", "someone reliable",
+        "kind person", "good listener", "honest and hardworking",
+    ],
+    "ambiguous": [
+        "someone", "help", "who can I ask", "anyone good",
+        "a person", "something interesting", "not sure",
+    ],
+}
 
-    system = """
+
+SYSTEM_PROMPT = """
 You are a professional query analyzer.
 
 Classify the query into ONE category:
@@ -25,15 +58,196 @@ Return STRICT JSON:
 { "type": "<category>" }
 """
 
-    resp = client.chat.completions.create(
+
+def _request(prompt: str) -> dict:
+    return dict(
         model="gpt-4.1-mini",
         messages=[
-            {"role": "system", "content": system},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
         ],
         response_format={"type": "json_object"},
         temperature=0
     )
 
-    data = json.loads(resp.choices[0].message.content)
-    return data.get("type", "ambiguous")
\ No newline at end of file
+
+# ==========================================
+# LOCAL MODEL
+# ==========================================
+
+# After a failed load/seed, the LLM classifies alone for this long
+MODEL_RETRY_SECONDS = 60
+
+_model = None
+_model_failed_at = None
+_seeding = False
+_model_lock = threading.Lock()
+_state_lock = threading.Lock()  # _stats, _model_failed_at, _seeding
+_log_lock = threading.Lock()
+_stats = {"local": 0, "llm_fallback": 0, "llm_only": 0, "model_errors": 0}
+
+
+def _count(key: str):
+    with _state_lock:
+        _stats[key] += 1
+
+
+def _seed_model() -> CentroidClassifier:
+
+    texts = [q for queries in PROTOTYPE_QUERIES.values() for q in queries]
+    labels = [label for label, queries in PROTOTYPE_QUERIES.items() for _ in queries]
+
+    # One request for every prototype
+    res = client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    embeddings = np.array([d.embedding for d in res.data], dtype=np.float32)
+
+    return CentroidClassifier.fit(embeddings, labels)
+
+
+def get_local_model() -> CentroidClassifier:
+    global _model
+
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if QUERY_CLASSIFIER_MODEL_PATH and os.path.exists(QUERY_CLASSIFIER_MODEL_PATH):
+                    _model = CentroidClassifier.load(QUERY_CLASSIFIER_MODEL_PATH)
+                else:
+                    _model = _seed_model()
+    return _model
+
+
+def _load_in_background():
+    global _model_failed_at, _seeding
+
+    try:
+        get_local_model()
+    except (OpenAIError, OSError, ValueError, KeyError) as e:
+        # Seeding needs the embeddings API; a failure must not fail the search
+        print(f"⚠️ Local query classifier unavailable, using the LLM: {e}")
+        with _state_lock:
+            _model_failed_at = time.monotonic()
+            _stats["model_errors"] += 1
+    finally:
+        with _state_lock:
+            _seeding = False
+
+
+def warm_local_model():
+    """
+    Starts loading (or seeding) the local model on a background thread.
+    Called at startup and again by any query that finds no model yet;
+    the LLM classifies until it is ready.
+    """
+    global _seeding
+
+    if _model is not None:
+        return
+
+    with _state_lock:
+        if _seeding:
+            return
+        if _model_failed_at is not None and time.monotonic() - _model_failed_at < MODEL_RETRY_SECONDS:
+            return
+        _seeding = True
+
+    threading.Thread(target=_load_in_background, name="query-classifier-seed", daemon=True).start()
+
+
+def classify_local(query_embedding):
+    """Returns (label, confidence) from the local model."""
+    return get_local_model().predict(query_embedding)
+
+
+def _parse_label(content: str) -> str:
+    label = json.loads(content).get("type", "ambiguous")
+    return label if label in QUERY_TYPES else "ambiguous"
+
+
+def _log_label(prompt: str, label: str, latency_ms: float):
+    # Training data for train_query_classifier.py
+    if not QUERY_CLASSIFIER_LABEL_LOG:
+        return
+
+    line = json.dumps({
+        "prompt": prompt,
+        "label": label,
+        "latency_ms": round(latency_ms, 1),
+        "ts": time.time(),
+    }, ensure_ascii=False)
+
+    with _log_lock:
+        os.makedirs(os.path.dirname(os.path.abspath(QUERY_CLASSIFIER_LABEL_LOG)), exist_ok=True)
+        with open(QUERY_CLASSIFIER_LABEL_LOG, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _local_or_none(query_embedding):
+    if query_embedding is None:
+        return None
+
+    # Never loads or seeds on the request path, sync or async
+    model = _model
+    if model is None:
+        warm_local_model()
+        _count("llm_fallback")
+        return None
+
+    label, confidence = model.predict(query_embedding)
+
+    if confidence >= QUERY_CLASSIFIER_MIN_CONFIDENCE:
+        _count("local")
+        return label
+
+    _count("llm_fallback")
+    return None
+
+
+# ==========================================
+# PUBLIC API
+# ==========================================
+
+def classify_query(prompt: str, query_embedding=None):
+
+    label = _local_or_none(query_embedding)
+    if label is not None:
+        return label
+
+    if query_embedding is None:
+        _count("llm_only")
+
+    started = time.perf_counter()
+    resp = client.chat.completions.create(**_request(prompt))
+
+    label = _parse_label(resp.choices[0].message.content)
+    _log_label(prompt, label, (time.perf_counter() - started) * 1000)
+    return label
+
+
+async def classify_query_async(prompt: str, query_embedding=None):
+
+    label = _local_or_none(query_embedding)
+    if label is not None:
+        return label
+
+    if query_embedding is None:
+        _count("llm_only")
+
+    started = time.perf_counter()
+    resp = await async_client.chat.completions.create(**_request(prompt))
+
+    label = _parse_label(resp.choices[0].message.content)
+    _log_label(prompt, label, (time.perf_counter() - started) * 1000)
+    return label
+
+
+def get_classifier_stats() -> dict:
+    with _state_lock:
+        stats = dict(_stats)
+
+    total = stats["local"] + stats["llm_fallback"]
+    return {
+        **stats,
+        "local_rate": stats["local"] / total if total else 0.0,
+        "min_confidence": QUERY_CLASSIFIER_MIN_CONFIDENCE,
+    }
@@ -0,0 +1,162 @@
+from app.core.database import get_connection, get_cursor
+
+# =========================
+# needs_rebuild rows in user_contact_embeddings as a work queue.
+# A worker claims rows by stamping claimed_by / claimed_until; rows whose
+# lease has expired (crashed or stuck worker) can be claimed again.
+# Rebuilt rows clear needs_rebuild, so finished work is never redone.
+# =========================
+
+# Run once before rebuilding (rebuild_worker.py --migrate).
+# rebuild_version goes up whenever a row is (re)flagged by anything other
+# than the claim bookkeeping below; rebuild writes only land when the
+# version they read is still current, so a re-flag during a rebuild is
+# never overwritten with the stale profile.
+REBUILD_QUEUE_SQL = [
+    """
+    ALTER TABLE user_contact_embeddings
+    ADD COLUMN claimed_by VARCHAR(64) NULL,
+    ADD COLUMN claimed_until DATETIME NULL,
+    ADD COLUMN rebuild_version INT UNSIGNED NOT NULL DEFAULT 0
+    """,
+    """
+    CREATE INDEX idx_uce_rebuild_queue
+    ON user_contact_embeddings (needs_rebuild, claimed_until)
+    """,
+    """
+    CREATE TRIGGER uce_rebuild_version
+    BEFORE UPDATE ON user_contact_embeddings
+    FOR EACH ROW
+    SET NEW.rebuild_version = OLD.rebuild_version + IF(
+        NEW.needs_rebuild = 1
+        AND NEW.claimed_by <=> OLD.claimed_by
+        AND NEW.claimed_until <=> OLD.claimed_until,
+        1, 0
+    )
+    """,
+]
+
+# A single-statement UPDATE ... LIMIT is atomic, so two workers never
+# stamp the same row
+CLAIM_SQL = """
+    UPDATE user_contact_embeddings
+    SET claimed_by = %s,
+        claimed_until = NOW() + INTERVAL %s SECOND
+    WHERE needs_rebuild = 1
+      AND (claimed_until IS NULL OR claimed_until < NOW())
+    ORDER BY id
+    LIMIT %s
+"""
+
+# Rows left flagged after a rebuild (a failed batch, or flagged again
+# mid-run) keep their lease end, so nobody retries them before it expires
+RELEASE_SQL = """
+    UPDATE user_contact_embeddings
+    SET claimed_by = NULL,
+        claimed_until = IF(needs_rebuild = 1, claimed_until, NULL)
+    WHERE claimed_by = %s
+      AND id IN ({ids})
+"""
+
+# Heartbeat while a batch runs: slow batches (rate-limit waits, retries)
+# must not be reclaimed and embedded twice
+RENEW_SQL = """
+    UPDATE user_contact_embeddings
+    SET claimed_until = NOW() + INTERVAL %s SECOND
+    WHERE claimed_by = %s
+      AND needs_rebuild = 1
+"""
+
+
+def apply_rebuild_queue_migration():
+
+    with get_cursor() as cursor:
+        for sql in REBUILD_QUEUE_SQL:
+            cursor.execute(sql)
+
+
+def claim_batch(worker_id: str, size: int, lease_seconds: int) -> list:
+
+    with get_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(CLAIM_SQL, (worker_id, lease_seconds, size))
+
+            # Also picks up rows this worker held when it last stopped;
+            # anything past size stays claimed for the next batch
+            cursor.execute(
+                """
+                SELECT id
+                FROM user_contact_embeddings
+                WHERE claimed_by = %s
+                  AND needs_rebuild = 1
+                ORDER BY id
+                LIMIT %s
+                """,
+                (worker_id, size)
+            )
+            return [r["id"] for r in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+
+def renew_claims(worker_id: str, lease_seconds: int):
+
+    with get_cursor() as cursor:
+        cursor.execute(RENEW_SQL, (lease_seconds, worker_id))
+
+
+def release_claims(worker_id: str, embedding_ids: list) -> int:
+    """Releases worker_id's claims on embedding_ids; returns how many rows stay flagged."""
+
+    if not embedding_ids:
+        return 0
+
+    ids = ",".join(["%s"] * len(embedding_ids))
+    params = (worker_id, *embedding_ids)
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"""
+                SELECT COUNT(*)
+                FROM user_contact_embeddings
+                WHERE claimed_by = %s
+                  AND id IN ({ids})
+                  AND needs_rebuild = 1
+                """,
+                params
+            )
+            deferred = cursor.fetchone()[0]
+
+            cursor.execute(RELEASE_SQL.format(ids=ids), params)
+            return deferred
+        finally:
+            cursor.close()
+
+
+def get_rebuild_queue_stats() -> dict:
+
+    with get_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT
+                COUNT(*) AS pending,
+                COALESCE(SUM(claimed_until >= NOW()), 0) AS leased,
+                COUNT(DISTINCT claimed_by) AS active_workers
+            FROM user_contact_embeddings
+            WHERE needs_rebuild = 1
+            """
+        )
+        row = cursor.fetchone()
+
+    pending = int(row["pending"])
+    leased = int(row["leased"])
+
+    return {
+        "pending": pending,
+        "leased": leased,
+        "available": pending - leased,
+        "active_workers": int(row["active_workers"]),
+    }
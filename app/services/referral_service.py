@@ -1,107 +1,268 @@
-from app.services.embedding_service import get_embedding
-from app.services.retrieval_service import retrieve_candidates
-from app.services.llm_filter_service import llm_filter
-from app.services.query_classifier_service import classify_query
-import mysql.connector
-import os
-
-
-def referral_search(my_user_id: int, prompt: str):
-
-    # 🔥 Open fresh connection every time
-    db = mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME"),
-        autocommit=True   # VERY IMPORTANT
-    )
-
-    cursor = db.cursor(dictionary=True)
-
-    # 1️⃣ Get my contacts who are users AND allow referral
-    cursor.execute("""
-        SELECT
-            uc.display_name,
-            u.id   AS referrer_user_id,
-            u.phone,
-            u.refer
-        FROM user_contacts uc
-        JOIN contacts c ON c.id = uc.contact_id
-        JOIN users u ON u.phone = c.phone
-        WHERE uc.user_id = %s
-          AND u.refer = 'true'
-    """, (my_user_id,))
-
-    referrers = cursor.fetchall()
-
-    if not referrers:
-        cursor.close()
-        db.close()
-        return []
+import asyncio
+import threading
+import numpy as np
+from mysql.connector import errors
+from app.core.config import (
+    REFERRAL_CONCURRENCY,
+    REFERRAL_DB_SLOTS,
+    REFERRAL_DEADLINE_SECONDS,
+    REFERRAL_LLM_BATCH,
+    REFERRAL_TOP_K,
+    RETRIEVAL_FETCH_CHUNK,
+)
+from app.core.database import get_cursor
+from app.services.embedding_service import get_embedding_async
+from app.services.retrieval_service import fetch_contact_details
+from app.services.llm_filter_service import llm_filter_async
+from app.services.query_classifier_service import classify_query_async
+from app.utils.math import l2_normalize
+from app.utils.vectors import decode_embedding
 
-    # 2️⃣ Embed & classify once
-    query_embedding = get_embedding(prompt)
-    query_type = classify_query(prompt)
 
-    results = []
+# MySQL ER_QUERY_TIMEOUT: a statement hit its MAX_EXECUTION_TIME
+QUERY_TIMEOUT_ERRNO = 3024
+
+# Held by the thread for as long as it runs, even after the request that
+# started it gave up, so abandoned work cannot drain the connection pool
+_db_slots = threading.BoundedSemaphore(max(1, REFERRAL_DB_SLOTS))
+
+
+def _bounded(fn, *args):
+    if not _db_slots.acquire(timeout=REFERRAL_DEADLINE_SECONDS):
+        raise TimeoutError("no referral DB slot available")
+    try:
+        return fn(*args)
+    finally:
+        _db_slots.release()
+
+
+def _ms_left(deadline_at: float) -> int:
+    # Statement timeout: stops the query itself once nobody waits for it
+    return max(1, int((deadline_at - asyncio.get_running_loop().time()) * 1000))
+
+
+async def _in_thread(deadline_at: float, fn, *args):
+    """fn(*args) in a bounded thread, awaited until deadline_at."""
+    left = deadline_at - asyncio.get_running_loop().time()
+    if left <= 0:
+        raise asyncio.TimeoutError()
+    return await asyncio.wait_for(asyncio.to_thread(_bounded, fn, *args), left)
+
+
+def _load_referrers(my_user_id: int, max_ms: int):
+
+    # My contacts who are users AND allow referral
+    with get_cursor() as cursor:
+        cursor.execute(f"""
+            SELECT /*+ MAX_EXECUTION_TIME({int(max_ms)}) */
+                uc.display_name,
+                u.id   AS referrer_user_id,
+                u.phone,
+                u.refer
+            FROM user_contacts uc
+            JOIN contacts c ON c.id = uc.contact_id
+            JOIN users u ON u.phone = c.phone
+            WHERE uc.user_id = %s
+              AND u.refer = 'true'
+        """, (my_user_id,))
+
+        return cursor.fetchall()
 
-    # 3️⃣ For each referrer → run SAME search pipeline
-    for x in referrers:
 
-        referrer_id = x["referrer_user_id"]
+def _score_all_referrers(referrer_ids: list, query_embedding, top_k: int, max_ms: int):
+    """
+    One query for every referrer's contact embeddings, scored chunk by chunk
+    as they stream in. Returns {referrer_id: [(score, embedding_id, key), ...]}
+    holding each referrer's top_k, where `key` identifies the person
+    (phone, falling back to contact_id) across referrers.
+    """
+    q = l2_normalize(query_embedding)
+    placeholders = ",".join(["%s"] * len(referrer_ids))
 
-        candidates = retrieve_candidates(
-            user_id=referrer_id,
-            query_embedding=query_embedding,
-            top_k=40
+    owners, embedding_ids, keys, scores = [], [], [], []
+
+    with get_cursor() as cur:
+        cur.execute(f"""
+            SELECT /*+ MAX_EXECUTION_TIME({int(max_ms)}) */
+                   uce.id, uce.user_id, uce.contact_id, uce.embedding, c.phone
+            FROM user_contact_embeddings uce
+            JOIN contacts c ON c.id = uce.contact_id
+            WHERE uce.user_id IN ({placeholders})
+              AND uce.embedding IS NOT NULL
+        """, tuple(referrer_ids))
+
+        while True:
+            rows = cur.fetchmany(RETRIEVAL_FETCH_CHUNK)
+            if not rows:
+                break
+
+            vectors = []
+            for r in rows:
+                try:
+                    vectors.append(decode_embedding(r["embedding"]))
+                except (ValueError, TypeError):
+                    continue
+
+                owners.append(r["user_id"])
+                embedding_ids.append(r["id"])
+                keys.append(r["phone"] or f"contact:{r['contact_id']}")
+
+            if vectors:
+                scores.append(l2_normalize(np.vstack(vectors)) @ q)
+
+    if not scores:
+        return {}
+
+    owners = np.asarray(owners)
+    scores = np.concatenate(scores)
+
+    # Group by referrer, best first, then keep the first top_k of each group
+    order = np.lexsort((-scores, owners))
+    group_owner, group_start = np.unique(owners[order], return_index=True)
+    rank = np.arange(len(order)) - np.repeat(group_start, np.diff(np.append(group_start, len(order))))
+
+    per_referrer = {int(o): [] for o in group_owner}
+    for pos in order[rank < top_k]:
+        per_referrer[int(owners[pos])].append(
+            (float(scores[pos]), embedding_ids[pos], keys[pos])
         )
 
-        if not candidates:
+    return per_referrer
+
+
+def _unique_candidates(per_referrer: dict):
+
+    # Shared contacts are judged once, using their best-scoring row
+    best = {}
+    for hits in per_referrer.values():
+        for score, embedding_id, key in hits:
+            if key not in best or score > best[key][0]:
+                best[key] = (score, embedding_id)
+
+    ranked = sorted(best.items(), key=lambda kv: kv[1][0], reverse=True)
+    details = fetch_contact_details([embedding_id for _, (_, embedding_id) in ranked])
+
+    candidates = []
+    for key, (score, embedding_id) in ranked:
+        r = details.get(embedding_id)
+        if not r:
             continue
 
-        judged = llm_filter(
+        candidates.append({
+            "idx": len(candidates),
+            "key": key,
+            "contact_id": r["contact_id"],
+            "context_hash": r["context_hash"],
+            "name": r["display_name"] or "(no name)",
+            "phone": r["phone"],
+            "profile_text": (r["profile_text"] or "").strip(),
+            "score": score
+        })
+
+    return candidates
+
+
+async def _judge_batch(batch, prompt, query_type, query_embedding, limit):
+    async with limit:
+        return await llm_filter_async(
             prompt=prompt,
-            candidates=candidates,
-            query_type=query_type
+            candidates=batch,
+            query_type=query_type,
+            top_n=len(batch),
+            query_embedding=query_embedding
         )
 
-        if not judged:
-            continue
 
-        judged_map = {
-            j["idx"]: j
-            for j in judged
-            if isinstance(j.get("idx"), int)
-        }
+async def referral_search_async(my_user_id: int, prompt: str,
+                                concurrency: int = REFERRAL_CONCURRENCY,
+                                deadline: float = REFERRAL_DEADLINE_SECONDS):
+
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + deadline
+    classify_task = None
+
+    try:
+        # 1️⃣ Referrers and query embedding at the same time
+        referrers, query_embedding = await asyncio.gather(
+            _in_thread(deadline_at, _load_referrers, my_user_id, _ms_left(deadline_at)),
+            asyncio.wait_for(get_embedding_async(prompt), max(0.0, deadline_at - loop.time()))
+        )
+
+        if not referrers:
+            return []
+
+        # 2️⃣ Classify once, and score every referrer's contacts in one pass
+        classify_task = asyncio.create_task(classify_query_async(prompt, query_embedding))
+
+        referrer_ids = sorted({x["referrer_user_id"] for x in referrers})
+        per_referrer = await _in_thread(
+            deadline_at, _score_all_referrers, referrer_ids, query_embedding, REFERRAL_TOP_K,
+            _ms_left(deadline_at)
+        )
+        candidates = await _in_thread(deadline_at, _unique_candidates, per_referrer)
+
+        if not candidates:
+            return []
+
+        query_type = await asyncio.wait_for(classify_task, max(0.0, deadline_at - loop.time()))
 
-        final = []
+    except (asyncio.TimeoutError, TimeoutError, errors.DatabaseError) as e:
+        if isinstance(e, errors.DatabaseError) and e.errno != QUERY_TIMEOUT_ERRNO:
+            raise
+        print(f"⏱️ Referral search for user {my_user_id} ran out of time before judging")
+        return []
+    finally:
+        # No-op once classification finished
+        if classify_task is not None:
+            classify_task.cancel()
+
+    # 3️⃣ Each unique contact goes to the LLM once; batches run concurrently
+    limit = asyncio.Semaphore(max(1, concurrency))
+    tasks = [
+        asyncio.create_task(
+            _judge_batch(candidates[i:i + REFERRAL_LLM_BATCH], prompt, query_type,
+                         query_embedding, limit)
+        )
+        for i in range(0, len(candidates), REFERRAL_LLM_BATCH)
+    ]
 
-        for c in candidates:
-            j = judged_map.get(c["idx"])
-            if not j:
-                continue
+    done, late = await asyncio.wait(tasks, timeout=max(0.0, deadline_at - loop.time()))
 
-            final.append({
-                "confidence": j.get("confidence", 0.0)
-            })
+    # Past the deadline: drop whatever is still running
+    for task in late:
+        task.cancel()
+    if late:
+        print(f"⏱️ Referral search: {len(late)}/{len(tasks)} judge batches missed the deadline")
 
-        if not final:
+    by_idx = {c["idx"]: c for c in candidates}
+    verdicts = {}
+    for task in done:
+        if task.cancelled():
             continue
+        if task.exception() is not None:
+            print(f"⚠️ Referral judge batch failed: {task.exception()!r}")
+            continue
+        for j in task.result():
+            c = by_idx.get(j.get("idx"))
+            if c is not None:
+                verdicts[c["key"]] = max(verdicts.get(c["key"], 0.0), j.get("confidence", 0.0))
+
+    # 4️⃣ Map verdicts back: a referrer is as strong as their best match
+    results = []
+    for x in referrers:
+        hits = per_referrer.get(x["referrer_user_id"], [])
+        confidences = [verdicts[key] for _, _, key in hits if key in verdicts]
 
-        best_confidence = max(f["confidence"] for f in final)
+        if not confidences:
+            continue
 
         results.append({
             "name": x["display_name"],
             "phone": x["phone"],
-            "confidence": best_confidence
+            "confidence": max(confidences)
         })
 
-    # 4️⃣ Rank by strength
+    # 5️⃣ Rank by strength (partial results included)
     results.sort(key=lambda x: x["confidence"], reverse=True)
 
-    # 🔥 CLOSE CONNECTION
-    cursor.close()
-    db.close()
-
-    return results[:5]
\ No newline at end of file
+    return results[:5]
@@ -1,50 +1,267 @@
-import json
+import heapq
 import numpy as np
+from app.core.config import (
+    EMBEDDING_RESCORE_K,
+    HYBRID_DEPTH,
+    HYBRID_ENABLED,
+    HYBRID_RRF_K,
+    RETRIEVAL_FETCH_CHUNK,
+)
 from app.core.database import get_cursor
-from app.utils.math import cosine
+from app.services.ann_index_service import search_user_contacts, search_user_contacts_batch
+from app.services.embedding_cache_service import get_user_matrix, iter_embedding_chunks
+from app.services.lexical_index_service import search_user_lexical
+from app.utils.bm25 import reciprocal_rank_fusion
+from app.utils.math import cosine_topk, l2_normalize
+from app.utils.vectors import decode_embedding
 
 
+def _fetch_full_vectors(embedding_ids: list) -> dict:
 
+    placeholders = ",".join(["%s"] * len(embedding_ids))
 
-def retrieve_candidates(user_id: int, query_embedding, top_k: int = 40):
+    with get_cursor() as cur:
+        cur.execute(f"""
+            SELECT id, embedding
+            FROM user_contact_embeddings
+            WHERE id IN ({placeholders})
+        """, tuple(embedding_ids))
 
-    cur = get_cursor()
+        return {r["id"]: decode_embedding(r["embedding"]) for r in cur.fetchall()}
 
-    cur.execute("""
-        SELECT uce.contact_id, uce.embedding, uce.profile_text,
-               uc.display_name, c.phone
-        FROM user_contact_embeddings uce
-        JOIN contacts c ON c.id = uce.contact_id
-        LEFT JOIN user_contacts uc
-          ON uc.user_id = uce.user_id
-         AND uc.contact_id = uce.contact_id
-        WHERE uce.user_id = %s
-    """, (user_id,))
+
+def _search_quantized(entry, query_embedding, top_k: int):
+    return _search_quantized_batch(entry, [query_embedding], top_k)[0]
+
+
+def _search_quantized_batch(entry, query_embeddings, top_k: int):
+
+    queries = l2_normalize(np.atleast_2d(query_embeddings))
+
+    # 1) Cheap pass over the int8 / float16 copy, every query at once
+    approx = entry.quantized.scores_batch(queries)
+    shortlist = min(max(EMBEDDING_RESCORE_K, top_k), entry.size)
+    # Sorted so a memory-mapped shard is read front to back
+    pools = [np.sort(np.argpartition(-row, shortlist - 1)[:shortlist]) for row in approx]
+
+    # Without the float32 matrix, one fetch covers every shortlist
+    vectors = None
+    if entry.matrix is None:
+        union = {int(i) for pool in pools for i in entry.embedding_ids[pool]}
+        vectors = _fetch_full_vectors(sorted(union))
+
+    return [_rescore(entry, q, pool, top_k, vectors) for q, pool in zip(queries, pools)]
+
+
+def _rescore(entry, q, pool, top_k: int, vectors):
+
+    # 2) Rescore the shortlist at full precision
+    pool_ids = entry.embedding_ids[pool]
+
+    if vectors is None:
+        full = np.asarray(entry.matrix[pool], dtype=np.float32)
+    else:
+        pool_ids = np.asarray([i for i in pool_ids if int(i) in vectors], dtype=np.int64)
+        if len(pool_ids) == 0:
+            return pool_ids, np.zeros(0, dtype=np.float32)
+        full = l2_normalize(np.vstack([vectors[int(i)] for i in pool_ids]))
+
+    top, scores = cosine_topk(q, full, top_k)
+    return pool_ids[top], scores
+
+
+def fetch_contact_details(embedding_ids: list) -> dict:
+
+    if not embedding_ids:
+        return {}
+
+    placeholders = ",".join(["%s"] * len(embedding_ids))
+
+    with get_cursor() as cur:
+        cur.execute(f"""
+            SELECT uce.id, uce.contact_id, uce.context_hash, uce.profile_text,
+                   uc.display_name, c.phone
+            FROM user_contact_embeddings uce
+            JOIN contacts c ON c.id = uce.contact_id
+            LEFT JOIN user_contacts uc
+              ON uc.user_id = uce.user_id
+             AND uc.contact_id = uce.contact_id
+            WHERE uce.id IN ({placeholders})
+        """, tuple(embedding_ids))
+
+        return {r["id"]: r for r in cur.fetchall()}
+
+
+def stream_topk_batch(cur, user_id: int, queries, top_k: int,
+                      chunk_size: int = RETRIEVAL_FETCH_CHUNK):
+    """
+    Top-k over a user's contacts without materializing them: rows arrive in
+    fetchmany chunks and only a k-sized heap per query survives between
+    chunks. Returns [(embedding_ids, scores), ...], one per query.
+    """
+    Q = l2_normalize(np.atleast_2d(queries))
+    heaps = [[] for _ in range(len(Q))]
+
+    for ids, _, _, block in iter_embedding_chunks(cur, user_id, chunk_size):
+        top, scores = cosine_topk(Q, block, top_k)
+
+        for heap, row_top, row_scores in zip(heaps, top, scores):
+            for i, score in zip(row_top, row_scores):
+                if i < 0:
+                    continue
+                item = (float(score), ids[i])
+                if len(heap) < top_k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
 
     results = []
+    for heap in heaps:
+        best = sorted(heap, reverse=True)
+        results.append((
+            np.asarray([i for _, i in best], dtype=np.int64),
+            np.asarray([s for s, _ in best], dtype=np.float32),
+        ))
+    return results
+
+
+def stream_topk(cur, user_id: int, query_embedding, top_k: int,
+                chunk_size: int = RETRIEVAL_FETCH_CHUNK):
+    return stream_topk_batch(cur, user_id, query_embedding, top_k, chunk_size)[0]
+
+
+def _exact_scores(entry, embedding_ids: list, q) -> dict:
+
+    # Cosine for lexical-only hits, so every candidate carries a vector score
+    if entry.matrix is not None:
+        pos = np.flatnonzero(np.isin(entry.embedding_ids, embedding_ids))
+        rows = np.asarray(entry.matrix[pos], dtype=np.float32)
+        return dict(zip(entry.embedding_ids[pos].tolist(), (rows @ q).tolist()))
+
+    vectors = _fetch_full_vectors(embedding_ids)
+    return {i: float(l2_normalize(v) @ q) for i, v in vectors.items()}
 
-    for r in cur.fetchall():
 
-        profile_text = (r["profile_text"] or "").strip()
+def _fuse(entry, query_embedding, query_text: str, top_ids, scores, top_k: int):
+    """Reciprocal rank fusion of the vector ranking with BM25 over profile_text."""
 
+    lexical_ids, _ = search_user_lexical(entry, query_text, HYBRID_DEPTH)
+    if not lexical_ids:
+        return top_ids[:top_k], scores[:top_k]
 
+    vector_ids = [int(i) for i in top_ids]
+    fused = reciprocal_rank_fusion([vector_ids, lexical_ids], HYBRID_RRF_K)[:top_k]
 
-        emb = np.array(json.loads(r["embedding"]), dtype=np.float32)
-        score = cosine(query_embedding, emb)
+    cosine = dict(zip(vector_ids, (float(x) for x in scores)))
+    missing = [i for i, _ in fused if i not in cosine]
+    if missing:
+        cosine.update(_exact_scores(entry, missing, l2_normalize(query_embedding)))
+
+    fused = [i for i, _ in fused if i in cosine]
+    return (
+        np.asarray(fused, dtype=np.int64),
+        np.asarray([cosine[i] for i in fused], dtype=np.float32),
+    )
+
+
+def _hybrid(query_text) -> bool:
+    return HYBRID_ENABLED and bool(query_text and query_text.strip())
+
+
+def retrieve_candidates(user_id: int, query_embedding, top_k: int = 40, query_text: str = None):
+    return rank_candidates(user_id, get_user_matrix(user_id), query_embedding, top_k, query_text)
+
+
+def rank_candidates(user_id: int, entry, query_embedding, top_k: int = 40, query_text: str = None):
+    """
+    Scores an already loaded get_user_matrix() entry, so the load can run
+    while the query is still being embedded. With query_text, the vector
+    ranking is fused with BM25 (cached entries only).
+    """
+
+    depth = max(top_k, HYBRID_DEPTH) if _hybrid(query_text) else top_k
+
+    if entry is None:
+        # Too large to cache: phase 1 streams ids + vectors only
+        with get_cursor() as cur:
+            top_ids, scores = stream_topk(cur, user_id, query_embedding, top_k)
+
+    elif entry.size == 0:
+        return []
+
+    else:
+        if entry.quantized is not None:
+            top_ids, scores = _search_quantized(entry, query_embedding, depth)
+        else:
+            # Exact matrix-vector product, or the IVF index for large contact books
+            top_ids, scores = search_user_contacts(entry, query_embedding, depth)
+
+        if depth > top_k:
+            top_ids, scores = _fuse(entry, query_embedding, query_text, top_ids, scores, top_k)
+
+    # Phase 2: only the winners need profile text / name / phone
+    winner_ids = [int(i) for i in top_ids]
+    return _build_candidates(winner_ids, scores, fetch_contact_details(winner_ids))
+
+
+def _build_candidates(winner_ids: list, scores, details: dict):
+
+    results = []
+
+    for embedding_id, score in zip(winner_ids, scores):
+        r = details.get(embedding_id)
+        if not r:
+            continue
 
         results.append({
             "contact_id": r["contact_id"],
+            "context_hash": r["context_hash"],
             "name": r["display_name"] or "(no name)",
             "phone": r["phone"],
-            "profile_text": profile_text,
+            "profile_text": (r["profile_text"] or "").strip(),
             "score": float(score)
         })
 
-    # Sort by semantic score
-    results.sort(key=lambda x: x["score"], reverse=True)
-
     # Assign stable idx AFTER sorting
-    for i, r in enumerate(results[:top_k]):
+    for i, r in enumerate(results):
         r["idx"] = i
 
-    return results[:top_k]
\ No newline at end of file
+    return results
+
+
+def rank_candidates_batch(user_id: int, entry, query_embeddings, top_k: int = 40, query_texts=None):
+    """
+    rank_candidates for many queries against one loaded matrix: a single
+    matrix-matrix product on the exact path and one details fetch for the
+    union of winners. Returns one candidate list per query.
+    """
+    queries = l2_normalize(np.atleast_2d(query_embeddings))
+    texts = list(query_texts) if query_texts is not None else [None] * len(queries)
+    hybrid = any(_hybrid(t) for t in texts)
+    depth = max(top_k, HYBRID_DEPTH) if hybrid else top_k
+
+    if entry is None:
+        with get_cursor() as cur:
+            hits = stream_topk_batch(cur, user_id, queries, top_k)
+
+    elif entry.size == 0:
+        return [[] for _ in range(len(queries))]
+
+    else:
+        if entry.quantized is not None:
+            hits = _search_quantized_batch(entry, queries, depth)
+        else:
+            hits = search_user_contacts_batch(entry, queries, depth)
+
+        hits = [
+            _fuse(entry, q, text, ids, scores, top_k) if _hybrid(text) else (ids[:top_k], scores[:top_k])
+            for q, text, (ids, scores) in zip(queries, texts, hits)
+        ]
+
+    winners = [[int(i) for i in top_ids] for top_ids, _ in hits]
+    details = fetch_contact_details(sorted({i for ids in winners for i in ids}))
+
+    return [
+        _build_candidates(ids, scores, details)
+        for ids, (_, scores) in zip(winners, hits)
+    ]
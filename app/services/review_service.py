@@ -0,0 +1,24 @@
+from app.core.mongo import get_reviews_collection
+
+# =========================
+# Review texts for a whole rebuild batch: one $in query over every
+# default_description id, grouped by id in memory.
+# =========================
+
+REVIEW_PROJECTION = {"_id": 0, "default_description_id": 1, "review": 1}
+
+
+def load_reviews_by_description(description_ids, reviews_collection=None) -> dict:
+
+    ids = sorted(set(description_ids))
+    if not ids:
+        return {}
+
+    collection = reviews_collection if reviews_collection is not None else get_reviews_collection()
+
+    grouped = {}
+    for rv in collection.find({"default_description_id": {"$in": ids}}, REVIEW_PROJECTION):
+        if rv.get("review"):
+            grouped.setdefault(rv["default_description_id"], []).append(rv["review"])
+
+    return grouped
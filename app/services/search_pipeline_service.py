@@ -1,34 +1,120 @@
-from app.services.embedding_service import get_embedding
-from app.services.retrieval_service import retrieve_candidates
-from app.services.llm_filter_service import llm_filter
-from app.services.query_classifier_service import classify_query
+import asyncio
+import threading
+import time
+from app.core.config import (
+    SEARCH_AUTO_MIN_GAP,
+    SEARCH_AUTO_MIN_SCORE,
+    SEARCH_BATCH_CONCURRENCY,
+    SEARCH_DEFAULT_MODE,
+    SEARCH_SKIP_STAGES,
+    SEARCH_STAGE_VARIANTS,
+)
+from app.services.context_packing_service import pack_candidates_async
+from app.services.embedding_cache_service import get_user_matrix
+from app.services.embedding_service import get_embedding_async, get_embeddings_async
+from app.services.judgment_cache_service import split_cached
+from app.services.llm_filter_service import (
+    finalize_verdicts,
+    judge_packed_async,
+    judge_packed_stream,
+)
+from app.services.query_classifier_service import classify_query_async
+from app.services.retrieval_service import rank_candidates, rank_candidates_batch
+from app.utils.tokens import count_tokens
 
+# =========================
+# The one search pipeline behind /search, /search/stream, /search/batch
+# and the legacy ai_service.py:
+#
+#   embed -> retrieve -> classify -> pack -> judge -> merge
+#
+# Every stage is timed and reports its row / token counts in the request
+# trace (returned as `debug` when asked for). Optional stages can be
+# skipped (SEARCH_SKIP_STAGES) and each stage's implementation swapped
+# (SEARCH_STAGE_VARIANTS or register_stage()).
+# =========================
 
-def run_ai_search(user_id: int, prompt: str, top_k: int = 40, top_n: int = 5):
+STAGE_ORDER = ("embed", "retrieve", "classify", "pack", "judge", "merge")
+OPTIONAL_STAGES = {"classify", "pack", "judge"}
 
-    # 1️⃣ Embed
-    query_embedding = get_embedding(prompt)
+# Stages whose only consumer is judge; pointless (and paid for) without it
+JUDGE_INPUTS = {"classify", "pack"}
 
-    # 2️⃣ Retrieve
-    candidates = retrieve_candidates(
-        user_id=user_id,
-        query_embedding=query_embedding,
-        top_k=top_k
-    )
+# Legacy fixed cut used by the "truncate" pack variant
+TRUNCATE_CHARS = 1500
 
-    if not candidates:
-        return []
+_stats_lock = threading.Lock()
+_mode_stats = {
+    "fast": 0,
+    "full": 0,
+    "auto": 0,
+    "auto_escalated": 0,
+    "auto_answered_fast": 0,
+}
 
-    # 3️⃣ Classify
-    query_type = classify_query(prompt)
 
-    # 4️⃣ LLM filter
-    judged = llm_filter(
-        prompt=prompt,
-        candidates=candidates,
-        query_type=query_type,
-        top_n=top_n
-    )
+class SearchContext:
+    """State of one search as it moves through the stages."""
+
+    def __init__(self, user_id: int, prompt: str, top_k: int = 40, top_n: int = 5,
+                 mode=None, stats=None, emit=None):
+        self.user_id = user_id
+        self.prompt = prompt
+        self.top_k = top_k
+        self.top_n = top_n
+        self.mode = mode
+        self.stats = stats if stats is not None else {}
+        # async callable(event, data) when streaming
+        self.emit = emit
+
+        self.query_embedding = None
+        self.load_task = None
+        self.classify_task = None
+        self.candidates = None
+        self.query_type = "ambiguous"
+        self.verdicts = {}
+        self.pending = None
+        self.packed = None
+        self.packed_tokens = 0
+        self.judged = None
+        self.results = None
+        # Set instead of raising when one prompt of a batch fails
+        self.error = None
+
+        self.skip = set()
+        self.trace = []
+        self.started = time.perf_counter()
+
+    async def send(self, event: str, data):
+        if self.emit is not None:
+            await self.emit(event, data)
+
+    def debug(self) -> dict:
+        return {
+            "mode": self.stats.get("mode"),
+            "resolved_mode": self.stats.get("resolved_mode"),
+            "query_type": self.query_type,
+            "error": self.error,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "stages": self.trace,
+        }
+
+
+# ==========================================
+# RESULT SHAPES
+# ==========================================
+
+def _result(c: dict, confidence: float, reason: str) -> dict:
+    return {
+        "name": c["name"],
+        "phone": c["phone"],
+        "confidence": confidence,
+        "reason": reason,
+        "profile_text": c["profile_text"]
+    }
+
+
+def _merge(candidates: list, judged: list, top_n: int):
 
     judged_map = {
         j["idx"]: j
@@ -36,23 +122,533 @@ def run_ai_search(user_id: int, prompt: str, top_k: int = 40, top_n: int = 5):
         if isinstance(j.get("idx"), int)
     }
 
-    final = []
+    # STRICT MERGE: only contacts the LLM kept
+    final = [
+        _result(c, judged_map[c["idx"]].get("confidence", 0.0), judged_map[c["idx"]].get("reason", ""))
+        for c in candidates
+        if c["idx"] in judged_map
+    ]
+
+    # Rank by confidence
+    final.sort(key=lambda x: x["confidence"], reverse=True)
+
+    return final[:top_n]
+
+
+def _embedding_only(candidates: list, top_n: int):
+
+    # The fused top_n, with the cosine score standing in for confidence;
+    # ranked by it like judged results are
+    final = [
+        _result(c, c["score"], "embedding similarity")
+        for c in candidates[:top_n]
+    ]
+    final.sort(key=lambda x: x["confidence"], reverse=True)
+
+    return final
 
-    # 5️⃣ STRICT MERGE (exact same as /search)
-    for c in candidates:
-        j = judged_map.get(c["idx"])
-        if not j:
-            continue
 
-        final.append({
+# ==========================================
+# MODES
+# ==========================================
+
+def _is_ambiguous(candidates: list) -> bool:
+
+    # Fused order is not cosine order; gate on the two best vector scores
+    scores = sorted((c["score"] for c in candidates), reverse=True)[:2]
+
+    if scores[0] < SEARCH_AUTO_MIN_SCORE:
+        return True
+
+    return len(scores) > 1 and scores[0] - scores[1] < SEARCH_AUTO_MIN_GAP
+
+
+def _requested_mode(mode) -> str:
+    # Request modes are checked by the schema, the default at startup
+    return (mode or SEARCH_DEFAULT_MODE).lower()
+
+
+def _resolve_mode(mode, candidates: list, stats) -> str:
+    """fast | full for this request; auto is decided from the retrieval scores."""
+    mode = _requested_mode(mode)
+
+    resolved = mode
+    if mode == "auto":
+        resolved = "full" if candidates and _is_ambiguous(candidates) else "fast"
+
+    with _stats_lock:
+        _mode_stats[mode] += 1
+        if mode == "auto":
+            _mode_stats["auto_escalated" if resolved == "full" else "auto_answered_fast"] += 1
+
+    if stats is not None:
+        stats["mode"] = mode
+        stats["resolved_mode"] = resolved
+
+    return resolved
+
+
+def get_search_mode_stats() -> dict:
+    with _stats_lock:
+        auto = _mode_stats["auto"]
+        return {
+            **_mode_stats,
+            "auto_escalation_rate": _mode_stats["auto_escalated"] / auto if auto else 0.0,
+            "min_score": SEARCH_AUTO_MIN_SCORE,
+            "min_gap": SEARCH_AUTO_MIN_GAP,
+        }
+
+
+# ==========================================
+# STAGE IMPLEMENTATIONS (swappable)
+# ==========================================
+
+async def _embed_openai(ctx):
+    return await get_embedding_async(ctx.prompt)
+
+
+async def _retrieve(ctx, query_text):
+    entry = await ctx.load_task
+
+    # DB work stays off the event loop
+    return await asyncio.to_thread(
+        rank_candidates, ctx.user_id, entry, ctx.query_embedding, ctx.top_k, query_text
+    )
+
+
+async def _retrieve_hybrid(ctx):
+    return await _retrieve(ctx, ctx.prompt)
+
+
+async def _retrieve_vector(ctx):
+    return await _retrieve(ctx, None)
+
+
+async def _classify_local_first(ctx):
+    return await classify_query_async(ctx.prompt, ctx.query_embedding)
+
+
+async def _classify_llm(ctx):
+    return await classify_query_async(ctx.prompt)
+
+
+async def _pack_budget(ctx):
+    return await pack_candidates_async(ctx.pending, ctx.query_embedding)
+
+
+def _pack_whole(pending: list, max_chars: int = None):
+    packed = [
+        {
+            "idx": c["idx"],
             "name": c["name"],
-            "phone": c["phone"],
-            "confidence": j.get("confidence", 0.0),
-            "reason": j.get("reason", ""),
-            "profile_text": c["profile_text"]
+            "profile_text": (c["profile_text"] or "")[:max_chars]
+        }
+        for c in pending
+    ]
+    return packed, sum(count_tokens(p["profile_text"]) for p in packed)
+
+
+async def _pack_truncate(ctx):
+    return _pack_whole(ctx.pending, TRUNCATE_CHARS)
+
+
+async def _judge_llm(ctx):
+
+    args = (ctx.prompt, ctx.pending, ctx.packed, ctx.packed_tokens, ctx.query_type, ctx.stats)
+
+    if ctx.emit is None:
+        return await judge_packed_async(*args)
+
+    # Streaming: each verdict goes out as soon as it is parsed
+    fresh = []
+    by_idx = {c["idx"]: c for c in ctx.candidates}
+    async for r in judge_packed_stream(*args):
+        fresh.append(r)
+        c = by_idx[r["idx"]]
+        await ctx.send("verified", _result(c, r.get("confidence", 0.0), r.get("reason", "")))
+    return fresh
+
+
+async def _merge_by_confidence(ctx):
+
+    if ctx.judged is None:
+        # judge skipped (fast mode or config): embedding ranking is the answer
+        return _embedding_only(ctx.candidates, ctx.top_n)
+    return _merge(ctx.candidates, ctx.judged, ctx.top_n)
+
+
+# stage -> {variant: implementation}; the first variant is the default
+STAGES = {
+    "embed": {"openai": _embed_openai},
+    "retrieve": {"hybrid": _retrieve_hybrid, "vector": _retrieve_vector},
+    "classify": {"local_first": _classify_local_first, "llm": _classify_llm},
+    "pack": {"budget": _pack_budget, "truncate": _pack_truncate},
+    "judge": {"llm": _judge_llm},
+    "merge": {"confidence": _merge_by_confidence},
+}
+
+
+def _parse_list(value: str) -> list:
+    return [x.strip() for x in value.split(",") if x.strip()]
+
+
+def _parse_skip(value: str) -> set:
+    skip = set(_parse_list(value))
+    unknown = skip - OPTIONAL_STAGES
+    if unknown:
+        raise ValueError(
+            f"SEARCH_SKIP_STAGES: {sorted(unknown)} cannot be skipped "
+            f"(optional stages: {sorted(OPTIONAL_STAGES)})"
+        )
+    return skip
+
+
+def _parse_variants(value: str) -> dict:
+    variants = {}
+    for pair in _parse_list(value):
+        stage, sep, variant = (x.strip() for x in pair.partition("="))
+        if not sep or stage not in STAGES or not variant:
+            raise ValueError(
+                f"SEARCH_STAGE_VARIANTS: bad entry {pair!r}; expected stage=variant "
+                f"with stage in {list(STAGES)}"
+            )
+        if variant not in STAGES[stage]:
+            # May still be added by register_stage(); _variant warns if not
+            print(f"⚠️ SEARCH_STAGE_VARIANTS: {stage}={variant} is not registered (yet)")
+        variants[stage] = variant
+    return variants
+
+
+# Checked at import: a typo must not silently run the default pipeline
+_config_skip = _parse_skip(SEARCH_SKIP_STAGES)
+_config_variants = _parse_variants(SEARCH_STAGE_VARIANTS)
+_warned_variants = set()
+
+
+def register_stage(stage: str, variant: str, fn, select: bool = False):
+    """Add or replace a stage implementation; select=True makes it the active one."""
+    STAGES[stage][variant] = fn
+    if select:
+        _config_variants[stage] = variant
+
+
+def _variant(stage: str) -> str:
+    chosen = _config_variants.get(stage)
+    if chosen is None or chosen in STAGES[stage]:
+        return chosen or next(iter(STAGES[stage]))
+
+    default = next(iter(STAGES[stage]))
+    if (stage, chosen) not in _warned_variants:
+        _warned_variants.add((stage, chosen))
+        print(f"⚠️ Stage variant {stage}={chosen} is not registered; using {default}")
+    return default
+
+
+def _impl(stage: str):
+    return STAGES[stage][_variant(stage)]
+
+
+# ==========================================
+# STAGE RUNNERS
+# Fixed plumbing around the implementations: overlap, caching, metrics.
+# Each returns the metrics for its trace entry.
+# ==========================================
+
+async def _run_embed(ctx):
+
+    # The contact matrix loads while the prompt is embedded
+    if ctx.load_task is None:
+        ctx.load_task = asyncio.create_task(asyncio.to_thread(get_user_matrix, ctx.user_id))
+
+    ctx.query_embedding = await _impl("embed")(ctx)
+
+    # The local classifier answers from the embedding; an LLM fallback
+    # overlaps with retrieval. fast never classifies, auto only once the
+    # scores call for it.
+    if _requested_mode(ctx.mode) == "full" and "classify" not in ctx.skip:
+        ctx.classify_task = asyncio.create_task(_impl("classify")(ctx))
+
+    return {"rows": 1}
+
+
+async def _run_retrieve(ctx):
+
+    # A batch has ranked every prompt already; only the mode is left
+    prefetched = ctx.candidates is not None
+    if not prefetched:
+        ctx.candidates = await _impl("retrieve")(ctx)
+
+    await _after_retrieve(ctx)
+    return {
+        "rows": len(ctx.candidates),
+        "prefetched": prefetched,
+        "resolved_mode": ctx.stats.get("resolved_mode"),
+    }
+
+
+async def _run_classify(ctx):
+    overlapped = ctx.classify_task is not None
+    ctx.query_type = await (ctx.classify_task or _impl("classify")(ctx))
+    return {"query_type": ctx.query_type, "overlapped": overlapped}
+
+
+def _split(ctx):
+
+    # Only contacts without a cached verdict for this query go to the LLM
+    if ctx.pending is None:
+        ctx.verdicts, ctx.pending = split_cached(ctx.prompt, ctx.query_type, ctx.candidates)
+
+
+async def _run_pack(ctx):
+
+    _split(ctx)
+
+    if ctx.pending:
+        ctx.packed, ctx.packed_tokens = await _impl("pack")(ctx)
+
+    return {"rows": len(ctx.pending), "cached": len(ctx.verdicts), "tokens": ctx.packed_tokens}
+
+
+async def _run_judge(ctx):
+
+    _split(ctx)
+
+    # Cached verdicts are known already
+    by_idx = {c["idx"]: c for c in ctx.candidates}
+    for r in finalize_verdicts(ctx.verdicts, [], []):
+        c = by_idx[r["idx"]]
+        await ctx.send("verified", _result(c, r.get("confidence", 0.0), r.get("reason", "")))
+
+    fresh = []
+    prompt_tokens = ctx.stats.get("prompt_tokens", 0)
+
+    if ctx.pending:
+        if ctx.packed is None:
+            # pack skipped: whole profiles go to the LLM
+            ctx.packed, ctx.packed_tokens = _pack_whole(ctx.pending)
+        fresh = await _impl("judge")(ctx)
+
+    ctx.judged = finalize_verdicts(ctx.verdicts, fresh, ctx.pending, ctx.stats)
+
+    return {
+        "rows": len(ctx.pending),
+        "accepted": len(ctx.judged),
+        "tokens": ctx.stats.get("prompt_tokens", 0) - prompt_tokens,
+    }
+
+
+async def _run_merge(ctx):
+    ctx.results = await _impl("merge")(ctx)
+    return {"rows": len(ctx.results)}
+
+
+_RUNNERS = {
+    "embed": _run_embed,
+    "retrieve": _run_retrieve,
+    "classify": _run_classify,
+    "pack": _run_pack,
+    "judge": _run_judge,
+    "merge": _run_merge,
+}
+
+
+# ==========================================
+# ENGINE
+# ==========================================
+
+async def _run_stage(ctx: SearchContext, name: str):
+
+    if name in ctx.skip:
+        ctx.trace.append({"stage": name, "skipped": True})
+        return
+
+    started = time.perf_counter()
+    metrics = await _RUNNERS[name](ctx)
+
+    ctx.trace.append({
+        "stage": name,
+        "variant": _variant(name),
+        "ms": round((time.perf_counter() - started) * 1000, 2),
+        **metrics,
+    })
+
+
+async def _after_retrieve(ctx: SearchContext):
+
+    await ctx.send("candidates", _embedding_only(ctx.candidates, ctx.top_n))
+
+    if not ctx.candidates:
+        ctx.results = []
+        return
+
+    # fast, or auto with a clear winner: no classify / pack / judge
+    if _resolve_mode(ctx.mode, ctx.candidates, ctx.stats) == "fast":
+        ctx.skip |= OPTIONAL_STAGES
+
+
+def _apply_skips(ctx: SearchContext):
+    ctx.skip |= _config_skip
+    if "judge" in ctx.skip:
+        ctx.skip |= JUDGE_INPUTS
+
+
+async def run_pipeline(ctx: SearchContext, stages=STAGE_ORDER) -> SearchContext:
+
+    _apply_skips(ctx)
+
+    try:
+        for name in stages:
+            if ctx.results is not None:
+                break
+
+            await _run_stage(ctx, name)
+
+    finally:
+        for task in (ctx.load_task, ctx.classify_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+    await ctx.send("final", ctx.results)
+    return ctx
+
+
+# ==========================================
+# ENTRY POINTS
+# ==========================================
+
+async def run_search(user_id: int, prompt: str, top_k: int = 40, top_n: int = 5,
+                     stats=None, mode=None) -> SearchContext:
+    """Runs every stage; results in ctx.results, timings in ctx.debug()."""
+    return await run_pipeline(SearchContext(user_id, prompt, top_k, top_n, mode, stats))
+
+
+async def run_ai_search_async(user_id: int, prompt: str, top_k: int = 40, top_n: int = 5,
+                              stats=None, mode=None):
+    ctx = await run_search(user_id, prompt, top_k, top_n, stats, mode)
+    return ctx.results
+
+
+def run_ai_search(user_id: int, prompt: str, top_k: int = 40, top_n: int = 5, stats=None,
+                  mode=None):
+    # For scripts outside an event loop
+    return asyncio.run(run_ai_search_async(user_id, prompt, top_k, top_n, stats, mode))
+
+
+async def stream_ai_search(user_id: int, prompt: str, top_k: int = 40, top_n: int = 5,
+                           stats=None, mode=None, debug: bool = False):
+    """
+    Yields (event, data): "candidates" as soon as retrieval is done, one
+    "verified" per LLM verdict as it streams in, then "final" (and "debug").
+    """
+    queue = asyncio.Queue()
+    ctx = SearchContext(user_id, prompt, top_k, top_n, mode, stats,
+                        emit=lambda event, data: queue.put((event, data)))
+
+    async def run():
+        try:
+            await run_pipeline(ctx)
+        finally:
+            await queue.put(None)
+
+    task = asyncio.create_task(run())
+
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            yield item
+
+        # Surface pipeline errors to the caller
+        await task
+
+        if debug:
+            yield "debug", ctx.debug()
+
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def _finish_batch_item(ctx: SearchContext, limit):
+    async with limit:
+        # retrieve only resolves the mode here, timed like any other stage
+        return await run_pipeline(ctx, stages=STAGE_ORDER[1:])
+
+
+async def run_ai_search_batch_async(user_id: int, prompts: list, top_k: int = 40, top_n: int = 5,
+                                    mode=None, concurrency: int = SEARCH_BATCH_CONCURRENCY):
+    """
+    run_search for many prompts of one user, sharing the embed and
+    retrieve stages. Returns one SearchContext per prompt, in order; a
+    prompt whose later stages failed has ctx.error set and no results.
+    """
+    if not prompts:
+        return []
+
+    contexts = [SearchContext(user_id, prompt, top_k, top_n, mode) for prompt in prompts]
+
+    # A blank prompt cannot be embedded; it fails alone, not the whole call
+    live = []
+    for ctx in contexts:
+        if ctx.prompt and ctx.prompt.strip():
+            live.append(ctx)
+        else:
+            ctx.error = "ValueError: empty prompt"
+
+    if not live:
+        return contexts
+
+    live_prompts = [ctx.prompt for ctx in live]
+    shared = []
+
+    # 1️⃣ One embeddings call for every prompt, while the matrix loads
+    started = time.perf_counter()
+    load_task = asyncio.create_task(asyncio.to_thread(get_user_matrix, user_id))
+
+    try:
+        query_embeddings = await get_embeddings_async(live_prompts)
+        shared.append({
+            "stage": "embed", "variant": "batch", "shared": True, "rows": len(live_prompts),
+            "ms": round((time.perf_counter() - started) * 1000, 2),
         })
+        entry = await load_task
+    finally:
+        if not load_task.done():
+            load_task.cancel()
 
-    # 6️⃣ Rank by confidence
-    final.sort(key=lambda x: x["confidence"], reverse=True)
+    # 2️⃣ Every query scored against the matrix in one pass
+    started = time.perf_counter()
+    query_texts = live_prompts if _variant("retrieve") == "hybrid" else None
+    per_prompt = await asyncio.to_thread(
+        rank_candidates_batch, user_id, entry, query_embeddings, top_k, query_texts
+    )
+    shared.append({
+        "stage": "retrieve", "variant": f"batch_{_variant('retrieve')}", "shared": True,
+        "rows": sum(len(c) for c in per_prompt),
+        "ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+
+    # 3️⃣ The remaining stages per prompt, a few at a time
+    for ctx, q, candidates in zip(live, query_embeddings, per_prompt):
+        ctx.query_embedding = q
+        ctx.candidates = candidates
+        ctx.trace = list(shared)
+
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    # One prompt's LLM / pack failure must not discard the others
+    outcomes = await asyncio.gather(
+        *(_finish_batch_item(ctx, limit) for ctx in live),
+        return_exceptions=True
+    )
+
+    for ctx, outcome in zip(live, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"⚠️ Batch search failed for prompt {ctx.prompt!r}: {outcome!r}")
+            ctx.error = f"{type(outcome).__name__}: {outcome}"
+            ctx.results = None
+        elif isinstance(outcome, BaseException):
+            raise outcome
 
-    return final[:top_n]
\ No newline at end of file
+    return contexts
@@ -1,24 +1,9 @@
 import json
 import re
-import os
 from sklearn.feature_extraction.text import TfidfVectorizer
-from pymongo import MongoClient
-from dotenv import load_dotenv
-from app.db import get_db
-
-# ==========================================
-# LOAD ENV
-# ==========================================
-
-load_dotenv()
-
-# ==========================================
-# MONGODB CONNECTION
-# ==========================================
-
-mongo_client = MongoClient(os.getenv("MONGO_URI"))
-mongo_db = mongo_client[os.getenv("MONGO_DB")]
-reviews_collection = mongo_db["reviews"]
+from app.core.database import get_connection
+from app.services.ann_index_service import invalidate_profile_index
+from app.services.review_service import load_reviews_by_description
 
 
 # ==========================================
@@ -51,7 +36,7 @@ def clean_profile_text(text: str):
 # BUILD PROFILE TEXT
 # ==========================================
 
-def build_profile_text(cursor, user_id):
+def build_profile_text(cursor, user_id, reviews_by_description=None):
 
     cursor.execute(
         "SELECT fname, lname, phone FROM users WHERE id = %s",
@@ -106,24 +91,14 @@ def build_profile_text(cursor, user_id):
 
     if defaults:
 
-        default_ids = [d["id"] for d in defaults]
-
-        mongo_reviews = list(
-            reviews_collection.find(
-                {"default_description_id": {"$in": default_ids}},
-                {"review": 1, "default_description_id": 1, "_id": 0}
-            )
-        )
-
-        default_map = {d["id"]: d for d in defaults}
+        # Batch rebuilds pass reviews preloaded for every user at once
+        if reviews_by_description is None:
+            reviews_by_description = load_reviews_by_description(d["id"] for d in defaults)
 
-        for r in mongo_reviews:
-
-            d = default_map.get(r["default_description_id"])
-
-            if d:
+        for d in defaults:
+            for review in reviews_by_description.get(d["id"], []):
                 review_rows.append({
-                    "review": r["review"],
+                    "review": review,
                     "label": d["label"],
                     "description": d["description"]
                 })
@@ -179,57 +154,72 @@ REVIEWS:
 
 def rebuild_all_vectors():
 
-    conn = get_db()
-    cursor = conn.cursor(dictionary=True)
+    with get_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
 
-    cursor.execute("SELECT user_id FROM user_profile_embeddings")
-    rows = cursor.fetchall()
+        cursor.execute("SELECT user_id FROM user_profile_embeddings")
+        rows = cursor.fetchall()
 
-    display_texts = []
-    cleaned_texts = []
-    user_ids = []
+        # One review query for every profile in the rebuild
+        cursor.execute("""
+            SELECT dd.id
+            FROM default_description dd
+            JOIN user_profile_embeddings upe ON upe.user_id = dd.users_id
+        """)
+        reviews_by_description = load_reviews_by_description(
+            d["id"] for d in cursor.fetchall()
+        )
 
-    for row in rows:
+        display_texts = []
+        cleaned_texts = []
+        user_ids = []
 
-        uid = row["user_id"]
+        for row in rows:
 
-        formatted_text = build_profile_text(cursor, uid)
+            uid = row["user_id"]
 
-        if formatted_text:
+            formatted_text = build_profile_text(cursor, uid, reviews_by_description)
 
-            cleaned_text = clean_profile_text(formatted_text)
+            if formatted_text:
 
-            display_texts.append(formatted_text)
-            cleaned_texts.append(cleaned_text)
-            user_ids.append(uid)
+                cleaned_text = clean_profile_text(formatted_text)
 
-    if not cleaned_texts:
-        return {"message": "No profiles found"}
+                display_texts.append(formatted_text)
+                cleaned_texts.append(cleaned_text)
+                user_ids.append(uid)
 
-    vectorizer = TfidfVectorizer(
-        stop_words="english",
-        min_df=1,
-        max_df=0.8
-    )
+        if not cleaned_texts:
+            cursor.close()
+            return {"message": "No profiles found"}
 
-    X = vectorizer.fit_transform(cleaned_texts)
+        vectorizer = TfidfVectorizer(
+            stop_words="english",
+            min_df=1,
+            max_df=0.8
+        )
 
-    for i, user_id in enumerate(user_ids):
+        X = vectorizer.fit_transform(cleaned_texts)
 
-        vector = X[i].toarray()[0]
-        vector_json = json.dumps(vector.tolist())
+        # Pool connections autocommit; keep the rewrite in one transaction
+        conn.start_transaction()
 
-        cursor.execute("""
-            UPDATE user_profile_embeddings
-            SET profile_text = %s,
-                vector_data = %s,
-                needs_rebuild = 0
-            WHERE user_id = %s
-        """, (display_texts[i], vector_json, user_id))
-
-    conn.commit()
-    cursor.close()
-    conn.close()
+        for i, user_id in enumerate(user_ids):
+
+            vector = X[i].toarray()[0]
+            vector_json = json.dumps(vector.tolist())
+
+            cursor.execute("""
+                UPDATE user_profile_embeddings
+                SET profile_text = %s,
+                    vector_data = %s,
+                    needs_rebuild = 0
+                WHERE user_id = %s
+            """, (display_texts[i], vector_json, user_id))
+
+        conn.commit()
+        cursor.close()
+
+    invalidate_profile_index()
 
     return {
         "message": "Profiles rebuilt successfully",
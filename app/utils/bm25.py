@@ -0,0 +1,98 @@
+import math
+import re
+from collections import Counter, defaultdict
+import numpy as np
+
+# Keeps tech tokens whole: "c++", "c#", "node.js", "k8s"
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have",
+    "he", "her", "his", "i", "in", "is", "it", "its", "me", "my", "none", "of",
+    "on", "or", "she", "that", "the", "their", "they", "this", "to", "was",
+    "were", "who", "with", "you", "yet",
+}
+
+
+def tokenize(text: str) -> list:
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a mutable set of documents keyed by id.
+
+    postings: term -> {doc_id: term frequency}. add() replaces an existing
+    document, so a rebuilt profile is re-indexed in place.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)
+        self.doc_terms = {}
+        self.doc_len = {}
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def add(self, doc_id, text: str):
+        if doc_id in self.doc_len:
+            self.remove([doc_id])
+
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings[term][doc_id] = tf
+
+        length = sum(counts.values())
+        self.doc_terms[doc_id] = list(counts)
+        self.doc_len[doc_id] = length
+        self.total_len += length
+
+    def remove(self, doc_ids):
+        for doc_id in doc_ids:
+            terms = self.doc_terms.pop(doc_id, None)
+            if terms is None:
+                continue
+
+            for term in terms:
+                posting = self.postings[term]
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+            self.total_len -= self.doc_len.pop(doc_id)
+
+    def search(self, query: str, k: int):
+        """Returns (doc_ids, scores), best first; only documents matching a query term."""
+        n = len(self.doc_len)
+        if n == 0 or k <= 0:
+            return [], np.zeros(0, dtype=np.float32)
+
+        avgdl = self.total_len / n or 1.0
+        scores = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+
+            df = len(posting)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avgdl)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        best = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+        return [d for d, _ in best], np.asarray([s for _, s in best], dtype=np.float32)
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """[(doc_id, fused_score), ...] best first, from several best-first id lists."""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
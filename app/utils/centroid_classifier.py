@@ -0,0 +1,94 @@
+import numpy as np
+from app.utils.math import l2_normalize
+
+
+def _leave_one_out_sims(embeddings, y, n_labels: int) -> np.ndarray:
+    """Cosine of each example to every centroid, its own centroid refit without it."""
+
+    sums = np.vstack([embeddings[y == i].sum(axis=0) for i in range(n_labels)])
+    counts = np.bincount(y, minlength=n_labels)
+
+    sims = embeddings @ l2_normalize(sums).T
+
+    for row, (x, label) in enumerate(zip(embeddings, y)):
+        # A label with a single example has no centroid left; it counts as unrelated
+        if counts[label] > 1:
+            sims[row, label] = float(l2_normalize(sums[label] - x) @ x)
+        else:
+            sims[row, label] = 0.0
+
+    return sims
+
+
+class CentroidClassifier:
+    """
+    Nearest-centroid classifier over L2-normalized embeddings.
+
+    Each label is the normalized mean of its examples. Probabilities are a
+    softmax over cosine similarity to every centroid, sharpened by a
+    temperature picked by leave-one-out log-likelihood.
+    """
+
+    def __init__(self, labels, centroids, temperature: float = 20.0):
+        self.labels = list(labels)
+        self.centroids = l2_normalize(centroids)
+        self.temperature = float(temperature)
+
+    @classmethod
+    def fit(cls, embeddings, labels, temperatures=(5, 10, 20, 30, 50, 80)):
+        embeddings = l2_normalize(embeddings)
+        labels = list(labels)
+        names = sorted(set(labels))
+
+        y = np.asarray([names.index(label) for label in labels])
+        centroids = np.vstack([embeddings[y == i].mean(axis=0) for i in range(len(names))])
+
+        model = cls(names, centroids)
+
+        # Scored against centroids that include the example itself, every
+        # example looks close to its own label and the largest temperature
+        # wins. Leave-one-out: each example is held out of its own centroid.
+        sims = _leave_one_out_sims(embeddings, y, len(names))
+        rows = np.arange(len(y))
+
+        best = None
+        for t in temperatures:
+            logits = sims * float(t)
+            logits -= logits.max(axis=1, keepdims=True)
+            log_probs = logits - np.log(np.exp(logits).sum(axis=1, keepdims=True))
+            nll = -np.mean(log_probs[rows, y])
+            if best is None or nll < best[0]:
+                best = (nll, float(t))
+
+        model.temperature = best[1]
+        return model
+
+    def predict_proba(self, embeddings) -> np.ndarray:
+        sims = l2_normalize(np.atleast_2d(embeddings)) @ self.centroids.T
+        logits = sims * self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict(self, embedding):
+        """Returns (label, confidence) for one embedding."""
+        probs = self.predict_proba(embedding)[0]
+        best = int(np.argmax(probs))
+        return self.labels[best], float(probs[best])
+
+    def save(self, path: str):
+        np.savez(
+            path,
+            labels=np.asarray(self.labels),
+            centroids=self.centroids,
+            temperature=np.float32(self.temperature),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "CentroidClassifier":
+        data = np.load(path)
+        return cls(
+            labels=[str(label) for label in data["labels"]],
+            centroids=data["centroids"],
+            temperature=float(data["temperature"]),
+        )
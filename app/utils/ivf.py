@@ -0,0 +1,133 @@
+import numpy as np
+from app.utils.math import cosine_topk, l2_normalize
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over L2-normalized vectors.
+
+    Vectors are bucketed by their nearest k-means centroid. A search only
+    scans the `nprobe` buckets closest to the query, so nprobe is the
+    recall-vs-latency knob (nprobe == nlist is exact search).
+    """
+
+    def __init__(self, nlist: int, seed: int = 0):
+        self.nlist = nlist
+        self.seed = seed
+        self.centroids = None
+        self.trained_size = 0
+
+        self._list_ids = []
+        self._list_vecs = []
+        self._stacked = []
+        self._where = {}
+
+    def __len__(self):
+        return len(self._where)
+
+    @property
+    def dim(self):
+        return None if self.centroids is None else self.centroids.shape[1]
+
+    # ------------------------------------------
+    # TRAINING
+    # ------------------------------------------
+
+    def train(self, vectors, iterations: int = 10, sample: int = 50_000):
+        vectors = l2_normalize(vectors)
+        rng = np.random.default_rng(self.seed)
+
+        if len(vectors) > sample:
+            vectors = vectors[rng.choice(len(vectors), sample, replace=False)]
+
+        nlist = max(1, min(self.nlist, len(vectors)))
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+
+        # Spherical k-means: assign by dot product, re-normalize the means
+        for _ in range(iterations):
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = vectors[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = l2_normalize(centroids)
+
+        self.nlist = nlist
+        self.centroids = centroids
+        self.trained_size = len(vectors)
+
+        self._list_ids = [[] for _ in range(nlist)]
+        self._list_vecs = [[] for _ in range(nlist)]
+        self._stacked = [None] * nlist
+        self._where = {}
+
+    # ------------------------------------------
+    # INCREMENTAL UPDATES
+    # ------------------------------------------
+
+    def add(self, ids, vectors):
+        if self.centroids is None:
+            raise RuntimeError("IVFIndex.add() called before train()")
+
+        if len(ids) == 0:
+            return
+
+        vectors = l2_normalize(vectors)
+        assign = np.argmax(vectors @ self.centroids.T, axis=1)
+
+        for item_id, vec, c in zip(ids, vectors, assign):
+            item_id = int(item_id)
+            if item_id in self._where:
+                self.remove([item_id])
+
+            self._list_ids[c].append(item_id)
+            self._list_vecs[c].append(vec)
+            self._stacked[c] = None
+            self._where[item_id] = int(c)
+
+    def remove(self, ids):
+        for item_id in ids:
+            c = self._where.pop(int(item_id), None)
+            if c is None:
+                continue
+
+            pos = self._list_ids[c].index(int(item_id))
+            del self._list_ids[c][pos]
+            del self._list_vecs[c][pos]
+            self._stacked[c] = None
+
+    # ------------------------------------------
+    # SEARCH
+    # ------------------------------------------
+
+    def _list_matrix(self, c):
+        if self._stacked[c] is None:
+            vecs = self._list_vecs[c]
+            self._stacked[c] = (
+                np.vstack(vecs) if vecs else np.zeros((0, self.dim), dtype=np.float32)
+            )
+        return self._stacked[c]
+
+    def search(self, query, k: int, nprobe: int = 8, exclude=None):
+        """Returns (ids, scores) best first; `exclude` is a set of ids to skip."""
+        if self.centroids is None or not self._where:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        nprobe = max(1, min(nprobe, self.nlist))
+        probes, _ = cosine_topk(query, self.centroids, nprobe)
+
+        ids = []
+        mats = []
+        for c in probes:
+            if self._list_ids[c]:
+                ids.extend(self._list_ids[c])
+                mats.append(self._list_matrix(c))
+
+        if not ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        ids = np.asarray(ids, dtype=np.int64)
+        mask = np.isin(ids, list(exclude)) if exclude else None
+
+        top, scores = cosine_topk(query, np.vstack(mats), k, mask=mask)
+        return ids[top], scores
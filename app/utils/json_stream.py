@@ -0,0 +1,58 @@
+import json
+
+
+class ArrayItemStream:
+    """
+    Incremental parser for streamed JSON shaped like {"key": [{...}, {...}]}.
+    feed() takes the next piece of text and returns the array items that
+    completed in it, so each object can be used before the response ends.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._item_start = None
+
+    def feed(self, piece: str) -> list:
+        self._text += piece
+        items = []
+
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._stack.append(ch)
+                # root object -> array -> item object
+                if ch == "{" and self._stack == ["{", "[", "{"]:
+                    self._item_start = i
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if ch == "}" and self._stack == ["{", "["] and self._item_start is not None:
+                    try:
+                        items.append(json.loads(text[self._item_start:i + 1]))
+                    except ValueError:
+                        pass
+                    self._item_start = None
+
+        self._pos = len(text)
+        return items
+
+    @property
+    def text(self) -> str:
+        return self._text
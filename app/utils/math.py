@@ -1,5 +1,57 @@
 import numpy as np
 
-def cosine(a, b):
-    denom = np.linalg.norm(a) * np.linalg.norm(b)
-    return float(np.dot(a, b) / denom) if denom else 0.0
+
+def l2_normalize(matrix) -> np.ndarray:
+    """Row-wise L2 normalization to float32. Zero rows stay zero."""
+    m = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def cosine_topk(query, matrix, k: int, mask=None):
+    """
+    Top-k cosine similarity against an already L2-normalized matrix.
+
+    query:  (d,) for one query or (q, d) for many; normalized here.
+    matrix: (n, d), rows L2-normalized when written or loaded.
+    mask:   optional boolean (n,) or (q, n); True marks rows to exclude.
+
+    Returns (indices, scores), best first, ties in row order. A single
+    query returns 1-D arrays without the excluded rows; a batch returns
+    (q, k) arrays where slots that could not be filled hold index -1 and
+    score -inf.
+    """
+    single = np.ndim(query) == 1
+    queries = l2_normalize(np.atleast_2d(query))
+
+    n = matrix.shape[0]
+    k = min(k, n)
+
+    if k <= 0:
+        empty_idx = np.zeros((len(queries), 0), dtype=np.int64)
+        empty_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        return (empty_idx[0], empty_scores[0]) if single else (empty_idx, empty_scores)
+
+    # (q, d) @ (d, n) -> (q, n): one BLAS call for every query
+    scores = queries @ matrix.T
+
+    if mask is not None:
+        scores = np.where(np.broadcast_to(mask, scores.shape), -np.inf, scores)
+
+    # argpartition leaves ties in arbitrary order; sorted ids + a stable
+    # sort below put the lower row first
+    top = np.sort(np.argpartition(-scores, k - 1, axis=1)[:, :k], axis=1)
+    top_scores = np.take_along_axis(scores, top, axis=1)
+
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    top[np.isneginf(top_scores)] = -1
+
+    if single:
+        keep = top[0] >= 0
+        return top[0][keep], top_scores[0][keep]
+
+    return top, top_scores
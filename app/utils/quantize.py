@@ -0,0 +1,66 @@
+import numpy as np
+
+# Rows converted back to float32 per step while scoring; bounds the
+# temporary buffer to CHUNK_ROWS * d * 4 bytes instead of a full copy.
+CHUNK_ROWS = 8192
+
+STORAGE_KINDS = ("float32", "float16", "int8")
+BYTES_PER_VALUE = {"float32": 4, "float16": 2, "int8": 1}
+
+
+class QuantizedMatrix:
+    """
+    Compact copy of an L2-normalized (n, d) matrix for a first-pass scan.
+
+    float16 stores the values directly. int8 uses symmetric scalar
+    quantization with one float32 scale per vector:
+        row ~= codes.astype(float32) * scale
+    """
+
+    def __init__(self, kind: str, codes, scales=None):
+        self.kind = kind
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def from_float32(cls, matrix, kind: str) -> "QuantizedMatrix":
+        matrix = np.asarray(matrix, dtype=np.float32)
+
+        if kind == "float16":
+            return cls(kind, matrix.astype(np.float16))
+
+        if kind == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+            return cls(kind, codes, scales.astype(np.float32))
+
+        raise ValueError(f"unsupported quantized storage: {kind}")
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def scores(self, query) -> np.ndarray:
+        """Approximate dot products against an already normalized (d,) query."""
+        return self.scores_batch(np.asarray(query, dtype=np.float32)[None, :])[0]
+
+    def scores_batch(self, queries) -> np.ndarray:
+        """
+        (m, n) approximate dot products for m normalized queries. Each block
+        is dequantized once and scored against every query.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        out = np.empty((len(queries), len(self)), dtype=np.float32)
+
+        for start in range(0, len(self), CHUNK_ROWS):
+            block = self.codes[start:start + CHUNK_ROWS].astype(np.float32)
+            out[:, start:start + CHUNK_ROWS] = queries @ block.T
+
+        if self.scales is not None:
+            out *= self.scales
+
+        return out
@@ -0,0 +1,51 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter for an API with per-minute request and token quotas.
+    acquire(tokens) blocks until both buckets can cover one more request of
+    that size. A limit of 0 disables that bucket.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._lock = threading.Lock()
+        self._requests = requests_per_minute
+        self._tokens = tokens_per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def acquire(self, tokens: int = 0):
+        # A single request larger than the whole bucket waits for a full one
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+
+                short_requests = (1 - self._requests) if self.rpm else 0
+                short_tokens = (tokens - self._tokens) if self.tpm else 0
+
+                if short_requests <= 0 and short_tokens <= 0:
+                    if self.rpm:
+                        self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= tokens
+                    return
+
+                wait = max(
+                    short_requests * 60 / self.rpm if self.rpm else 0,
+                    short_tokens * 60 / self.tpm if self.tpm else 0,
+                )
+
+            time.sleep(min(wait, 5.0))
@@ -8,3 +8,47 @@ def normalize_for_embedding(text: str) -> str:
         text
     )
     return text.strip()
+
+
+def canonicalize_query(text: str) -> str:
+    # Cache key for LLM judgments: "Who is the best Developer?" -> "developer".
+    # "+", "#" and inner "." carry meaning ("c++", "c#", "node.js")
+    text = normalize_for_embedding(text)
+    text = re.sub(r"[^\w\s+#.]", " ", text)
+    text = re.sub(r"\.(?!\w)", " ", text)
+    return " ".join(text.split())
+
+
+def collapse_whitespace(text: str) -> str:
+    return " ".join(text.split())
+
+
+# Section headers written by build_embeddings.py / vector_rebuild_service.py
+PROFILE_SECTIONS = ("CONTACT", "DEFAULT IDENTITY", "MY PERSONAL LABELS", "PERSONAL LABELS", "CV", "REVIEWS")
+_SECTION_HEADER = re.compile(
+    r"^(" + "|".join(re.escape(s) for s in PROFILE_SECTIONS) + r"):?\s*$",
+    re.MULTILINE
+)
+_EMPTY_SECTION = {"", "none", "none yet"}
+
+
+def split_profile_sections(profile_text: str) -> list:
+    """
+    [(section, body), ...] in profile order. Empty ("None") sections are
+    dropped; text without any known header comes back as one "PROFILE" section.
+    """
+    text = profile_text or ""
+    headers = list(_SECTION_HEADER.finditer(text))
+
+    if not headers:
+        body = text.strip()
+        return [("PROFILE", body)] if body.lower() not in _EMPTY_SECTION else []
+
+    sections = []
+    for i, m in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        body = text[m.end():end].strip()
+        if body.lower() not in _EMPTY_SECTION:
+            sections.append((m.group(1), body))
+
+    return sections
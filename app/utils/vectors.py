@@ -0,0 +1,41 @@
+import json
+import numpy as np
+
+# Binary embedding format stored in user_contact_embeddings.embedding:
+#   2-byte header  -> MAGIC + format version
+#   payload        -> raw little-endian float32 values
+# Legacy rows hold a JSON array ("[0.1, ...]"), which always starts with "[",
+# so both formats can live side by side during the rollout.
+
+EMBEDDING_MAGIC = b"\xfe"
+EMBEDDING_FORMAT_VERSION = 1
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+_HEADER = EMBEDDING_MAGIC + bytes([EMBEDDING_FORMAT_VERSION])
+
+
+def encode_embedding(vector) -> bytes:
+    arr = np.asarray(vector, dtype=EMBEDDING_DTYPE).ravel()
+    return _HEADER + arr.tobytes()
+
+
+def is_binary_embedding(raw) -> bool:
+    return isinstance(raw, (bytes, bytearray, memoryview)) and bytes(raw[:1]) == EMBEDDING_MAGIC
+
+
+def decode_embedding(raw) -> np.ndarray:
+    if raw is None:
+        raise ValueError("embedding is NULL")
+
+    if is_binary_embedding(raw):
+        version = raw[1]
+        if version != EMBEDDING_FORMAT_VERSION:
+            raise ValueError(f"unsupported embedding format version: {version}")
+        # Zero-copy view over the row buffer
+        return np.frombuffer(raw, dtype=EMBEDDING_DTYPE, offset=len(_HEADER))
+
+    # Legacy JSON text (TEXT / JSON column, or a BLOB holding JSON bytes)
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        raw = bytes(raw).decode("utf-8")
+
+    return np.asarray(json.loads(raw), dtype=np.float32)
@@ -0,0 +1,84 @@
+"""
+Recall@k and latency of IVFIndex vs. exact cosine_topk as the index grows,
+for a fixed nprobe and for nprobe taken as a fraction of nlist.
+
+nlist follows ann_index_service (4 * sqrt(rows)), so a fixed nprobe scans
+a shrinking share of the lists on bigger contact books.
+
+    python -m benchmarks.bench_ann_recall [--sizes 5000 20000 80000] [--dim 256]
+"""
+import argparse
+import math
+import time
+import numpy as np
+from app.utils.ivf import IVFIndex
+from app.utils.math import cosine_topk, l2_normalize
+
+
+def clustered_vectors(rng, n, dim, clusters):
+    # Embeddings are not uniform noise; clusters make near-ties realistic
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    assign = rng.integers(0, clusters, n)
+    noise = rng.standard_normal((n, dim), dtype=np.float32) * 0.6
+    return l2_normalize(centers[assign] + noise)
+
+
+def recall_at_k(index, queries, exact, k, nprobe):
+    started = time.perf_counter()
+    found = [index.search(q, k, nprobe=nprobe)[0] for q in queries]
+    elapsed = time.perf_counter() - started
+
+    hits = sum(len(set(got.tolist()) & set(want.tolist())) for got, want in zip(found, exact))
+    return hits / (k * len(queries)), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5_000, 20_000, 80_000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--rows-per-cluster", type=int, default=25,
+                        help="bigger books cover more distinct topics, not denser ones")
+    parser.add_argument("--nprobe", type=int, default=8, help="fixed probe count (ANN_NPROBE)")
+    parser.add_argument("--fractions", type=float, nargs="+", default=[0.05, 0.1, 0.2])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    print(f"{'rows':>7} {'nlist':>6} {'policy':>10} {'nprobe':>7} {'recall':>7} {'ms/query':>9}")
+
+    for n in args.sizes:
+        matrix = clustered_vectors(rng, n, args.dim, max(1, n // args.rows_per_cluster))
+        ids = np.arange(n, dtype=np.int64)
+
+        # Queries near real rows, as a search prompt lands near its matches
+        picks = rng.choice(n, args.queries, replace=False)
+        queries = l2_normalize(
+            matrix[picks] + rng.standard_normal((args.queries, args.dim), dtype=np.float32) * 0.03
+        )
+
+        index = IVFIndex(nlist=max(1, int(4 * math.sqrt(n))))
+        index.train(matrix)
+        index.add(ids, matrix)
+
+        # Exact baseline: ids are row positions, so cosine_topk is ground truth
+        exact_s = time.perf_counter()
+        exact = [cosine_topk(q, matrix, args.k)[0] for q in queries]
+        exact_s = time.perf_counter() - exact_s
+        print(f"{n:>7} {index.nlist:>6} {'exact':>10} {'-':>7} {1.0:>7.3f} "
+              f"{exact_s * 1e3 / args.queries:>9.2f}")
+
+        policies = [("fixed", args.nprobe)] + [
+            (f"{f:.0%} nlist", max(args.nprobe, math.ceil(f * index.nlist)))
+            for f in args.fractions
+        ]
+        for name, nprobe in policies:
+            nprobe = min(nprobe, index.nlist)
+            recall, seconds = recall_at_k(index, queries, exact, args.k, nprobe)
+            print(f"{n:>7} {index.nlist:>6} {name:>10} {nprobe:>7} {recall:>7.3f} "
+                  f"{seconds * 1e3 / args.queries:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
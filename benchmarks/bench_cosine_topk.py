@@ -0,0 +1,70 @@
+"""
+Per-row cosine loop vs. cosine_topk on a pre-normalized matrix.
+
+    python -m benchmarks.bench_cosine_topk [--dim 1536] [--k 40] [--queries 16]
+"""
+import argparse
+import time
+import numpy as np
+from app.utils.math import cosine_topk, l2_normalize
+
+
+def cosine(a, b):
+    # The helper every caller used before cosine_topk
+    denom = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(np.dot(a, b) / denom) if denom else 0.0
+
+
+def loop_topk(query, rows, k):
+    scored = [(cosine(query, r), i) for i, r in enumerate(rows)]
+    scored.sort(reverse=True)
+    return scored[:k]
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=16)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    print(f"{'rows':>8} {'loop ms':>10} {'topk ms':>10} {'speedup':>8} {'batch/q ms':>11}")
+
+    for n in args.sizes:
+        raw = rng.standard_normal((n, args.dim), dtype=np.float32)
+        rows = list(raw)
+        matrix = l2_normalize(raw)
+        query = rng.standard_normal(args.dim, dtype=np.float32)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+        # Same winners, modulo float rounding
+        expected = [i for _, i in loop_topk(query, rows, args.k)]
+        got, _ = cosine_topk(query, matrix, args.k)
+        overlap = len(set(expected) & set(got.tolist())) / args.k
+
+        repeat = 1 if n >= 100_000 else 3
+        loop_s = best_of(lambda: loop_topk(query, rows, args.k), repeat)
+        topk_s = best_of(lambda: cosine_topk(query, matrix, args.k), 5)
+        batch_s = best_of(lambda: cosine_topk(queries, matrix, args.k), 3)
+
+        print(
+            f"{n:>8} {loop_s * 1e3:>10.2f} {topk_s * 1e3:>10.2f} "
+            f"{loop_s / topk_s:>7.1f}x {batch_s * 1e3 / args.queries:>11.2f}"
+            f"   (overlap {overlap:.2f})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Recall@k and latency of vector-only retrieval vs. vector + BM25 fused by
+reciprocal rank fusion, on a synthetic contact book where each query asks
+for one specialist skill ("kubernetes", "solidity", ...).
+
+Dense profile embeddings are simulated as the mean of per-term vectors
+plus noise, so a rare skill mentioned once in a long profile is diluted
+the way it is with a real embedding model.
+
+    python -m benchmarks.bench_hybrid_retrieval [--rows 5000] [--dim 256]
+"""
+import argparse
+import time
+import numpy as np
+from app.utils.bm25 import BM25Index, reciprocal_rank_fusion
+from app.utils.math import cosine_topk, l2_normalize
+
+
+def build_corpus(rng, rows, dim, common_terms, skills, words_per_profile):
+    common = [f"word{i}" for i in range(common_terms)]
+    skill_names = [f"skill{i}" for i in range(skills)]
+    term_vectors = {
+        t: rng.standard_normal(dim).astype(np.float32)
+        for t in common + skill_names
+    }
+
+    texts, matrix, holders = [], [], {s: set() for s in skill_names}
+
+    for row in range(rows):
+        words = list(rng.choice(common, words_per_profile))
+        own = list(rng.choice(skill_names, rng.integers(0, 4), replace=False))
+        for s in own:
+            holders[s].add(row)
+
+        terms = words + own
+        texts.append(" ".join(terms))
+        vec = np.mean([term_vectors[t] for t in terms], axis=0)
+        matrix.append(vec + rng.standard_normal(dim).astype(np.float32) * 0.05)
+
+    return texts, l2_normalize(np.vstack(matrix)), term_vectors, holders
+
+
+def recall(found, relevant, k):
+    if not relevant:
+        return None
+    return len(set(found[:k]) & relevant) / min(len(relevant), k)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--common-terms", type=int, default=3000)
+    parser.add_argument("--skills", type=int, default=400)
+    parser.add_argument("--words", type=int, default=80)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--depth", type=int, default=100)
+    parser.add_argument("--rrf-k", type=int, default=60)
+    parser.add_argument("--query-noise", type=float, default=0.5,
+                        help="distance between query and skill embedding")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    texts, matrix, term_vectors, holders = build_corpus(
+        rng, args.rows, args.dim, args.common_terms, args.skills, args.words
+    )
+
+    t0 = time.perf_counter()
+    index = BM25Index()
+    for row, text in enumerate(texts):
+        index.add(row, text)
+    build_s = time.perf_counter() - t0
+
+    skills = [s for s in holders if holders[s]]
+    picked = rng.choice(skills, min(args.queries, len(skills)), replace=False)
+
+    ks = (10, 20, 40)
+    vector_recall = {k: [] for k in ks}
+    hybrid_recall = {k: [] for k in ks}
+    vector_s = lexical_s = fuse_s = 0.0
+
+    for skill in picked:
+        # The query embedding is near the skill, not equal to it (paraphrase)
+        query_text = f"find me a {skill} expert"
+        q = term_vectors[skill] + rng.standard_normal(args.dim).astype(np.float32) * args.query_noise
+
+        t0 = time.perf_counter()
+        top, _ = cosine_topk(q, matrix, args.depth)
+        t1 = time.perf_counter()
+        lexical, _ = index.search(query_text, args.depth)
+        t2 = time.perf_counter()
+        fused = [d for d, _ in reciprocal_rank_fusion([top.tolist(), lexical], args.rrf_k)]
+        t3 = time.perf_counter()
+
+        vector_s += t1 - t0
+        lexical_s += t2 - t1
+        fuse_s += t3 - t2
+
+        for k in ks:
+            vector_recall[k].append(recall(top.tolist(), holders[skill], k))
+            hybrid_recall[k].append(recall(fused, holders[skill], k))
+
+    n = len(picked)
+    print(f"{args.rows} profiles, {n} skill queries, BM25 build {build_s * 1e3:.0f} ms\n")
+
+    print(f"{'k':>4} {'vector recall':>14} {'hybrid recall':>14}")
+    for k in ks:
+        print(f"{k:>4} {np.mean(vector_recall[k]):>14.3f} {np.mean(hybrid_recall[k]):>14.3f}")
+
+    print(f"\n⏱️  vector  {vector_s * 1e3 / n:.2f} ms/query")
+    print(f"⏱️  bm25    {lexical_s * 1e3 / n:.2f} ms/query")
+    print(f"⏱️  fusion  {fuse_s * 1e3 / n:.2f} ms/query")
+    print(f"⏱️  hybrid  {(vector_s + lexical_s + fuse_s) * 1e3 / n:.2f} ms/query total")
+
+
+if __name__ == "__main__":
+    main()
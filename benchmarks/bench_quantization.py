@@ -0,0 +1,78 @@
+"""
+Memory, latency and top-k overlap of quantized storage vs. exact float32.
+
+    python -m benchmarks.bench_quantization [--rows 100000] [--dim 1536]
+"""
+import argparse
+import time
+import numpy as np
+from app.utils.math import cosine_topk, l2_normalize
+from app.utils.quantize import QuantizedMatrix
+
+
+def clustered_vectors(rng, n, dim, clusters=200):
+    # Embeddings are not uniform noise; clusters make near-ties realistic
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    assign = rng.integers(0, clusters, n)
+    noise = rng.standard_normal((n, dim), dtype=np.float32) * 0.6
+    return l2_normalize(centers[assign] + noise)
+
+
+def quantized_topk(quantized, matrix, query, k, rescore_k):
+    approx = quantized.scores(query)
+    pool = np.sort(np.argpartition(-approx, rescore_k - 1)[:rescore_k])
+    top, scores = cosine_topk(query, np.asarray(matrix[pool]), k)
+    return pool[top], scores
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return out, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=40)
+    parser.add_argument("--rescore-k", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = clustered_vectors(rng, args.rows, args.dim)
+    queries = clustered_vectors(rng, args.queries, args.dim)
+
+    per_100k = 100_000 / args.rows
+
+    print(f"{'storage':>8} {'MB/100k':>9} {'ms/query':>9} {'top-%d overlap' % args.k:>16}")
+
+    exact = [cosine_topk(q, matrix, args.k)[0] for q in queries]
+    _, exact_s = timed(lambda: [cosine_topk(q, matrix, args.k) for q in queries])
+    print(f"{'float32':>8} {matrix.nbytes * per_100k / 2**20:>9.1f} "
+          f"{exact_s * 1e3 / args.queries:>9.2f} {1.0:>16.3f}")
+
+    for kind in ("float16", "int8"):
+        quantized = QuantizedMatrix.from_float32(matrix, kind)
+
+        results, seconds = timed(lambda: [
+            quantized_topk(quantized, matrix, q, args.k, args.rescore_k)[0]
+            for q in queries
+        ])
+
+        overlap = np.mean([
+            len(set(a.tolist()) & set(b.tolist())) / args.k
+            for a, b in zip(exact, results)
+        ])
+
+        print(f"{kind:>8} {quantized.nbytes * per_100k / 2**20:>9.1f} "
+              f"{seconds * 1e3 / args.queries:>9.2f} {overlap:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Peak RSS of the old fetchall() retrieval vs. the two-phase streaming path.
+
+Each mode runs in its own child process against a synthetic cursor that
+serves rows the way an unbuffered MySQL cursor would.
+
+    python -m benchmarks.bench_retrieval_memory [--rows 20000] [--profile-kb 12]
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+from app.services.retrieval_service import stream_topk
+from app.utils.vectors import encode_embedding
+
+
+class SyntheticCursor:
+
+    def __init__(self, rows: int, dim: int, profile_kb: int):
+        self.rows = rows
+        self.dim = dim
+        self.profile = "x" * (profile_kb * 1024)
+        self.rng = np.random.default_rng(0)
+        self._with_text = False
+        self._next = 0
+
+    def execute(self, query, params=None):
+        self._with_text = "profile_text" in query
+        self._next = 0
+
+    def _row(self, i):
+        row = {
+            "id": i,
+            "contact_id": i,
+            "context_hash": f"{i:064x}",
+            "embedding": encode_embedding(self.rng.standard_normal(self.dim, dtype=np.float32)),
+        }
+        if self._with_text:
+            # A fresh string per row, like rows decoded off the wire
+            row.update(profile_text=f"{self.profile}{i}", display_name=f"Contact {i}", phone="+000")
+        return row
+
+    def fetchmany(self, size):
+        end = min(self._next + size, self.rows)
+        batch = [self._row(i) for i in range(self._next, end)]
+        self._next = end
+        return batch
+
+    def fetchall(self):
+        return self.fetchmany(self.rows)
+
+    def close(self):
+        pass
+
+
+def legacy_retrieve(cur, query, top_k):
+    # The pre-streaming shape: every row, profile_text included, in memory
+    from app.utils.vectors import decode_embedding
+
+    cur.execute("SELECT uce.contact_id, uce.embedding, uce.profile_text ...")
+    results = []
+    for r in cur.fetchall():
+        emb = decode_embedding(r["embedding"])
+        denom = np.linalg.norm(query) * np.linalg.norm(emb)
+        results.append({
+            "contact_id": r["contact_id"],
+            "profile_text": (r["profile_text"] or "").strip(),
+            "score": float(np.dot(query, emb) / denom) if denom else 0.0,
+        })
+    results.sort(key=lambda x: x["score"], reverse=True)
+    return results[:top_k]
+
+
+def run_child(mode, rows, dim, profile_kb, top_k):
+    cur = SyntheticCursor(rows, dim, profile_kb)
+    query = np.random.default_rng(1).standard_normal(dim, dtype=np.float32)
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+
+    if mode == "legacy":
+        legacy_retrieve(cur, query, top_k)
+    else:
+        stream_topk(cur, 0, query, top_k)
+
+    elapsed = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is KiB on Linux
+    print(f"{mode:>9} peak +{(peak - before) / 1024:8.1f} MiB   {elapsed * 1e3:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--profile-kb", type=int, default=12)
+    parser.add_argument("--top-k", type=int, default=40)
+    parser.add_argument("--mode", choices=["legacy", "streaming"])
+    args = parser.parse_args()
+
+    if args.mode:
+        run_child(args.mode, args.rows, args.dim, args.profile_kb, args.top_k)
+        return
+
+    print(f"{args.rows} rows, dim {args.dim}, {args.profile_kb} KiB profile_text each")
+    for mode in ("legacy", "streaming"):
+        subprocess.run([
+            sys.executable, "-m", "benchmarks.bench_retrieval_memory",
+            "--mode", mode,
+            "--rows", str(args.rows),
+            "--dim", str(args.dim),
+            "--profile-kb", str(args.profile_kb),
+            "--top-k", str(args.top_k),
+        ], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,244 +1,56 @@
-import os
-import json
-import hashlib
-import mysql.connector
+import argparse
 from dotenv import load_dotenv
-from openai import OpenAI
-from pymongo import MongoClient
+from app.core.config import EMBED_CONCURRENCY
+from app.core.mongo import check_review_index, close_mongo
+from app.services.embedding_build_service import rebuild_embeddings
 
 # =========================
 # ENV SETUP
 # =========================
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-# MYSQL CONNECTION
-db = mysql.connector.connect(
-    host=os.getenv("DB_HOST"),
-    user=os.getenv("DB_USER"),
-    password=os.getenv("DB_PASSWORD"),
-    database=os.getenv("DB_NAME"),
-)
-
-cursor = db.cursor(dictionary=True)
-
-# MONGODB CONNECTION
-mongo_client = MongoClient(os.getenv("MONGO_URI"))
-mongo_db = mongo_client[os.getenv("MONGO_DB")]
-reviews_collection = mongo_db["reviews"]
-
-# =========================
-# HELPERS
 # =========================
-def sha256(text: str) -> str:
-    return hashlib.sha256(text.encode("utf-8")).hexdigest()
-
-
-def embed(text: str):
-    res = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
-    )
-    return res.data[0].embedding
-
-
-def fetch_all(query: str, params: tuple):
-    cursor.execute(query, params)
-    return cursor.fetchall()
-
-
-def fetch_one(query: str, params: tuple):
-    cursor.execute(query, params)
-    return cursor.fetchone()
-
-
+# MAIN
+# Rebuilds every user_contact_embeddings row flagged needs_rebuild, in
+# token-sized embedding batches with EMBED_CONCURRENCY calls in flight.
+# Works before and after rebuild_worker.py --migrate; only migrated tables
+# protect rows flagged again mid-run from being overwritten.
 # =========================
-# MAIN QUERY
-# =========================
-TEST_EMBEDDING_IDS = (1344,367,604,601,109,13,601,148,192,1162,1155,36)
-
-cursor.execute(
-    """
-    SELECT
-        uce.id AS embedding_id,
-        uce.user_id,
-        uce.contact_id,
-        c.phone,
-        uc.id AS user_contact_id,
-        uc.display_name,
-        cu.id AS contact_user_id,
-        cu.fname,
-        cu.lname
-    FROM user_contact_embeddings uce
-    JOIN contacts c ON c.id = uce.contact_id
-    LEFT JOIN user_contacts uc
-           ON uc.user_id = uce.user_id
-          AND uc.contact_id = uce.contact_id
-    LEFT JOIN users cu
-           ON cu.phone = c.phone
-    WHERE uce.id IN (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-      AND uce.needs_rebuild = 1
-    """,
-    TEST_EMBEDDING_IDS
-)
-
-rows = cursor.fetchall()
-print(f"🔄 {len(rows)} embeddings to rebuild")
-
-
-# =========================
-# PROCESS
-# =========================
-for r in rows:
-
-    # -------- NAME RESOLUTION --------
-    if r["display_name"]:
-        name = r["display_name"]
-    elif r["fname"] or r["lname"]:
-        name = f"{r['fname'] or ''} {r['lname'] or ''}".strip()
-    else:
-        name = "Unknown"
-
-    # -------- DEFAULT IDENTITY --------
-    default_identity = "None"
-    if r["contact_user_id"]:
-        rows_dd = fetch_all(
-            """
-            SELECT label, description
-            FROM default_description
-            WHERE users_id = %s
-            """,
-            (r["contact_user_id"],)
-        )
-
-        if rows_dd:
-            default_identity = "\n".join(
-                f"- {d['label']}: {d['description']}"
-                for d in rows_dd
-            )
-
-    # -------- PERSONAL LABELS --------
-    personal_labels = "None yet"
-    if r["user_contact_id"]:
-        rows_pl = fetch_all(
-            """
-            SELECT label, description
-            FROM user_contact_descriptions
-            WHERE user_contact_id = %s
-            """,
-            (r["user_contact_id"],)
-        )
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild contact embeddings flagged needs_rebuild.")
+    parser.add_argument("--ids", type=int, nargs="*",
+                        help="only these user_contact_embeddings ids")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=EMBED_CONCURRENCY)
+    args = parser.parse_args()
 
-        if rows_pl:
-            personal_labels = "\n".join(
-                f"- {p['label']}: {p['description']}"
-                for p in rows_pl
-            )
+    # Reviews are loaded with one $in per page on default_description_id
+    check_review_index()
 
-    # -------- CV --------
-    cv_text = "None"
-    if r["contact_user_id"]:
-        cv = fetch_one(
-            """
-            SELECT cv
-            FROM users_cv
-            WHERE user_id = %s
-            """,
-            (r["contact_user_id"],)
+    try:
+        stats = rebuild_embeddings(
+            embedding_ids=args.ids,
+            limit=args.limit,
+            concurrency=args.concurrency
         )
+    finally:
+        close_mongo()
 
-        if cv and cv["cv"]:
-            cv_text = cv["cv"]
-
-    # ==========================================
-    # 🔥 REVIEWS (NOW FROM MONGODB)
-    # ==========================================
-    reviews_text = "None"
-
-    if r["contact_user_id"]:
-
-        # get all default descriptions for that user
-        desc_rows = fetch_all(
-            """
-            SELECT id, label, description
-            FROM default_description
-            WHERE users_id = %s
-            """,
-            (r["contact_user_id"],)
-        )
-
-        formatted_reviews = []
-
-        for desc in desc_rows:
-
-            # fetch reviews from Mongo
-            mongo_reviews = reviews_collection.find({
-                "default_description_id": desc["id"]
-            })
-
-            for rv in mongo_reviews:
-
-                if rv.get("review"):
-
-                    formatted_reviews.append(
-                        f"""[REVIEW CONTEXT]
-Role: {desc['label'] or 'Unknown'}
-Description: {desc['description'] or 'None'}
-Review: {rv['review']}
-"""
-                    )
-
-        if formatted_reviews:
-            reviews_text = "\n".join(formatted_reviews)
-
-    # -------- PROFILE TEXT --------
-    profile_text = f"""CONTACT
-Name: {name}
-Phone: {r['phone']}
-
-DEFAULT IDENTITY
-{default_identity}
-
-MY PERSONAL LABELS
-{personal_labels}
-
-CV
-{cv_text}
-
-REVIEWS
-{reviews_text}
-"""
-
-    context_hash = sha256(profile_text)
-    embedding = embed(profile_text)
-
-    cursor.execute(
-        """
-        UPDATE user_contact_embeddings
-        SET profile_text = %s,
-            embedding = %s,
-            context_hash = %s,
-            needs_rebuild = 0
-        WHERE id = %s
-        """,
-        (
-            profile_text,
-            json.dumps(embedding),
-            context_hash,
-            r["embedding_id"]
-        )
+    print(
+        f"🎉 {stats['updated']}/{stats['rows']} embeddings rebuilt in {stats['seconds']}s "
+        f"({stats['api_calls']} embedding calls, ~{stats['tokens']} tokens)"
     )
+    print(
+        f"♻️  {stats['unchanged']} rows unchanged (same context_hash): "
+        f"{stats['unchanged']} embedding inputs / ~{stats['tokens_avoided']} tokens avoided"
+    )
+    if stats["orphans"]:
+        print(f"🧹 {stats['orphans']} rows had no contact; their flag was cleared")
+    if stats["superseded"]:
+        print(f"🔁 {stats['superseded']} rows were flagged again mid-run and left for the next one")
+    print(f"🗄️  {stats['sql_queries']} SQL + {stats['mongo_queries']} Mongo queries for profile assembly")
 
-    db.commit()
-    print(f"✅ Updated embedding {r['embedding_id']} ({name})")
-
-
-# =========================
-# CLEANUP
-# =========================
-cursor.close()
-db.close()
-mongo_client.close()
 
-print("🎉 All embeddings rebuilt correctly")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
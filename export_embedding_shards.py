@@ -0,0 +1,47 @@
+import argparse
+import time
+from app.core.config import EMBEDDING_SHARD_DIR
+from app.core.database import get_cursor
+from app.services.embedding_cache_service import load_user_matrix
+from app.services.embedding_shard_service import write_user_shard
+
+# =========================
+# Writes every user's contact embeddings to EMBEDDING_SHARD_DIR so API
+# workers can memory-map them instead of decoding rows from MySQL.
+# Safe to run while the API is serving: shards are swapped atomically.
+# =========================
+
+
+def all_user_ids():
+    with get_cursor() as cur:
+        cur.execute("SELECT DISTINCT user_id FROM user_contact_embeddings ORDER BY user_id")
+        return [r["user_id"] for r in cur.fetchall()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export per-user embedding shards.")
+    parser.add_argument("--user-id", type=int, action="append",
+                        help="only export these users (repeatable)")
+    args = parser.parse_args()
+
+    if not EMBEDDING_SHARD_DIR:
+        raise SystemExit("EMBEDDING_SHARD_DIR is not set")
+
+    user_ids = args.user_id or all_user_ids()
+    print(f"🔄 Exporting {len(user_ids)} users to {EMBEDDING_SHARD_DIR}")
+
+    started = time.perf_counter()
+    total_rows = 0
+
+    for uid in user_ids:
+        entry = load_user_matrix(uid)
+        write_user_shard(entry)
+        total_rows += entry.size
+        print(f"✅ user {uid}: {entry.size} rows")
+
+    elapsed = time.perf_counter() - started
+    print(f"🎉 {total_rows} rows in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import os
+import argparse
+import mysql.connector
+from dotenv import load_dotenv
+from app.utils.vectors import decode_embedding, encode_embedding, is_binary_embedding
+
+# =========================
+# ENV SETUP
+# =========================
+load_dotenv()
+
+# The binary format needs a byte column. Run once before the conversion
+# (or pass --alter-column). Legacy JSON text survives the type change as
+# UTF-8 bytes, which the read path still understands.
+ALTER_COLUMN_SQL = """
+    ALTER TABLE user_contact_embeddings
+    MODIFY embedding MEDIUMBLOB NULL
+"""
+
+
+def connect():
+    return mysql.connector.connect(
+        host=os.getenv("DB_HOST"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+    )
+
+
+# =========================
+# MIGRATION
+# =========================
+def migrate(db, batch_size: int, dry_run: bool = False):
+    cursor = db.cursor(dictionary=True)
+
+    last_id = 0
+    converted = 0
+    skipped = 0
+    failed = 0
+
+    while True:
+        # Keyset pagination keeps each batch cheap on large tables
+        cursor.execute(
+            """
+            SELECT id, embedding
+            FROM user_contact_embeddings
+            WHERE id > %s
+              AND embedding IS NOT NULL
+            ORDER BY id
+            LIMIT %s
+            """,
+            (last_id, batch_size)
+        )
+        rows = cursor.fetchall()
+
+        if not rows:
+            break
+
+        updates = []
+
+        for r in rows:
+            last_id = r["id"]
+
+            if is_binary_embedding(r["embedding"]):
+                skipped += 1
+                continue
+
+            try:
+                vector = decode_embedding(r["embedding"])
+            except (ValueError, TypeError):
+                failed += 1
+                print(f"⚠️  Could not decode embedding {r['id']}")
+                continue
+
+            updates.append((encode_embedding(vector), r["id"]))
+
+        if updates and not dry_run:
+            cursor.executemany(
+                "UPDATE user_contact_embeddings SET embedding = %s WHERE id = %s",
+                updates
+            )
+            db.commit()
+
+        converted += len(updates)
+        print(f"🔄 up to id {last_id}: {converted} converted, {skipped} already binary, {failed} failed")
+
+    cursor.close()
+    return converted, skipped, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert JSON contact embeddings to the binary float32 format."
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--alter-column", action="store_true",
+                        help="change user_contact_embeddings.embedding to MEDIUMBLOB first")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    db = connect()
+    try:
+        if args.alter_column and not args.dry_run:
+            cur = db.cursor()
+            cur.execute(ALTER_COLUMN_SQL)
+            cur.close()
+            print("✅ embedding column is now MEDIUMBLOB")
+
+        converted, skipped, failed = migrate(db, args.batch_size, args.dry_run)
+    finally:
+        db.close()
+
+    print(f"🎉 Done: {converted} converted, {skipped} already binary, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import signal
+import socket
+import argparse
+from dotenv import load_dotenv
+from app.core.config import (
+    EMBED_CONCURRENCY,
+    REBUILD_IDLE_SECONDS,
+    REBUILD_LEASE_SECONDS,
+    REBUILD_WORKER_BATCH,
+)
+from app.core.mongo import check_review_index, close_mongo
+from app.services.embedding_build_service import rebuild_embeddings
+from app.services.rebuild_queue_service import (
+    apply_rebuild_queue_migration,
+    claim_batch,
+    get_rebuild_queue_stats,
+    release_claims,
+    renew_claims,
+)
+
+# =========================
+# ENV SETUP
+# =========================
+load_dotenv()
+
+_stopping = False
+
+
+def _request_stop(signum, frame):
+    global _stopping
+    _stopping = True
+    print("🛑 Stop requested; finishing the current batch")
+
+
+# =========================
+# CHECKPOINT
+# Rebuilt rows clear needs_rebuild chunk by chunk, and unfinished claims
+# are picked up again by the same --worker-id on restart (or by anyone
+# once the lease expires). The checkpoint file carries the worker's
+# running totals across restarts.
+# =========================
+def load_checkpoint(path: str) -> dict:
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"batches": 0, "rows": 0, "updated": 0, "unchanged": 0, "superseded": 0,
+            "orphans": 0, "deferred": 0, "api_calls": 0, "tokens": 0, "busy_seconds": 0.0}
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    # Atomic on POSIX: a crash never leaves a half-written file
+    os.replace(tmp, path)
+
+
+# =========================
+# WORKER LOOP
+# =========================
+def run_worker(worker_id: str, checkpoint_path: str, batch_size: int,
+               lease_seconds: int, concurrency: int, once: bool):
+
+    checkpoint = load_checkpoint(checkpoint_path)
+    print(f"👷 Worker {worker_id} started ({checkpoint['rows']} rows done so far)")
+
+    while not _stopping:
+        ids = claim_batch(worker_id, batch_size, lease_seconds)
+
+        if not ids:
+            if once:
+                break
+            time.sleep(REBUILD_IDLE_SECONDS)
+            continue
+
+        started = time.perf_counter()
+        renewed = [started]
+
+        def heartbeat():
+            # Keep the lease at least two thirds ahead of the batch
+            now = time.perf_counter()
+            if now - renewed[0] >= lease_seconds / 3:
+                renew_claims(worker_id, lease_seconds)
+                renewed[0] = now
+
+        try:
+            stats = rebuild_embeddings(embedding_ids=ids, concurrency=concurrency,
+                                       heartbeat=heartbeat)
+        except Exception as e:
+            # Unfinished rows keep their lease end; retried once it expires
+            print(f"❌ Batch of {len(ids)} failed: {e}")
+            release_claims(worker_id, ids)
+            time.sleep(REBUILD_IDLE_SECONDS)
+            continue
+
+        deferred = release_claims(worker_id, ids)
+
+        checkpoint["batches"] += 1
+        checkpoint["deferred"] += deferred
+        checkpoint["busy_seconds"] += time.perf_counter() - started
+        for key in ("rows", "updated", "unchanged", "superseded", "orphans", "api_calls", "tokens"):
+            checkpoint[key] = checkpoint.get(key, 0) + stats[key]
+        checkpoint["last_batch"] = {"first_id": ids[0], "last_id": ids[-1], "rows": len(ids)}
+        checkpoint["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        save_checkpoint(checkpoint_path, checkpoint)
+
+        queue = get_rebuild_queue_stats()
+        rate = checkpoint["rows"] / checkpoint["busy_seconds"] if checkpoint["busy_seconds"] else 0.0
+        print(
+            f"✅ Batch {checkpoint['batches']}: {stats['rows']} rows in {stats['seconds']}s "
+            f"({deferred} deferred) | queue {queue['pending']} pending, "
+            f"{queue['available']} available | {rate:.1f} rows/s overall"
+        )
+
+    print(f"👋 Worker {worker_id} stopped after {checkpoint['rows']} rows")
+
+
+# =========================
+# MAIN
+# Long-running rebuild of user_contact_embeddings rows flagged
+# needs_rebuild. Several workers can run at once; give each a distinct
+# --worker-id so a restarted worker resumes its own claims.
+# =========================
+def main():
+    parser = argparse.ArgumentParser(description="Background worker for contact embedding rebuilds.")
+    parser.add_argument("--worker-id", default=socket.gethostname(),
+                        help="unique per running worker (max 64 chars)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="checkpoint file (default .rebuild_worker_<worker-id>.json)")
+    parser.add_argument("--batch-size", type=int, default=REBUILD_WORKER_BATCH)
+    parser.add_argument("--lease-seconds", type=int, default=REBUILD_LEASE_SECONDS)
+    parser.add_argument("--concurrency", type=int, default=EMBED_CONCURRENCY)
+    parser.add_argument("--once", action="store_true",
+                        help="exit when the queue is empty instead of polling")
+    parser.add_argument("--migrate", action="store_true",
+                        help="add the claim/version columns, index and trigger, then exit")
+    parser.add_argument("--status", action="store_true",
+                        help="print queue depth and exit")
+    args = parser.parse_args()
+
+    if args.migrate:
+        apply_rebuild_queue_migration()
+        print("✅ Claim / version columns and trigger added to user_contact_embeddings")
+        return
+
+    if args.status:
+        print(json.dumps(get_rebuild_queue_stats(), indent=2))
+        return
+
+    signal.signal(signal.SIGINT, _request_stop)
+    signal.signal(signal.SIGTERM, _request_stop)
+
+    check_review_index()
+
+    try:
+        run_worker(
+            worker_id=args.worker_id,
+            checkpoint_path=args.checkpoint or f".rebuild_worker_{args.worker_id}.json",
+            batch_size=args.batch_size,
+            lease_seconds=args.lease_seconds,
+            concurrency=args.concurrency,
+            once=args.once
+        )
+    finally:
+        close_mongo()
+
+
+if __name__ == "__main__":
+    main()
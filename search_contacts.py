@@ -1,8 +1,10 @@
-import os, json
+import os
 import numpy as np
 import mysql.connector
 from dotenv import load_dotenv
 from openai import OpenAI
+from app.utils.math import cosine_topk, l2_normalize
+from app.utils.vectors import decode_embedding
 
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -26,12 +28,6 @@ def get_query_embedding(text: str) -> np.ndarray:
     )
     return np.array(res.data[0].embedding, dtype=np.float32)
 
-def cosine(a: np.ndarray, b: np.ndarray) -> float:
-    denom = (np.linalg.norm(a) * np.linalg.norm(b))
-    if denom == 0:
-        return 0.0
-    return float(np.dot(a, b) / denom)
-
 def load_user_embeddings(user_id: int):
     # Join to get phone + display_name (since contacts has only phone)
     cur.execute(
@@ -63,29 +59,36 @@ def main():
     q = get_query_embedding(query)
     rows = load_user_embeddings(USER_ID)
 
-    scored = []
+    decoded = []
+    vectors = []
     for r in rows:
         try:
-            emb = np.array(json.loads(r["embedding"]), dtype=np.float32)
-        except Exception:
+            vectors.append(decode_embedding(r["embedding"]))
+        except (ValueError, TypeError):
             continue
+        decoded.append(r)
+
+    if not vectors:
+        print("No embeddings for this user.")
+        return
 
-        score = cosine(q, emb)
+    matrix = l2_normalize(np.vstack(vectors))
+    top, scores = cosine_topk(q, matrix, TOP_K)
 
-        name = r["display_name"] or "Unknown"
+    scored = []
+    for i, score in zip(top, scores):
+        r = decoded[i]
         scored.append({
-            "score": score,
+            "score": float(score),
             "embedding_row_id": r["embedding_row_id"],
             "contact_id": r["contact_id"],
-            "name": name,
+            "name": r["display_name"] or "Unknown",
             "phone": r["phone"],
             "profile_text": (r["profile_text"] or "")[:400]  # preview
         })
 
-    scored.sort(key=lambda x: x["score"], reverse=True)
-
     print("\n=== TOP MATCHES ===")
-    for i, s in enumerate(scored[:TOP_K], start=1):
+    for i, s in enumerate(scored, start=1):
         print(f"\n#{i}  score={s['score']:.4f}")
         print(f"   name: {s['name']}")
         print(f"   phone: {s['phone']}")
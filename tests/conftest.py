@@ -0,0 +1,4 @@
+import os
+
+# app.core.config builds the OpenAI clients at import; no request is sent
+os.environ.setdefault("OPENAI_API_KEY", "test")
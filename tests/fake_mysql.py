@@ -0,0 +1,200 @@
+"""
+In-memory stand-in for the user_contact_embeddings statements the rebuild
+code issues. It recognizes each statement by its shape and applies the
+same WHERE clauses, including the rebuild_version trigger. NOW() is
+db.now, in seconds.
+"""
+import re
+from contextlib import contextmanager
+
+
+def _ids_in(sql, params):
+    return set(params[:sql.count("%s")]) if "IN (" in sql else None
+
+
+class FakeDB:
+
+    def __init__(self, versioned: bool = True):
+        self.versioned = versioned
+        self.rows = {}          # id -> user_contact_embeddings row
+        self.contacts = {}      # id -> phone
+        self.writes = []        # (sql, params) per executed row write
+        self.now = 0
+
+    def add(self, row_id, contact_id=None, phone="+1", needs_rebuild=1, **extra):
+        contact_id = row_id if contact_id is None else contact_id
+        self.contacts.setdefault(contact_id, phone)
+        self.rows[row_id] = {
+            "id": row_id, "user_id": 1, "contact_id": contact_id,
+            "profile_text": None, "embedding": None, "context_hash": None,
+            "needs_rebuild": needs_rebuild, "rebuild_version": 0,
+            "claimed_by": None, "claimed_until": None, **extra,
+        }
+
+    def update(self, row_id, **changes):
+        """An UPDATE from outside the builder, with the BEFORE UPDATE trigger."""
+        row = self.rows[row_id]
+        claims_kept = all(changes.get(k, row[k]) == row[k] for k in ("claimed_by", "claimed_until"))
+        row.update(changes)
+        if row["needs_rebuild"] == 1 and claims_kept:
+            row["rebuild_version"] += 1
+
+    def reflag(self, row_id):
+        self.update(row_id, needs_rebuild=1)
+
+    def claimed(self, worker_id):
+        return sorted(i for i, r in self.rows.items() if r["claimed_by"] == worker_id)
+
+    # ------------------------------------------
+
+    @contextmanager
+    def connection(self):
+        yield FakeConnection(self)
+
+    @contextmanager
+    def cursor(self):
+        yield FakeCursor(self)
+
+
+class FakeConnection:
+
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db, dictionary)
+
+    def start_transaction(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakeCursor:
+
+    def __init__(self, db, dictionary=True):
+        self.db = db
+        self.dictionary = dictionary
+        self.result = []
+        self.rowcount = 0
+
+    def close(self):
+        pass
+
+    def fetchall(self):
+        rows, self.result = self.result, []
+        return rows
+
+    def fetchone(self):
+        return self.result.pop(0) if self.result else None
+
+    def executemany(self, sql, seq):
+        total = 0
+        for params in seq:
+            self.execute(sql, params)
+            total += self.rowcount
+        self.rowcount = total
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        db = self.db
+        self.result, self.rowcount = [], 0
+
+        if "information_schema.COLUMNS" in sql:
+            self.result = [{"n": 3 if db.versioned else 0}]
+
+        elif sql.startswith("UPDATE user_contact_embeddings uce LEFT JOIN contacts"):
+            self._require_version(sql)
+            ids = _ids_in(sql, params)
+            for row in db.rows.values():
+                orphan = row["contact_id"] not in db.contacts
+                if row["needs_rebuild"] and orphan and (ids is None or row["id"] in ids):
+                    row["needs_rebuild"] = 0
+                    if "claimed_by" in sql:
+                        row["claimed_by"] = row["claimed_until"] = None
+                    self.rowcount += 1
+
+        elif "AS embedding_id" in sql:
+            self._require_version(sql)
+            ids = _ids_in(sql, params)
+            for row in sorted(db.rows.values(), key=lambda r: r["id"]):
+                known = row["contact_id"] in db.contacts
+                if row["needs_rebuild"] and known and (ids is None or row["id"] in ids):
+                    self.result.append({
+                        "embedding_id": row["id"], "user_id": row["user_id"],
+                        "contact_id": row["contact_id"], "stored_hash": row["context_hash"],
+                        "has_embedding": row["embedding"] is not None,
+                        "rebuild_version": row["rebuild_version"],
+                        "phone": db.contacts[row["contact_id"]], "user_contact_id": None,
+                        "display_name": f"Contact {row['id']}", "contact_user_id": None,
+                        "fname": None, "lname": None,
+                    })
+
+        elif sql.startswith("UPDATE user_contact_embeddings SET profile_text"):
+            self._write(sql, params, ("profile_text", "embedding", "context_hash"))
+
+        elif sql.startswith("UPDATE user_contact_embeddings SET needs_rebuild = 0 WHERE id"):
+            self._write(sql, params, ())
+
+        elif sql.startswith("UPDATE user_contact_embeddings SET claimed_by = %s"):
+            # CLAIM_SQL
+            worker_id, lease, limit = params
+            for row in sorted(db.rows.values(), key=lambda r: r["id"]):
+                free = row["claimed_until"] is None or row["claimed_until"] < db.now
+                if row["needs_rebuild"] == 1 and free and self.rowcount < limit:
+                    db.update(row["id"], claimed_by=worker_id, claimed_until=db.now + lease)
+                    self.rowcount += 1
+
+        elif sql.startswith("SELECT id FROM user_contact_embeddings WHERE claimed_by"):
+            worker_id, limit = params
+            ids = [i for i in db.claimed(worker_id) if db.rows[i]["needs_rebuild"] == 1]
+            self.result = [{"id": i} for i in ids[:limit]]
+
+        elif sql.startswith("SELECT COUNT(*) FROM user_contact_embeddings WHERE claimed_by"):
+            worker_id, ids = params[0], set(params[1:])
+            n = sum(1 for i in db.claimed(worker_id) if i in ids and db.rows[i]["needs_rebuild"] == 1)
+            self.result = [(n,)]
+
+        elif sql.startswith("UPDATE user_contact_embeddings SET claimed_by = NULL"):
+            # RELEASE_SQL
+            worker_id, ids = params[0], set(params[1:])
+            for i in db.claimed(worker_id):
+                if i in ids:
+                    row = db.rows[i]
+                    until = row["claimed_until"] if row["needs_rebuild"] == 1 else None
+                    db.update(i, claimed_by=None, claimed_until=until)
+                    self.rowcount += 1
+
+        elif sql.startswith("UPDATE user_contact_embeddings SET claimed_until = NOW()"):
+            # RENEW_SQL
+            lease, worker_id = params
+            for i in db.claimed(worker_id):
+                if db.rows[i]["needs_rebuild"] == 1:
+                    db.update(i, claimed_until=db.now + lease)
+                    self.rowcount += 1
+
+        else:
+            raise AssertionError(f"unexpected SQL: {sql}")
+
+    def _require_version(self, sql):
+        if not self.db.versioned and re.search(r"uce\.(rebuild_version|claimed_)", sql):
+            raise AssertionError("Unknown column in an unmigrated table")
+
+    def _write(self, sql, params, columns):
+        guarded = "rebuild_version = %s" in sql
+        if guarded and not self.db.versioned:
+            raise AssertionError("Unknown column 'rebuild_version'")
+
+        values = params[:len(columns)]
+        row = self.db.rows.get(params[len(columns)])
+        if row is None or (guarded and row["rebuild_version"] != params[len(columns) + 1]):
+            return
+
+        row.update(zip(columns, values))
+        row["needs_rebuild"] = 0
+        self.db.writes.append((sql, params))
+        self.rowcount = 1
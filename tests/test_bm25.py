@@ -0,0 +1,88 @@
+from app.utils.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def build(docs):
+    index = BM25Index()
+    for doc_id, text in docs.items():
+        index.add(doc_id, text)
+    return index
+
+
+def test_tokenize_keeps_tech_terms_and_drops_stopwords():
+    assert tokenize("The C++ and C# dev, node.js for k8s.") == ["c++", "c#", "dev", "node.js", "k8s"]
+
+
+def test_rare_term_outranks_common_term():
+    index = build({
+        1: "python developer",
+        2: "python developer",
+        3: "python developer kubernetes",
+    })
+
+    ids, scores = index.search("python kubernetes", 3)
+
+    assert ids[0] == 3
+    assert scores[0] > scores[1]
+
+
+def test_shorter_document_wins_at_equal_term_frequency():
+    index = build({
+        1: "solidity " + " ".join(f"filler{i}" for i in range(30)),
+        2: "solidity auditor",
+        3: "designer",
+    })
+
+    ids, _ = index.search("solidity", 5)
+
+    # Only matching documents come back
+    assert ids == [2, 1]
+
+
+def test_term_frequency_saturates():
+    index = build({
+        1: "rust " * 50,
+        2: "rust go",
+        3: "java",
+    })
+
+    _, scores = index.search("rust", 2)
+
+    assert scores[0] < 2 * scores[1]
+
+
+def test_add_replaces_and_remove_forgets():
+    index = build({1: "react frontend", 2: "react native mobile"})
+
+    index.add(1, "backend golang")
+    ids, _ = index.search("react", 5)
+    assert ids == [2]
+
+    index.remove([2, 99])
+    assert index.search("react", 5)[0] == []
+    assert len(index) == 1
+    assert index.total_len == 2
+    assert "react" not in index.postings
+
+
+def test_empty_index_and_zero_k():
+    assert BM25Index().search("anything", 5)[0] == []
+    assert build({1: "x"}).search("x", 0)[0] == []
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    vector = ["a", "b", "c", "d"]
+    lexical = ["c", "e", "a"]
+
+    fused = [doc_id for doc_id, _ in reciprocal_rank_fusion([vector, lexical], k=60)]
+
+    # a: 1/61 + 1/63, c: 1/63 + 1/61 tie on score; a keeps its first-seen place
+    assert fused[:2] == ["a", "c"]
+    assert fused[2:] == ["b", "e", "d"]
+
+
+def test_rrf_scores_and_single_ranking_order():
+    fused = dict(reciprocal_rank_fusion([["x", "y"]], k=10))
+
+    assert fused["x"] == 1 / 11
+    assert fused["y"] == 1 / 12
+    assert reciprocal_rank_fusion([]) == []
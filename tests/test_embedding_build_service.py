@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+import pytest
+from app.services import embedding_build_service as ebs
+from tests.fake_mysql import FakeDB
+
+
+class FakeEmbeddings:
+
+    def __init__(self, on_call=None):
+        self.inputs = []
+        self.on_call = on_call
+
+    def create(self, model, input):
+        self.inputs.append(list(input))
+        if self.on_call:
+            self.on_call()
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=[1.0, float(i)]) for i in range(len(input))
+        ])
+
+
+@pytest.fixture
+def build(monkeypatch):
+    """Returns run(db, on_call=None) -> (stats, embeddings api)."""
+
+    # Character-based token estimates; no tokenizer download
+    monkeypatch.setattr(ebs, "count_tokens", lambda text: len(text) // 4)
+    monkeypatch.setattr(ebs, "truncate_to_tokens", lambda text, n: text[:n * 4])
+
+    def run(db, on_call=None, **kwargs):
+        api = FakeEmbeddings(on_call)
+        monkeypatch.setattr(ebs, "client", SimpleNamespace(embeddings=api))
+        monkeypatch.setattr(ebs, "get_connection", db.connection)
+        return ebs.rebuild_embeddings(concurrency=1, **kwargs), api
+
+    return run
+
+
+def test_versioned_build_writes_and_clears_flags(build):
+    db = FakeDB()
+    for row_id in (1, 2, 3):
+        db.add(row_id)
+
+    stats, api = build(db)
+
+    assert (stats["rows"], stats["updated"], stats["superseded"]) == (3, 3, 0)
+    assert len(api.inputs) == 1 and len(api.inputs[0]) == 3
+    assert all(r["needs_rebuild"] == 0 and r["embedding"] for r in db.rows.values())
+    assert all("rebuild_version = %s" in sql for sql, _ in db.writes)
+
+
+def test_unchanged_profile_only_clears_the_flag(build):
+    db = FakeDB()
+    db.add(1)
+    build(db)
+
+    db.reflag(1)
+    stats, api = build(db)
+
+    assert (stats["updated"], stats["unchanged"]) == (0, 1)
+    assert api.inputs == []
+    assert db.rows[1]["needs_rebuild"] == 0
+
+
+def test_unmigrated_table_falls_back_to_unguarded_writes(build, capsys):
+    db = FakeDB(versioned=False)
+    db.add(1)
+    db.add(2)
+    db.add(3, contact_id=99)
+    del db.contacts[99]
+
+    stats, _ = build(db)
+
+    assert (stats["updated"], stats["orphans"]) == (2, 1)
+    assert all(r["needs_rebuild"] == 0 for r in db.rows.values())
+    assert not any("rebuild_version" in sql for sql, _ in db.writes)
+    assert "rebuild_worker.py --migrate" in capsys.readouterr().out
+
+
+class SourceCursor:
+
+    def __init__(self, results):
+        self.results = results
+        self.sql = []
+
+    def execute(self, sql, params=()):
+        self.sql.append(" ".join(sql.split()))
+
+    def fetchall(self):
+        table = self.sql[-1].split("FROM ")[1].split()[0]
+        return self.results.get(table, [])
+
+
+def test_first_cv_row_per_user_is_kept():
+    cursor = SourceCursor({"users_cv": [
+        {"user_id": 7, "cv": "first cv"},
+        {"user_id": 7, "cv": "second cv"},
+        {"user_id": 8, "cv": "other"},
+    ]})
+    rows = [{"contact_user_id": 7, "user_contact_id": None}, {"contact_user_id": 8, "user_contact_id": None}]
+
+    sources = ebs.load_profile_sources(cursor, rows)
+
+    assert sources["cvs"] == {7: "first cv", 8: "other"}
+    assert "ORDER BY" not in next(s for s in cursor.sql if "users_cv" in s)
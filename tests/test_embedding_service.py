@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from app.services import embedding_service as es
+from app.services import search_pipeline_service as sp
+from app.services.query_cache_service import QueryEmbeddingCache
+
+
+class FakeEmbeddings:
+
+    def __init__(self):
+        self.inputs = []
+
+    def _response(self, input):
+        self.inputs.append(input)
+        texts = [input] if isinstance(input, str) else input
+        if any(not t for t in texts):
+            raise AssertionError("empty input reached the API")
+        # Reversed on purpose: callers must order by index
+        data = [SimpleNamespace(index=i, embedding=[float(len(t)), float(i)]) for i, t in enumerate(texts)]
+        return SimpleNamespace(data=data[::-1])
+
+    def create(self, model, input):
+        return self._response(input)
+
+
+class AsyncFakeEmbeddings(FakeEmbeddings):
+
+    async def create(self, model, input):
+        return self._response(input)
+
+
+@pytest.fixture
+def api(monkeypatch):
+    sync, async_ = FakeEmbeddings(), AsyncFakeEmbeddings()
+    monkeypatch.setattr(es, "client", SimpleNamespace(embeddings=sync))
+    monkeypatch.setattr(es, "async_client", SimpleNamespace(embeddings=async_))
+    monkeypatch.setattr(es, "query_embedding_cache", QueryEmbeddingCache(100, 0))
+    return SimpleNamespace(sync=sync, async_=async_)
+
+
+def test_equivalent_prompts_share_one_call(api):
+    first = es.get_embedding("developer")
+
+    for prompt in ("Developer", "developer?", "  Who is the best   developer? "):
+        np.testing.assert_array_equal(es.get_embedding(prompt), first)
+
+    # The canonical key is also what was embedded
+    assert api.sync.inputs == ["developer"]
+
+
+def test_tech_tokens_keep_their_own_key(api):
+    es.get_embedding("c++ developer")
+    es.get_embedding("c developer")
+    es.get_embedding("node.js developer")
+
+    assert api.sync.inputs == ["c++ developer", "c developer", "node.js developer"]
+
+
+def test_prompt_of_only_filler_words_is_still_embedded(api):
+    es.get_embedding("Who is the best?")
+
+    assert api.sync.inputs == ["who is the best?"]
+
+
+@pytest.mark.parametrize("prompt", ["", "   ", None])
+def test_empty_prompt_is_rejected_before_the_api(api, prompt):
+    with pytest.raises(ValueError):
+        es.get_embedding(prompt)
+    with pytest.raises(ValueError):
+        asyncio.run(es.get_embeddings_async(["designer", prompt]))
+
+    assert api.sync.inputs == api.async_.inputs == []
+
+
+def test_batch_embeds_each_distinct_miss_once_in_order(api):
+    es.get_embedding("designer")
+
+    vectors = asyncio.run(es.get_embeddings_async(["Developer", "designer", "developer?", "Plumber"]))
+
+    assert api.async_.inputs == [["developer", "plumber"]]
+    np.testing.assert_array_equal(vectors[0], vectors[2])
+    np.testing.assert_array_equal(vectors[1], es.get_embedding("designer"))
+    np.testing.assert_array_equal(vectors[3], [7.0, 1.0])
+
+
+def test_blank_prompt_fails_alone_in_a_search_batch(api, monkeypatch):
+    monkeypatch.setattr(sp, "get_user_matrix", lambda user_id: None)
+    monkeypatch.setattr(sp, "rank_candidates_batch",
+                        lambda user_id, entry, queries, top_k, texts: [[] for _ in queries])
+
+    contexts = asyncio.run(sp.run_ai_search_batch_async(1, ["developer", " ", "designer"]))
+
+    assert [c.error for c in contexts] == [None, "ValueError: empty prompt", None]
+    assert [c.results for c in contexts] == [[], None, []]
+    assert api.async_.inputs == [["developer", "designer"]]
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from app.services import ann_index_service as ann
+from app.utils.ivf import IVFIndex
+from app.utils.math import cosine_topk, l2_normalize
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((40, 64), dtype=np.float32)
+    assign = rng.integers(0, 40, 4000)
+    matrix = l2_normalize(centers[assign] + rng.standard_normal((4000, 64), dtype=np.float32) * 0.5)
+    queries = l2_normalize(matrix[rng.choice(4000, 30, replace=False)]
+                           + rng.standard_normal((30, 64), dtype=np.float32) * 0.1)
+    return matrix, queries
+
+
+@pytest.fixture(scope="module")
+def index(data):
+    matrix, _ = data
+    return ann._build_index(np.arange(len(matrix)), matrix)
+
+
+def recall(index, matrix, queries, k, nprobe):
+    hits = 0
+    for q in queries:
+        exact, _ = cosine_topk(q, matrix, k)
+        ids, _ = index.search(q, k, nprobe=nprobe)
+        hits += len(set(exact.tolist()) & set(ids.tolist()))
+    return hits / (k * len(queries))
+
+
+def test_probing_every_list_is_exact(data, index):
+    matrix, queries = data
+
+    for q in queries[:5]:
+        exact_ids, exact_scores = cosine_topk(q, matrix, 20)
+        ids, scores = index.search(q, 20, nprobe=index.nlist)
+        np.testing.assert_array_equal(ids, exact_ids)
+        np.testing.assert_allclose(scores, exact_scores, rtol=1e-6)
+
+
+def test_recall_grows_with_nprobe_and_meets_the_default(data, index):
+    matrix, queries = data
+
+    low = recall(index, matrix, queries, 20, nprobe=1)
+    default = recall(index, matrix, queries, 20, nprobe=ann._nprobe_for(index))
+
+    assert low < default
+    assert default >= 0.9
+
+
+def test_nprobe_scales_with_nlist(monkeypatch):
+    monkeypatch.setattr(ann, "ANN_NPROBE", 8)
+    monkeypatch.setattr(ann, "ANN_NPROBE_FRACTION", 0.1)
+
+    def probes(nlist):
+        index = IVFIndex(nlist)
+        return ann._nprobe_for(index)
+
+    # Floor, fraction, and never more lists than exist
+    assert probes(40) == 8
+    assert probes(400) == 40
+    assert probes(401) == 41
+    assert probes(5) == 5
+    assert ann._nlist_for(10_000) == 400
+
+
+def test_removed_and_excluded_ids_are_not_returned(data):
+    matrix, queries = data
+    index = IVFIndex(nlist=8)
+    index.train(matrix[:500])
+    index.add(np.arange(500), matrix[:500])
+
+    best, _ = index.search(queries[0], 3, nprobe=8)
+    index.remove([int(best[0])])
+    ids, _ = index.search(queries[0], 3, nprobe=8, exclude={int(best[1])})
+
+    assert len(index) == 499
+    assert int(best[0]) not in ids and int(best[1]) not in ids
+    assert ids[0] == best[2]
@@ -0,0 +1,66 @@
+import json
+from app.utils.json_stream import ArrayItemStream
+
+RESULTS = {
+    "results": [
+        {"idx": 0, "confidence": 0.9, "reason": "says \"lead\" {not a brace}"},
+        {"idx": 1, "confidence": 0.4, "reason": "path C:\\tools\\ and [brackets]"},
+        {"idx": 2, "confidence": 0.7, "reason": "unicode \u00e9 and a trailing \\"},
+    ]
+}
+
+
+def feed_all(pieces):
+    stream = ArrayItemStream()
+    items = []
+    for piece in pieces:
+        items.extend(stream.feed(piece))
+    return stream, items
+
+
+def test_whole_document_in_one_piece():
+    text = json.dumps(RESULTS)
+    stream, items = feed_all([text])
+
+    assert items == RESULTS["results"]
+    assert stream.text == text
+
+
+def test_one_character_at_a_time():
+    text = json.dumps(RESULTS)
+    _, items = feed_all(list(text))
+
+    assert items == RESULTS["results"]
+
+
+def test_split_inside_escape_sequences():
+    text = json.dumps(RESULTS)
+
+    # Cut right after every backslash so the escaped char arrives alone
+    pieces, start = [], 0
+    for i, ch in enumerate(text):
+        if ch == "\\":
+            pieces.append(text[start:i + 1])
+            start = i + 1
+    pieces.append(text[start:])
+
+    assert len(pieces) > 3
+    _, items = feed_all(pieces)
+
+    assert items == RESULTS["results"]
+
+
+def test_items_are_returned_as_soon_as_they_close():
+    stream = ArrayItemStream()
+
+    assert stream.feed('{"results": [{"idx": 0, "reason": "a}') == []
+    assert stream.feed('"}') == [{"idx": 0, "reason": "a}"}]
+    assert stream.feed(', {"idx": 1') == []
+    assert stream.feed("}]}") == [{"idx": 1}]
+
+
+def test_nested_values_stay_inside_their_item():
+    text = '{"results": [{"idx": 0, "tags": [{"k": 1}], "meta": {"a": [1, 2]}}]}'
+    _, items = feed_all([text[:25], text[25:40], text[40:]])
+
+    assert items == [{"idx": 0, "tags": [{"k": 1}], "meta": {"a": [1, 2]}}]
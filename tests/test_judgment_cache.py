@@ -0,0 +1,71 @@
+import pytest
+from app.services import judgment_cache_service as jc
+from app.utils.lru import TTLCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(jc, "_cache", TTLCache(100))
+    monkeypatch.setattr(jc, "_stats", {"hits": 0, "misses": 0})
+
+
+def candidates(*hashes):
+    return [{"idx": i, "context_hash": h} for i, h in enumerate(hashes)]
+
+
+def test_miss_then_hit():
+    cands = candidates("h0", "h1")
+
+    verdicts, pending = jc.split_cached("python developer", "skill", cands)
+    assert verdicts == {} and pending == cands
+
+    jc.store_verdicts("python developer", "skill", pending, [
+        {"idx": 0, "confidence": 0.9, "reason": "yes"},
+        {"idx": 1, "confidence": 0.1, "reason": "no"},
+    ])
+
+    verdicts, pending = jc.split_cached("python developer", "skill", cands)
+    assert pending == []
+    assert verdicts == {0: {"confidence": 0.9, "reason": "yes"}, 1: {"confidence": 0.1, "reason": "no"}}
+    assert jc.get_judgment_cache_stats()["hits"] == 2
+
+
+def test_changed_context_hash_is_judged_again():
+    jc.store_verdicts("designer", "skill", candidates("old"), [{"idx": 0, "confidence": 0.9}])
+
+    # Profile rebuilt: same contact, new context_hash
+    verdicts, pending = jc.split_cached("designer", "skill", candidates("new"))
+
+    assert verdicts == {}
+    assert pending == candidates("new")
+
+
+def test_equivalent_prompts_share_and_query_types_do_not():
+    jc.store_verdicts("Who is the best Developer?", "skill", candidates("h"), [
+        {"idx": 0, "confidence": 0.8, "reason": "r"},
+    ])
+
+    assert jc.split_cached("developer", "skill", candidates("h"))[0] == {0: {"confidence": 0.8, "reason": "r"}}
+    assert jc.split_cached("developer", "person", candidates("h"))[1] == candidates("h")
+    assert jc.split_cached("c++ developer", "skill", candidates("h"))[1] == candidates("h")
+
+
+def test_omitted_and_unhashed_candidates_are_not_cached():
+    cands = [{"idx": 0, "context_hash": "h0"}, {"idx": 1, "context_hash": "h1"}, {"idx": 2}]
+
+    jc.store_verdicts("sql", "skill", cands, [
+        {"idx": 0, "confidence": 0.7},
+        {"idx": 2, "confidence": 0.9},
+    ])
+
+    verdicts, pending = jc.split_cached("sql", "skill", cands)
+    assert list(verdicts) == [0]
+    assert [c["idx"] for c in pending] == [1, 2]
+
+
+def test_version_bump_invalidates(monkeypatch):
+    jc.store_verdicts("sql", "skill", candidates("h"), [{"idx": 0, "confidence": 0.7}])
+
+    monkeypatch.setattr(jc, "JUDGMENT_VERSION", jc.JUDGMENT_VERSION + 1)
+
+    assert jc.split_cached("sql", "skill", candidates("h"))[0] == {}
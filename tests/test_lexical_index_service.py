@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from app.services import lexical_index_service as lis
+from app.services import retrieval_service as rs
+
+
+class QueuedBuilder:
+    """Holds submitted refreshes until the test runs them."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        self.jobs.append((fn, args))
+
+    def drain(self):
+        jobs, self.jobs = self.jobs, []
+        for fn, args in jobs:
+            fn(*args)
+        return len(jobs)
+
+
+@pytest.fixture
+def lexical(monkeypatch):
+    profiles = {}
+    builder = QueuedBuilder()
+
+    monkeypatch.setattr(lis, "_states", lis.OrderedDict())
+    monkeypatch.setattr(lis, "_builder", builder)
+    monkeypatch.setattr(lis, "_fetch_profile_texts", lambda ids: {i: profiles[i] for i in ids})
+    return SimpleNamespace(profiles=profiles, builder=builder)
+
+
+def entry_for(profiles, version):
+    """The cached matrix as the API process would see it."""
+    ids = sorted(profiles)
+    return SimpleNamespace(
+        user_id=1,
+        fingerprint=(len(ids), 0, version),
+        embedding_ids=np.asarray(ids, dtype=np.int64),
+        context_hashes=[str(hash(profiles[i])) for i in ids],
+        matrix=np.eye(len(ids), 2, dtype=np.float32),
+    )
+
+
+def fused(entry):
+    # Vector ranking 1, 2, 3 on its own
+    ids, _ = rs._fuse(entry, [1.0, 0.0], "kubernetes",
+                      np.asarray([1, 2, 3]), np.asarray([0.9, 0.8, 0.7]), 3)
+    return ids.tolist()
+
+
+def test_cold_index_is_vector_only_until_built(lexical):
+    lexical.profiles.update({1: "designer", 2: "plumber", 3: "kubernetes admin"})
+    entry = entry_for(lexical.profiles, version=1)
+
+    assert fused(entry) == [1, 2, 3]
+    assert lexical.builder.drain() == 1
+    assert fused(entry) == [3, 1, 2]
+
+
+def test_rewritten_profile_changes_the_fused_ranking(lexical):
+    lexical.profiles.update({1: "designer", 2: "plumber", 3: "kubernetes admin"})
+    entry = entry_for(lexical.profiles, version=1)
+    fused(entry)
+    lexical.builder.drain()
+    assert fused(entry) == [3, 1, 2]
+
+    # The builder rewrote two profiles in its own process; all the API
+    # sees is the new fingerprint and context hashes
+    lexical.profiles.update({2: "kubernetes plumber", 3: "retired admin"})
+    rewritten = entry_for(lexical.profiles, version=2)
+
+    # Stale until the queued refresh lands
+    assert fused(rewritten) == [3, 1, 2]
+    assert lexical.builder.drain() == 1
+    assert fused(rewritten) == [2, 1, 3]
+
+    # Same fingerprint: nothing more to do
+    fused(rewritten)
+    assert lexical.builder.drain() == 0
@@ -0,0 +1,61 @@
+import numpy as np
+from app.utils.math import cosine_topk, l2_normalize
+
+MATRIX = l2_normalize(np.array([
+    [1.0, 0.0],
+    [0.0, 1.0],
+    [1.0, 1.0],
+    [1.0, 1.0],
+    [-1.0, 0.0],
+]))
+
+
+def test_single_query_is_sorted_and_normalized():
+    idx, scores = cosine_topk([3.0, 0.0], MATRIX, 3)
+
+    assert idx.tolist() == [0, 2, 3]
+    np.testing.assert_allclose(scores, [1.0, 0.7071068, 0.7071068], rtol=1e-6)
+
+
+def test_ties_keep_row_order():
+    idx, _ = cosine_topk([1.0, 1.0], MATRIX, 2)
+
+    assert idx.tolist() == [2, 3]
+
+
+def test_k_larger_than_n_returns_every_row():
+    idx, scores = cosine_topk([1.0, 0.0], MATRIX, 50)
+
+    assert sorted(idx.tolist()) == [0, 1, 2, 3, 4]
+    assert idx[-1] == 4
+    assert np.all(np.diff(scores) <= 0)
+
+    idx, scores = cosine_topk([1.0, 0.0], MATRIX[:0], 5)
+    assert idx.shape == scores.shape == (0,)
+
+
+def test_mask_drops_rows_from_a_single_query():
+    mask = np.array([True, False, True, False, False])
+
+    idx, _ = cosine_topk([1.0, 0.0], MATRIX, 3, mask=mask)
+
+    assert idx.tolist() == [3, 1, 4]
+
+    # Fewer unmasked rows than k: only those come back
+    idx, _ = cosine_topk([1.0, 0.0], MATRIX, 5, mask=~mask)
+    assert idx.tolist() == [0, 2]
+
+
+def test_batch_pads_masked_slots():
+    queries = np.array([[1.0, 0.0], [0.0, 1.0]])
+    mask = np.array([
+        [False, True, True, True, True],
+        [False, False, False, False, False],
+    ])
+
+    idx, scores = cosine_topk(queries, MATRIX, 3, mask=mask)
+
+    assert idx.shape == scores.shape == (2, 3)
+    assert idx[0].tolist() == [0, -1, -1]
+    assert np.isneginf(scores[0, 1:]).all()
+    assert idx[1].tolist() == [1, 2, 3]
@@ -0,0 +1,69 @@
+import pytest
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
+from app.core import mongo
+
+
+class FakeReviews:
+
+    def __init__(self, keys=(), create_error=None, info_error=None):
+        self.indexes = {"_id_": {"key": [("_id", 1)]}}
+        for field in keys:
+            self.indexes[f"{field}_1"] = {"key": [(field, 1)]}
+        self.create_error = create_error
+        self.info_error = info_error
+        self.created = []
+
+    def index_information(self):
+        if self.info_error:
+            raise self.info_error
+        return self.indexes
+
+    def create_index(self, keys):
+        if self.create_error:
+            raise self.create_error
+        self.created.append(keys)
+        self.indexes[f"{keys[0][0]}_1"] = {"key": keys}
+
+
+@pytest.fixture
+def reviews(monkeypatch):
+    def use(collection, create=True, require=False):
+        monkeypatch.setattr(mongo, "get_reviews_collection", lambda: collection)
+        monkeypatch.setattr(mongo, "MONGO_CREATE_REVIEW_INDEX", create)
+        monkeypatch.setattr(mongo, "MONGO_REQUIRE_REVIEW_INDEX", require)
+        return collection
+
+    return use
+
+
+def test_existing_index_is_left_alone(reviews):
+    collection = reviews(FakeReviews(keys=["default_description_id"]))
+
+    assert mongo.check_review_index()
+    assert collection.created == []
+
+
+def test_missing_index_is_created(reviews):
+    collection = reviews(FakeReviews())
+
+    assert mongo.check_review_index()
+    assert collection.created == [[("default_description_id", 1)]]
+
+
+def test_missing_index_only_warns_when_not_required(reviews, capsys):
+    reviews(FakeReviews(), create=False)
+
+    assert not mongo.check_review_index()
+    assert "createIndex" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("collection, create", [
+    (FakeReviews(), False),
+    (FakeReviews(create_error=OperationFailure("not authorized")), True),
+    (FakeReviews(info_error=ServerSelectionTimeoutError("no servers")), True),
+])
+def test_required_index_fails_startup(reviews, collection, create):
+    reviews(collection, create=create, require=True)
+
+    with pytest.raises(RuntimeError, match="MONGO_REQUIRE_REVIEW_INDEX"):
+        mongo.check_review_index()
@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from app.services import retrieval_service as rs
+from app.utils import quantize
+from app.utils.math import cosine_topk, l2_normalize
+from app.utils.quantize import STORAGE_KINDS, QuantizedMatrix
+
+
+def clustered_vectors(rng, n, dim, clusters=50):
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    assign = rng.integers(0, clusters, n)
+    noise = rng.standard_normal((n, dim), dtype=np.float32) * 0.6
+    return l2_normalize(centers[assign] + noise)
+
+
+def rescored_topk(quantized, matrix, query, k, rescore_k):
+    # Same two passes as retrieval_service._search_quantized
+    q = l2_normalize(query)
+    approx = quantized.scores(q)
+    shortlist = min(max(rescore_k, k), len(quantized))
+    pool = np.sort(np.argpartition(-approx, shortlist - 1)[:shortlist])
+    top, scores = cosine_topk(q, matrix[pool], k)
+    return pool[top], scores
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    matrix = clustered_vectors(rng, 5000, 256)
+    queries = matrix[rng.choice(5000, 20, replace=False)] + \
+        rng.standard_normal((20, 256), dtype=np.float32) * 0.05
+    return matrix, queries
+
+
+@pytest.mark.parametrize("kind", ["float16", "int8"])
+def test_rescoring_matches_exact_topk(data, kind):
+    matrix, queries = data
+    quantized = QuantizedMatrix.from_float32(matrix, kind)
+
+    for query in queries:
+        exact_ids, exact_scores = cosine_topk(query, matrix, 40)
+        ids, scores = rescored_topk(quantized, matrix, query, 40, rescore_k=300)
+
+        np.testing.assert_array_equal(ids, exact_ids)
+        np.testing.assert_allclose(scores, exact_scores, rtol=1e-6)
+
+
+@pytest.mark.parametrize("kind, tolerance", [("float16", 1e-3), ("int8", 2e-2)])
+def test_approximate_scores_are_close(data, kind, tolerance):
+    matrix, queries = data
+    quantized = QuantizedMatrix.from_float32(matrix, kind)
+    q = l2_normalize(queries[0])
+
+    assert np.max(np.abs(quantized.scores(q) - matrix @ q)) < tolerance
+
+
+def test_int8_handles_zero_rows_and_reports_size():
+    matrix = np.zeros((3, 8), dtype=np.float32)
+    matrix[1, 0] = 1.0
+
+    quantized = QuantizedMatrix.from_float32(matrix, "int8")
+
+    assert len(quantized) == 3
+    assert quantized.nbytes == 3 * 8 + 3 * 4
+    np.testing.assert_allclose(quantized.scores(matrix[1]), [0.0, 1.0, 0.0])
+
+
+def test_float32_is_not_a_quantized_kind():
+    assert "float32" in STORAGE_KINDS
+
+    with pytest.raises(ValueError):
+        QuantizedMatrix.from_float32(np.eye(2), "float32")
+
+
+@pytest.mark.parametrize("kind", ["float16", "int8"])
+def test_batch_scores_match_one_query_at_a_time(data, kind, monkeypatch):
+    # Several blocks, the last one partial
+    monkeypatch.setattr(quantize, "CHUNK_ROWS", 1024)
+
+    matrix, queries = data
+    quantized = QuantizedMatrix.from_float32(matrix, kind)
+    qs = l2_normalize(queries[:5])
+
+    batch = quantized.scores_batch(qs)
+
+    assert batch.shape == (5, len(matrix))
+    for q, row in zip(qs, batch):
+        np.testing.assert_allclose(row, quantized.scores(q), rtol=1e-5, atol=1e-6)
+
+
+def test_batch_search_scans_the_codes_once(data, monkeypatch):
+    matrix, queries = data
+    quantized = QuantizedMatrix.from_float32(matrix, "int8")
+    entry = SimpleNamespace(
+        size=len(matrix), matrix=matrix, quantized=quantized,
+        embedding_ids=np.arange(100, 100 + len(matrix), dtype=np.int64),
+    )
+    monkeypatch.setattr(rs, "EMBEDDING_RESCORE_K", 300)
+
+    single = [rs._search_quantized(entry, q, 40) for q in queries[:4]]
+
+    scans = []
+    original = quantized.scores_batch
+    quantized.scores_batch = lambda qs: scans.append(len(qs)) or original(qs)
+    batch = rs._search_quantized_batch(entry, queries[:4], 40)
+
+    assert scans == [4]
+    for (ids, scores), (b_ids, b_scores) in zip(single, batch):
+        np.testing.assert_array_equal(b_ids, ids)
+        np.testing.assert_allclose(b_scores, scores, rtol=1e-6)
@@ -0,0 +1,126 @@
+import asyncio
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from app.services import query_classifier_service as qc
+from app.utils.centroid_classifier import CentroidClassifier
+
+
+def test_predict_picks_the_nearest_centroid():
+    model = CentroidClassifier(["a", "b"], np.array([[1.0, 0.0], [0.0, 1.0]]), temperature=10)
+
+    label, confidence = model.predict([0.9, 0.1])
+    assert label == "a" and confidence > 0.9
+
+    # Halfway between the centroids: a coin flip
+    label, confidence = model.predict([1.0, 1.0])
+    assert confidence == pytest.approx(0.5)
+
+    np.testing.assert_allclose(model.predict_proba([[3.0, 0.0], [0.0, 2.0]]).sum(axis=1), 1.0)
+
+
+def test_fit_recovers_the_training_labels():
+    rng = np.random.default_rng(0)
+    a = np.array([1.0, 0.0, 0.0]) + rng.normal(0, 0.05, (6, 3))
+    b = np.array([0.0, 1.0, 0.0]) + rng.normal(0, 0.05, (6, 3))
+
+    model = CentroidClassifier.fit(np.vstack([a, b]), ["a"] * 6 + ["b"] * 6)
+
+    assert [model.predict(x)[0] for x in a] == ["a"] * 6
+    assert [model.predict(x)[0] for x in b] == ["b"] * 6
+
+
+class FakeChat:
+
+    def __init__(self, label):
+        self.prompts = []
+        self.label = label
+
+    def _response(self, messages, **kwargs):
+        self.prompts.append(messages[-1]["content"])
+        content = '{"type": "%s"}' % self.label
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class AsyncFakeChat(FakeChat):
+
+    async def create(self, **kwargs):
+        return self._response(**kwargs)
+
+
+class SyncFakeChat(FakeChat):
+
+    def create(self, **kwargs):
+        return self._response(**kwargs)
+
+
+@pytest.fixture
+def classifier(monkeypatch):
+    model = CentroidClassifier(
+        ["broad_skill", "personal_trait"], np.array([[1.0, 0.0], [0.0, 1.0]]), temperature=10,
+    )
+    sync_chat, async_chat = SyncFakeChat("specific_domain"), AsyncFakeChat("specific_domain")
+
+    monkeypatch.setattr(qc, "_model", model)
+    monkeypatch.setattr(qc, "_stats", dict.fromkeys(qc._stats, 0))
+    monkeypatch.setattr(qc, "QUERY_CLASSIFIER_LABEL_LOG", "")
+    monkeypatch.setattr(qc, "QUERY_CLASSIFIER_MIN_CONFIDENCE", 0.8)
+    monkeypatch.setattr(qc, "client", SimpleNamespace(chat=SimpleNamespace(completions=sync_chat)))
+    monkeypatch.setattr(qc, "async_client", SimpleNamespace(chat=SimpleNamespace(completions=async_chat)))
+    return SimpleNamespace(sync=sync_chat, async_=async_chat)
+
+
+def test_confident_local_label_skips_the_llm(classifier):
+    assert qc.classify_query("developer", [1.0, 0.05]) == "broad_skill"
+    assert asyncio.run(qc.classify_query_async("funny", [0.05, 1.0])) == "personal_trait"
+
+    assert classifier.sync.prompts == classifier.async_.prompts == []
+    assert qc.get_classifier_stats()["local"] == 2
+
+
+def test_below_threshold_falls_back_to_the_llm(classifier):
+    # Equidistant from both centroids: confidence 0.5 < 0.8
+    assert qc.classify_query("kubernetes", [1.0, 1.0]) == "specific_domain"
+    assert asyncio.run(qc.classify_query_async("devops", [1.0, 1.0])) == "specific_domain"
+
+    assert classifier.sync.prompts == ["kubernetes"]
+    assert classifier.async_.prompts == ["devops"]
+    stats = qc.get_classifier_stats()
+    assert (stats["local"], stats["llm_fallback"], stats["local_rate"]) == (0, 2, 0.0)
+
+
+def test_missing_model_never_seeds_on_the_request_path(classifier, monkeypatch):
+    started = []
+    monkeypatch.setattr(qc, "_model", None)
+    monkeypatch.setattr(qc, "warm_local_model", lambda: started.append(True))
+
+    def seed():
+        raise AssertionError("seeded on the request path")
+
+    monkeypatch.setattr(qc, "get_local_model", seed)
+
+    assert qc.classify_query("developer", [1.0, 0.0]) == "specific_domain"
+    assert asyncio.run(qc.classify_query_async("developer", [1.0, 0.0])) == "specific_domain"
+    assert started == [True, True]
+
+
+def test_failed_seed_backs_off(classifier, monkeypatch):
+    calls = []
+
+    def seed():
+        calls.append(True)
+        raise OSError("embeddings down")
+
+    monkeypatch.setattr(qc, "_model", None)
+    monkeypatch.setattr(qc, "_model_failed_at", None)
+    monkeypatch.setattr(qc, "get_local_model", seed)
+
+    # Run the background load inline
+    monkeypatch.setattr(qc.threading, "Thread", lambda target, **kw: SimpleNamespace(start=target))
+
+    qc.warm_local_model()
+    qc.warm_local_model()
+
+    assert calls == [True]
+    assert qc.get_classifier_stats()["model_errors"] == 1
+    assert qc._seeding is False
@@ -0,0 +1,91 @@
+import pytest
+from app.utils import rate_limit
+from app.utils.rate_limit import RateLimiter
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(rate_limit.time, "sleep", fake.sleep)
+    return fake
+
+
+def test_full_request_bucket_then_one_refill_interval(clock):
+    limiter = RateLimiter(requests_per_minute=60)
+
+    for _ in range(60):
+        limiter.acquire()
+    assert clock.sleeps == []
+
+    # 60 rpm refills one request per second
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_token_shortfall_waits_in_capped_steps(clock):
+    limiter = RateLimiter(tokens_per_minute=600)
+
+    limiter.acquire(500)
+    assert clock.sleeps == []
+
+    # 100 left, 200 needed: 100 tokens at 10/s is 10s, slept at most 5s at a time
+    limiter.acquire(200)
+    assert clock.sleeps == [pytest.approx(5.0), pytest.approx(5.0)]
+    assert limiter._tokens == pytest.approx(0.0)
+
+
+def test_both_buckets_wait_for_the_slower_one(clock):
+    limiter = RateLimiter(requests_per_minute=120, tokens_per_minute=600)
+
+    limiter.acquire(600)
+    # Requests are plentiful; 60 tokens need 6s at 10/s
+    limiter.acquire(60)
+
+    assert sum(clock.sleeps) == pytest.approx(6.0)
+    # Refilled back to the 120 cap while waiting, then one spent
+    assert limiter._requests == pytest.approx(119.0)
+
+
+def test_refill_never_exceeds_the_quota(clock):
+    limiter = RateLimiter(requests_per_minute=10, tokens_per_minute=100)
+    limiter.acquire(100)
+
+    clock.now += 3600
+    limiter.acquire(0)
+
+    assert limiter._requests == pytest.approx(9.0)
+    assert limiter._tokens == pytest.approx(100.0)
+
+
+def test_request_larger_than_the_bucket_waits_for_a_full_one(clock):
+    limiter = RateLimiter(tokens_per_minute=600)
+
+    limiter.acquire(5000)
+    assert clock.sleeps == []
+
+    limiter.acquire(5000)
+    assert sum(clock.sleeps) == pytest.approx(60.0)
+
+
+def test_zero_limits_never_block(clock):
+    limiter = RateLimiter()
+
+    for _ in range(1000):
+        limiter.acquire(10_000)
+
+    assert clock.sleeps == []
@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+import pytest
+from app.services import embedding_build_service as ebs
+from app.services import rebuild_queue_service as rq
+from tests.fake_mysql import FakeDB
+from tests.test_embedding_build_service import FakeEmbeddings
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDB()
+    for row_id in (1, 2, 3):
+        db.add(row_id)
+
+    monkeypatch.setattr(rq, "get_connection", db.connection)
+    monkeypatch.setattr(rq, "get_cursor", db.cursor)
+    return db
+
+
+def test_claims_do_not_overlap(db):
+    assert rq.claim_batch("a", 2, 30) == [1, 2]
+    assert rq.claim_batch("b", 2, 30) == [3]
+    assert rq.claim_batch("c", 2, 30) == []
+
+    # Claim bookkeeping never bumps the version
+    assert {r["rebuild_version"] for r in db.rows.values()} == {0}
+
+
+def test_expired_lease_is_reclaimed(db):
+    rq.claim_batch("a", 2, 30)
+
+    db.now = 29
+    assert rq.claim_batch("b", 3, 30) == [3]
+
+    # a crashed; its lease runs out
+    db.now = 31
+    assert rq.claim_batch("b", 3, 30) == [1, 2, 3]
+    assert db.claimed("a") == []
+
+
+def test_heartbeat_keeps_a_slow_batch(db):
+    rq.claim_batch("a", 2, 30)
+
+    db.now = 20
+    rq.renew_claims("a", 30)
+
+    db.now = 45
+    assert rq.claim_batch("b", 2, 30) == [3]
+    assert db.claimed("a") == [1, 2]
+
+
+def test_restarted_worker_resumes_its_own_claims(db):
+    rq.claim_batch("a", 3, 30)
+
+    assert rq.claim_batch("a", 2, 30) == [1, 2]
+    assert rq.claim_batch("b", 2, 30) == []
+
+
+def test_release_clears_done_rows_and_defers_the_rest(db):
+    ids = rq.claim_batch("a", 2, 30)
+    db.rows[1]["needs_rebuild"] = 0
+
+    assert rq.release_claims("a", ids) == 1
+    assert db.rows[1]["claimed_until"] is None
+    # Still flagged: unowned, but nobody retries it before the lease ends
+    assert (db.rows[2]["claimed_by"], db.rows[2]["claimed_until"]) == (None, 30)
+    assert rq.claim_batch("b", 3, 60) == [3]
+
+    db.now = 31
+    assert rq.claim_batch("c", 3, 30) == [2]
+
+
+def test_reflag_during_a_batch_stops_the_stale_write(db, monkeypatch):
+    monkeypatch.setattr(ebs, "count_tokens", lambda text: len(text) // 4)
+    monkeypatch.setattr(ebs, "truncate_to_tokens", lambda text, n: text[:n * 4])
+    monkeypatch.setattr(ebs, "get_connection", db.connection)
+
+    def rebuild(ids, on_call=None):
+        monkeypatch.setattr(ebs, "client", SimpleNamespace(embeddings=FakeEmbeddings(on_call)))
+        return ebs.rebuild_embeddings(embedding_ids=ids, concurrency=1)
+
+    ids = rq.claim_batch("a", 1, 30)
+
+    # The contact is edited while its old profile is being embedded
+    stats = rebuild(ids, on_call=lambda: db.reflag(1))
+
+    assert stats["superseded"] == 1
+    assert (db.rows[1]["needs_rebuild"], db.rows[1]["embedding"]) == (1, None)
+    assert db.rows[1]["rebuild_version"] == 1
+    assert rq.release_claims("a", ids) == 1
+
+    # Retried once the lease ends, against the new version
+    db.now = 31
+    ids = rq.claim_batch("b", 1, 30)
+    assert ids == [1]
+    assert rebuild(ids)["updated"] == 1
+    assert db.rows[1]["needs_rebuild"] == 0 and db.rows[1]["embedding"]
+    assert rq.release_claims("b", ids) == 0
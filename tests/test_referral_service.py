@@ -0,0 +1,206 @@
+import asyncio
+from contextlib import contextmanager
+import time
+import numpy as np
+import pytest
+from app.services import referral_service as rs
+from app.utils.vectors import encode_embedding
+
+
+class FakeCursor:
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.sql = None
+
+    def execute(self, sql, params=()):
+        self.sql = sql
+
+    def fetchmany(self, size):
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        return chunk
+
+
+def embedding_row(row_id, owner, contact_id, vector, phone=None):
+    return {
+        "id": row_id,
+        "user_id": owner,
+        "contact_id": contact_id,
+        "embedding": encode_embedding(vector),
+        "phone": phone,
+    }
+
+
+def test_score_all_referrers_keeps_top_k_per_referrer(monkeypatch):
+    rows = [
+        embedding_row(1, 10, 100, [1.0, 0.0], "+1"),
+        embedding_row(2, 10, 101, [0.6, 0.8], "+2"),
+        embedding_row(3, 10, 102, [0.0, 1.0], "+3"),
+        embedding_row(4, 20, 100, [0.8, 0.6], "+1"),
+        embedding_row(5, 20, 103, [-1.0, 0.0]),
+        {**embedding_row(6, 20, 104, [1.0, 0.0]), "embedding": b"\xfe\x09"},
+    ]
+    cursor = FakeCursor(rows)
+
+    @contextmanager
+    def get_cursor():
+        yield cursor
+
+    monkeypatch.setattr(rs, "get_cursor", get_cursor)
+    monkeypatch.setattr(rs, "RETRIEVAL_FETCH_CHUNK", 2)
+
+    per_referrer = rs._score_all_referrers([10, 20], [1.0, 0.0], 2, 500)
+
+    assert "MAX_EXECUTION_TIME(500)" in cursor.sql
+    # Best first per referrer; the undecodable row is skipped
+    assert [(e, k) for _, e, k in per_referrer[10]] == [(1, "+1"), (2, "+2")]
+    assert [(e, k) for _, e, k in per_referrer[20]] == [(4, "+1"), (5, "contact:103")]
+    np.testing.assert_allclose([s for s, _, _ in per_referrer[10]], [1.0, 0.6], rtol=1e-6)
+
+
+REFERRERS = [
+    {"referrer_user_id": 10, "display_name": "Alice", "phone": "+10", "refer": "true"},
+    {"referrer_user_id": 20, "display_name": "Bob", "phone": "+20", "refer": "true"},
+]
+
+# Alice and Bob share +1; only Bob knows +3
+PER_REFERRER = {
+    10: [(0.9, 1, "+1"), (0.5, 2, "+2")],
+    20: [(0.8, 4, "+1"), (0.7, 5, "+3")],
+}
+
+
+class Referral:
+    """referral_search_async with its DB, embedding, classifier and LLM stubbed."""
+
+    def __init__(self, monkeypatch, judge):
+        self.top_k = None
+        self.seconds = None
+
+        async def embed(prompt):
+            return [1.0, 0.0]
+
+        async def classify(prompt, embedding=None):
+            return "skill"
+
+        def score(referrer_ids, query_embedding, top_k, max_ms):
+            self.top_k = top_k
+            return PER_REFERRER
+
+        def unique(per_referrer):
+            keys = ["+1", "+2", "+3"]
+            return [{"idx": i, "key": k} for i, k in enumerate(keys)]
+
+        monkeypatch.setattr(rs, "_load_referrers", lambda user_id, max_ms: REFERRERS)
+        monkeypatch.setattr(rs, "get_embedding_async", embed)
+        monkeypatch.setattr(rs, "classify_query_async", classify)
+        monkeypatch.setattr(rs, "_score_all_referrers", score)
+        monkeypatch.setattr(rs, "_unique_candidates", unique)
+        monkeypatch.setattr(rs, "llm_filter_async", judge)
+        # One candidate per judge call, so batches can fail independently
+        monkeypatch.setattr(rs, "REFERRAL_LLM_BATCH", 1)
+
+    def run(self, deadline=1.0):
+        async def timed():
+            # Timed inside the loop: asyncio.run also joins abandoned threads
+            started = time.perf_counter()
+            try:
+                return await rs.referral_search_async(1, "plumber", deadline=deadline)
+            finally:
+                self.seconds = time.perf_counter() - started
+
+        return asyncio.run(timed())
+
+
+async def judge_all(prompt, candidates, **kwargs):
+    confidence = {"+1": 0.9, "+2": 0.65, "+3": 0.75}
+    return [{"idx": c["idx"], "confidence": confidence[c["key"]]} for c in candidates]
+
+
+def test_referrers_are_ranked_by_their_best_match(monkeypatch):
+    referral = Referral(monkeypatch, judge_all)
+    monkeypatch.setattr(rs, "REFERRAL_TOP_K", 7)
+
+    results = referral.run()
+
+    assert referral.top_k == 7
+    assert results == [
+        {"name": "Alice", "phone": "+10", "confidence": 0.9},
+        {"name": "Bob", "phone": "+20", "confidence": 0.9},
+    ]
+
+
+def test_late_and_failed_batches_are_dropped_and_logged(monkeypatch, capsys):
+    async def judge(prompt, candidates, **kwargs):
+        key = candidates[0]["key"]
+        if key == "+1":
+            await asyncio.sleep(5)
+        if key == "+2":
+            raise RuntimeError("llm down")
+        return await judge_all(prompt, candidates)
+
+    referral = Referral(monkeypatch, judge)
+
+    results = referral.run(deadline=0.3)
+
+    # Only +3 was judged in time: Bob through it, Alice has nothing left
+    assert results == [{"name": "Bob", "phone": "+20", "confidence": 0.75}]
+    assert referral.seconds < 1.0
+
+    out = capsys.readouterr().out
+    assert "1/3 judge batches missed the deadline" in out
+    assert "llm down" in out
+
+
+@pytest.mark.parametrize("stage", ["_load_referrers", "_score_all_referrers"])
+def test_slow_db_work_returns_empty_at_the_deadline(monkeypatch, capsys, stage):
+    referral = Referral(monkeypatch, judge_all)
+    original = getattr(rs, stage)
+
+    def slow(*args):
+        time.sleep(0.6)
+        return original(*args)
+
+    monkeypatch.setattr(rs, stage, slow)
+
+    assert referral.run(deadline=0.2) == []
+    assert referral.seconds < 0.5
+    assert "ran out of time" in capsys.readouterr().out
+
+
+def test_db_statement_timeout_counts_as_deadline(monkeypatch):
+    referral = Referral(monkeypatch, judge_all)
+
+    def timed_out(*args):
+        raise rs.errors.DatabaseError(msg="max execution time exceeded",
+                                      errno=rs.QUERY_TIMEOUT_ERRNO)
+
+    monkeypatch.setattr(rs, "_score_all_referrers", timed_out)
+
+    assert referral.run() == []
+
+
+def test_other_db_errors_still_raise(monkeypatch):
+    referral = Referral(monkeypatch, judge_all)
+
+    def broken(*args):
+        raise rs.errors.DatabaseError(msg="table missing", errno=1146)
+
+    monkeypatch.setattr(rs, "_score_all_referrers", broken)
+
+    with pytest.raises(rs.errors.DatabaseError):
+        referral.run()
+
+
+def test_db_work_is_capped_by_the_slot_count(monkeypatch):
+    monkeypatch.setattr(rs, "_db_slots", rs.threading.BoundedSemaphore(1))
+    monkeypatch.setattr(rs, "REFERRAL_DEADLINE_SECONDS", 0.1)
+
+    assert rs._db_slots.acquire(timeout=0)
+    try:
+        with pytest.raises(TimeoutError):
+            rs._bounded(lambda: "ran")
+    finally:
+        rs._db_slots.release()
+
+    assert rs._bounded(lambda: "ran") == "ran"
@@ -0,0 +1,245 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from app.services import judgment_cache_service
+from app.services import search_pipeline_service as sp
+from app.utils.lru import TTLCache
+
+RESULT_KEYS = {"name", "phone", "confidence", "reason", "profile_text"}
+
+
+def make_candidates(scores):
+    # Fused retrieval order; scores are the cosine scores
+    return [
+        {
+            "idx": i,
+            "name": f"contact {i}",
+            "phone": f"+1555000{i}",
+            "profile_text": f"profile {i}",
+            "context_hash": f"hash-{i}",
+            "score": score,
+        }
+        for i, score in enumerate(scores)
+    ]
+
+
+class Stubs:
+
+    def __init__(self, monkeypatch, scores, verdicts):
+        self.scores = scores
+        self.verdicts = verdicts
+        self.calls = {"embed": 0, "retrieve": 0, "classify": 0, "pack": 0, "judge": 0}
+
+        monkeypatch.setattr(sp, "get_user_matrix", lambda user_id: None)
+        monkeypatch.setattr(sp, "_config_skip", set())
+        monkeypatch.setattr(sp, "_config_variants", {})
+        monkeypatch.setattr(judgment_cache_service, "_cache", TTLCache(100))
+
+        for stage, variant, fn in (
+            ("embed", "openai", self.embed),
+            ("retrieve", "hybrid", self.retrieve),
+            ("classify", "local_first", self.classify),
+            ("pack", "budget", self.pack),
+            ("judge", "llm", self.judge),
+        ):
+            monkeypatch.setitem(sp.STAGES[stage], variant, fn)
+
+    async def embed(self, ctx):
+        self.calls["embed"] += 1
+        return [1.0, 0.0]
+
+    async def retrieve(self, ctx):
+        self.calls["retrieve"] += 1
+        return make_candidates(self.scores)
+
+    async def classify(self, ctx):
+        self.calls["classify"] += 1
+        return "skill"
+
+    async def pack(self, ctx):
+        self.calls["pack"] += 1
+        return [{"idx": c["idx"], "name": c["name"], "profile_text": c["profile_text"]}
+                for c in ctx.pending], 10
+
+    async def judge(self, ctx):
+        self.calls["judge"] += 1
+        return list(self.verdicts)
+
+
+def run(mode, top_n=5, stats=None):
+    ctx = sp.SearchContext(user_id=1, prompt="kubernetes engineer", top_n=top_n,
+                           mode=mode, stats=stats)
+    return asyncio.run(sp.run_pipeline(ctx))
+
+
+def test_fast_mode_ranks_fused_top_n_by_cosine_without_the_llm(monkeypatch):
+    stubs = Stubs(monkeypatch, scores=[0.80, 0.90, 0.85, 0.99], verdicts=[])
+
+    ctx = run("fast", top_n=3)
+
+    assert stubs.calls["judge"] == stubs.calls["classify"] == stubs.calls["pack"] == 0
+    # The fused top 3 (idx 0, 1, 2), ordered by score; idx 3 was cut by fusion
+    assert [r["name"] for r in ctx.results] == ["contact 1", "contact 2", "contact 0"]
+    assert [r["confidence"] for r in ctx.results] == [0.90, 0.85, 0.80]
+    assert all(set(r) == RESULT_KEYS for r in ctx.results)
+    assert {r["reason"] for r in ctx.results} == {"embedding similarity"}
+    assert [t["stage"] for t in ctx.trace if t.get("skipped")] == ["classify", "pack", "judge"]
+
+
+def test_full_mode_keeps_judged_contacts_by_confidence(monkeypatch):
+    stubs = Stubs(monkeypatch, scores=[0.9, 0.8, 0.7], verdicts=[
+        {"idx": 0, "confidence": 0.7, "reason": "some"},
+        {"idx": 2, "confidence": 0.95, "reason": "strong"},
+        {"idx": 1, "confidence": 0.3, "reason": "weak"},
+    ])
+
+    ctx = run("full")
+
+    assert stubs.calls == {"embed": 1, "retrieve": 1, "classify": 1, "pack": 1, "judge": 1}
+    assert ctx.query_type == "skill"
+    # Below 0.6 is dropped; the rest ranked by the LLM's confidence
+    assert [(r["name"], r["confidence"], r["reason"]) for r in ctx.results] == [
+        ("contact 2", 0.95, "strong"),
+        ("contact 0", 0.7, "some"),
+    ]
+    assert all(set(r) == RESULT_KEYS for r in ctx.results)
+    assert [t["stage"] for t in ctx.trace] == list(sp.STAGE_ORDER)
+
+
+def test_auto_answers_fast_on_a_clear_winner(monkeypatch):
+    stubs = Stubs(monkeypatch, scores=[0.9, 0.6], verdicts=[])
+    stats = {}
+
+    ctx = run("auto", stats=stats)
+
+    assert stubs.calls["judge"] == 0
+    assert (stats["mode"], stats["resolved_mode"]) == ("auto", "fast")
+    assert [r["confidence"] for r in ctx.results] == [0.9, 0.6]
+
+
+@pytest.mark.parametrize("scores", [[0.9, 0.89], [0.4, 0.1]])
+def test_auto_escalates_to_full_when_ambiguous(monkeypatch, scores):
+    stubs = Stubs(monkeypatch, scores=scores, verdicts=[
+        {"idx": 1, "confidence": 0.8, "reason": "fits"},
+    ])
+    stats = {}
+
+    ctx = run("auto", stats=stats)
+
+    assert (stats["mode"], stats["resolved_mode"]) == ("auto", "full")
+    assert stubs.calls["classify"] == stubs.calls["judge"] == 1
+    assert [(r["name"], r["reason"]) for r in ctx.results] == [("contact 1", "fits")]
+
+
+def test_no_candidates_short_circuits(monkeypatch):
+    stubs = Stubs(monkeypatch, scores=[], verdicts=[])
+
+    ctx = run("full")
+
+    assert ctx.results == []
+    assert stubs.calls["judge"] == 0
+
+
+def test_cached_verdicts_skip_the_llm_on_repeat(monkeypatch):
+    verdicts = [{"idx": 0, "confidence": 0.9, "reason": "cached"}]
+    stubs = Stubs(monkeypatch, scores=[0.9, 0.8], verdicts=verdicts)
+
+    async def judge_and_store(ctx):
+        stubs.calls["judge"] += 1
+        judgment_cache_service.store_verdicts(ctx.prompt, ctx.query_type, ctx.pending, verdicts)
+        return list(verdicts)
+
+    monkeypatch.setitem(sp.STAGES["judge"], "llm", judge_and_store)
+
+    first = run("full")
+    second = run("full")
+
+    # idx 1 got no verdict, so it is judged again; idx 0 comes from the cache
+    assert stubs.calls["judge"] == 2
+    assert second.results == first.results
+    assert second.trace[3]["cached"] == 1
+
+
+# ==========================================
+# STAGE CONFIG
+# ==========================================
+
+def test_skipping_judge_also_skips_its_inputs(monkeypatch):
+    stubs = Stubs(monkeypatch, scores=[0.7, 0.9], verdicts=[])
+    monkeypatch.setattr(sp, "_config_skip", {"judge"})
+
+    ctx = run("full")
+
+    assert stubs.calls["pack"] == stubs.calls["judge"] == 0
+    assert {"classify", "pack", "judge"} <= ctx.skip
+    assert [r["confidence"] for r in ctx.results] == [0.9, 0.7]
+
+
+def test_register_stage_selects_a_variant(monkeypatch):
+    stubs = Stubs(monkeypatch, scores=[0.9], verdicts=[{"idx": 0, "confidence": 0.9}])
+    monkeypatch.setattr(sp, "STAGES", {k: dict(v) for k, v in sp.STAGES.items()})
+
+    async def pack_nothing(ctx):
+        return [], 0
+
+    sp.register_stage("pack", "empty", pack_nothing, select=True)
+    ctx = run("full")
+
+    assert stubs.calls["pack"] == 0
+    assert ctx.trace[3]["variant"] == "empty"
+
+
+def test_unregistered_variant_falls_back_to_default(monkeypatch):
+    monkeypatch.setattr(sp, "_config_variants", {"pack": "nope"})
+    monkeypatch.setattr(sp, "_warned_variants", set())
+
+    assert sp._variant("pack") == "budget"
+
+
+@pytest.mark.parametrize("value", ["embed", "judge,retrieve", "merge"])
+def test_only_optional_stages_can_be_skipped(value):
+    with pytest.raises(ValueError):
+        sp._parse_skip(value)
+
+
+def test_stage_variants_parse_and_reject_bad_entries():
+    assert sp._parse_variants(" retrieve=vector , pack=truncate ") == {
+        "retrieve": "vector", "pack": "truncate",
+    }
+
+    for bad in ("retrieve", "nosuch=x", "pack="):
+        with pytest.raises(ValueError):
+            sp._parse_variants(bad)
+
+
+@pytest.mark.parametrize("mode, ok", [("auto", True), ("FAST", True), ("fastest", False)])
+def test_search_default_mode_is_checked_at_import(mode, ok):
+    env = {**os.environ, "SEARCH_DEFAULT_MODE": mode}
+    proc = subprocess.run([sys.executable, "-c", "import app.core.config"],
+                          env=env, capture_output=True, text=True)
+
+    assert (proc.returncode == 0) == ok
+    if not ok:
+        assert "SEARCH_DEFAULT_MODE" in proc.stderr
+
+
+def test_batch_items_time_the_mode_decision(monkeypatch):
+    Stubs(monkeypatch, scores=[], verdicts=[])
+
+    async def embed_all(prompts):
+        return [[1.0, 0.0] for _ in prompts]
+
+    monkeypatch.setattr(sp, "get_embeddings_async", embed_all)
+    monkeypatch.setattr(sp, "rank_candidates_batch", lambda user_id, entry, queries, top_k, texts: [
+        make_candidates([0.9, 0.5]), make_candidates([0.9, 0.89]),
+    ])
+
+    clear, ambiguous = asyncio.run(sp.run_ai_search_batch_async(1, ["a", "b"], mode="auto"))
+
+    for ctx, resolved in ((clear, "fast"), (ambiguous, "full")):
+        shared, own = [t for t in ctx.trace if t["stage"] == "retrieve"]
+        assert shared["shared"] and own["prefetched"]
+        assert own["resolved_mode"] == ctx.debug()["resolved_mode"] == resolved
+        assert "ms" in own
@@ -0,0 +1,70 @@
+import json
+import numpy as np
+import pytest
+from app.utils.vectors import (
+    EMBEDDING_FORMAT_VERSION,
+    EMBEDDING_MAGIC,
+    decode_embedding,
+    encode_embedding,
+    is_binary_embedding,
+)
+
+
+def test_round_trip_is_exact():
+    vector = np.random.default_rng(0).standard_normal(1536).astype(np.float32)
+    raw = encode_embedding(vector)
+
+    assert raw[:2] == EMBEDDING_MAGIC + bytes([EMBEDDING_FORMAT_VERSION])
+    assert len(raw) == 2 + 1536 * 4
+    assert is_binary_embedding(raw)
+    np.testing.assert_array_equal(decode_embedding(raw), vector)
+
+
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview])
+def test_decode_accepts_driver_buffer_types(wrap):
+    vector = [0.25, -1.5, 3.0]
+
+    decoded = decode_embedding(wrap(encode_embedding(vector)))
+
+    np.testing.assert_array_equal(decoded, np.asarray(vector, dtype=np.float32))
+
+
+def test_encode_accepts_python_lists_and_float64():
+    values = [0.1, 0.2, 0.3]
+
+    from_list = decode_embedding(encode_embedding(values))
+    from_f64 = decode_embedding(encode_embedding(np.asarray(values, dtype=np.float64)))
+
+    np.testing.assert_array_equal(from_list, from_f64)
+    assert from_list.dtype == np.float32
+
+
+@pytest.mark.parametrize("legacy", [
+    json.dumps([0.1, 0.2, 0.3]),
+    json.dumps([0.1, 0.2, 0.3]).encode("utf-8"),
+    bytearray(json.dumps([0.1, 0.2, 0.3]).encode("utf-8")),
+])
+def test_decode_legacy_json(legacy):
+    assert not is_binary_embedding(legacy)
+
+    decoded = decode_embedding(legacy)
+
+    assert decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, [0.1, 0.2, 0.3], rtol=1e-6)
+
+
+def test_legacy_and_binary_decode_to_the_same_vector():
+    vector = np.random.default_rng(1).standard_normal(64).astype(np.float32)
+    legacy = json.dumps(vector.tolist())
+
+    np.testing.assert_array_equal(decode_embedding(legacy), decode_embedding(encode_embedding(vector)))
+
+
+def test_decode_rejects_null_and_unknown_versions():
+    with pytest.raises(ValueError):
+        decode_embedding(None)
+
+    raw = bytearray(encode_embedding([1.0, 2.0]))
+    raw[1] = EMBEDDING_FORMAT_VERSION + 1
+    with pytest.raises(ValueError):
+        decode_embedding(bytes(raw))
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import time
+from collections import Counter
+import numpy as np
+from app.core.config import (
+    client,
+    QUERY_CLASSIFIER_LABEL_LOG,
+    QUERY_CLASSIFIER_MIN_CONFIDENCE,
+    QUERY_CLASSIFIER_MODEL_PATH,
+)
+from app.services.embedding_service import EMBEDDING_MODEL
+from app.services.query_classifier_service import PROTOTYPE_QUERIES
+from app.utils.centroid_classifier import CentroidClassifier
+from app.utils.text import canonicalize_query
+
+# =========================
+# Trains the local query-intent classifier from the labels the LLM
+# produced in production (QUERY_CLASSIFIER_LABEL_LOG), reports accuracy
+# and latency on a held-out split, and writes QUERY_CLASSIFIER_MODEL_PATH.
+# =========================
+
+
+def load_examples(path: str, with_prototypes: bool):
+    latest = {}
+    llm_latencies = []
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            # Last LLM verdict wins for repeated queries
+            latest[canonicalize_query(row["prompt"]) or row["prompt"]] = (row["prompt"], row["label"])
+            if "latency_ms" in row:
+                llm_latencies.append(row["latency_ms"])
+
+    examples = list(latest.values())
+
+    if with_prototypes:
+        examples += [(q, label) for label, queries in PROTOTYPE_QUERIES.items() for q in queries]
+
+    return examples, llm_latencies
+
+
+def embed_all(texts, batch_size: int = 256):
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        res = client.embeddings.create(model=EMBEDDING_MODEL, input=texts[start:start + batch_size])
+        vectors.extend(d.embedding for d in res.data)
+    return np.array(vectors, dtype=np.float32)
+
+
+def report(model, X, y, threshold, llm_latencies):
+    probs = model.predict_proba(X)
+    pred = [model.labels[i] for i in probs.argmax(axis=1)]
+    conf = probs.max(axis=1)
+
+    correct = np.array([p == t for p, t in zip(pred, y)])
+    confident = conf >= threshold
+
+    print(f"\n📊 Held-out examples: {len(y)}")
+    print(f"   accuracy (all):                 {correct.mean():.3f}")
+    if confident.any():
+        print(f"   answered locally (>= {threshold:.2f}):    {confident.mean():.3f}")
+        print(f"   accuracy when answered locally: {correct[confident].mean():.3f}")
+
+    print("   per label:")
+    for label in model.labels:
+        mask = np.array([t == label for t in y])
+        if mask.any():
+            print(f"     {label:<16} n={mask.sum():<5} acc={correct[mask].mean():.3f}")
+
+    # Local latency: one prediction at a time, as in a request
+    t0 = time.perf_counter()
+    for x in X:
+        model.predict(x)
+    local_ms = (time.perf_counter() - t0) * 1000 / max(len(X), 1)
+
+    print(f"\n⏱️  local classify:  {local_ms:.3f} ms/query")
+    if llm_latencies:
+        print(f"⏱️  LLM classify:    {np.median(llm_latencies):.0f} ms/query (median of logged calls)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local query-intent classifier.")
+    parser.add_argument("--labels", default=QUERY_CLASSIFIER_LABEL_LOG)
+    parser.add_argument("--output", default=QUERY_CLASSIFIER_MODEL_PATH)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=QUERY_CLASSIFIER_MIN_CONFIDENCE)
+    parser.add_argument("--no-prototypes", action="store_true",
+                        help="train on logged labels only")
+    args = parser.parse_args()
+
+    examples, llm_latencies = load_examples(args.labels, not args.no_prototypes)
+    print(f"🔄 {len(examples)} labelled queries: {dict(Counter(label for _, label in examples))}")
+
+    texts = [q for q, _ in examples]
+    labels = [label for _, label in examples]
+    X = embed_all(texts)
+
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(examples))
+    cut = int(len(order) * (1 - args.holdout))
+    train, test = order[:cut], order[cut:]
+
+    model = CentroidClassifier.fit(X[train], [labels[i] for i in train])
+    print(f"🌡️  temperature: {model.temperature}")
+
+    if len(test):
+        report(model, X[test], [labels[i] for i in test], args.threshold, llm_latencies)
+
+    # Ship a model trained on everything
+    final = CentroidClassifier.fit(X, labels)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    final.save(args.output)
+    print(f"\n✅ Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()